@@ -155,7 +155,8 @@ resource "kubernetes_deployment_v1" "ldap_app" {
           # Readiness probe
           readiness_probe {
             http_get {
-              path   = "/health"
+              # /ready fails while credentials are missing or stale; answered from memory, never Vault
+              path   = "/ready"
               port   = 8080
               scheme = "HTTP"
             }
@@ -18,6 +18,8 @@ resource "kubernetes_service_account_v1" "ldap_app_vault_agent" {
 }
 
 # ConfigMap containing Vault Agent configuration
+# The template renders a [mount/role] section per role; add a section (and a
+# matching {{ with secret }} block) to serve more roles from the same file
 resource "kubernetes_config_map_v1" "vault_agent_config" {
   count = var.ldap_dual_account ? 1 : 0
 
@@ -56,6 +58,7 @@ resource "kubernetes_config_map_v1" "vault_agent_config" {
 
       template {
         contents = <<TMPL
+      [ldap/vault-agent-dual-role]
       {{ with secret "ldap/static-cred/vault-agent-dual-role" }}
       LDAP_USERNAME={{ .Data.username }}
       LDAP_PASSWORD={{ .Data.password }}
@@ -101,6 +104,7 @@ resource "kubernetes_config_map_v1" "vault_agent_config" {
 
       template {
         contents = <<TMPL
+      [ldap/vault-agent-dual-role]
       {{ with secret "ldap/static-cred/vault-agent-dual-role" }}
       LDAP_USERNAME={{ .Data.username }}
       LDAP_PASSWORD={{ .Data.password }}
@@ -312,7 +316,8 @@ resource "kubernetes_deployment_v1" "ldap_app_vault_agent" {
 
           readiness_probe {
             http_get {
-              path   = "/health"
+              # /ready fails while credentials are missing or stale; answered from memory, never Vault
+              path   = "/ready"
               port   = 8080
               scheme = "HTTP"
             }
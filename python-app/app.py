@@ -9,22 +9,59 @@ Also supports dual-account mode with direct Vault API polling.
 """
 
 import os
+import io
+import sys
+import gzip
 import json
+import asyncio
+import select
+import socket
+import stat
+import struct
 import time
+import ctypes
+import ctypes.util
 import threading
 import logging
+import mmap
+import bisect
+import contextlib
+import functools
+import hashlib
+import heapq
+import itertools
+import zlib
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import asdict, dataclass, field
 from datetime import datetime
-from flask import Flask, render_template_string, jsonify
+from urllib.parse import parse_qsl, urlsplit
+from typing import Optional
+
+# Start of the import phase reported by create_app() (Flask and its dependencies included)
+_IMPORT_STARTED = time.perf_counter()
+
+from flask import Flask, Response, g, request
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
 
 APP_VERSION = "3.0.0"
 
-# Try to import hvac for direct Vault API access
+# hvac (and requests/urllib3 through it) is imported by _import_vault_libraries()
+# only once Vault access is configured, so file/env delivery never pays for it
+hvac = requests = HTTPAdapter = HTTPConnection = Retry = None
+
+# OpenTelemetry is optional and only imported by _init_tracer() when an exporter is
+# configured; without it (or with OTEL_TRACES_EXPORTER=none) no spans are created
+otel_context = propagate = otel_trace = SpanExportResult = None
+
+# Brotli is optional; without it responses are gzip-compressed only
 try:
-    import hvac
+    import brotli
 except ImportError:
-    hvac = None
+    brotli = None
 
-app = Flask(__name__)
+# Static assets are served from memory by static_asset(), not a static folder
+app = Flask(__name__, static_folder=None)
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
@@ -33,6 +70,14 @@ logger = logging.getLogger(__name__)
 SECRET_DELIVERY_METHOD = os.getenv('SECRET_DELIVERY_METHOD', 'vault-secrets-operator')
 VAULT_AGENT_CREDS_FILE = os.getenv('VAULT_AGENT_CREDS_FILE', '/vault/secrets/ldap-creds')
 VAULT_CSI_SECRETS_DIR = os.getenv('VAULT_CSI_SECRETS_DIR', '/vault/secrets')
+# Rotation/grace settings used when the credential source does not carry them
+ROTATION_PERIOD_DEFAULT = int(os.getenv('ROTATION_PERIOD', '300'))
+GRACE_PERIOD = int(os.getenv('GRACE_PERIOD', '60'))
+# How FileCredentialCache notices changes: 'auto' (inotify, else polling), 'inotify' or 'poll'
+FILE_WATCH_MODE = os.getenv('FILE_WATCH_MODE', 'auto')
+# Multi-worker pods: 'leader' refreshes and publishes snapshots to shared memory,
+# 'follower' only reads them (no Vault client or file watcher of its own), 'off' does both in-process
+SNAPSHOT_SHARING = os.getenv('SNAPSHOT_SHARING', 'off')
 
 # Human-friendly display names for delivery methods
 DELIVERY_METHOD_DISPLAY = {
@@ -42,24 +87,685 @@ DELIVERY_METHOD_DISPLAY = {
 }
 
 
+# ─── Metrics ────────────────────────────────────────────────────────────────
+class _ShardedMetric:
+    """Base for counters/histograms whose hot path locks one of a few striped shards.
+
+    A thread always writes to the shard picked by its thread id, so
+    concurrent writers rarely share a lock, and nothing is registered or
+    retired per thread (Werkzeug starts one thread per request). Each shard
+    is a dict of label values -> accumulator; a scrape merges all of them.
+    """
+
+    # Prime, so page-aligned thread ids still spread over every shard
+    STRIPES = 31
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._stripes = tuple((threading.Lock(), {}) for _ in range(self.STRIPES))
+
+    def _stripe(self):
+        """(lock, values) of the calling thread's shard."""
+        return self._stripes[threading.get_ident() % self.STRIPES]
+
+    def _merge(self, total, values):
+        raise NotImplementedError
+
+    def _collect(self):
+        """Merge every shard into {labels: value}."""
+        totals = {}
+        for lock, values in self._stripes:
+            with lock:
+                self._merge(totals, values)
+        return totals
+
+
+class Counter(_ShardedMetric):
+    """Monotonic counter."""
+
+    type_name = 'counter'
+
+    def inc(self, labels=(), amount=1):
+        lock, shard = self._stripe()
+        with lock:
+            shard[labels] = shard.get(labels, 0) + amount
+
+    def _merge(self, total, values):
+        for labels, value in values.items():
+            total[labels] = total.get(labels, 0) + value
+
+    def samples(self):
+        for labels, value in sorted(self._collect().items()):
+            yield self.name + '_total', tuple(zip(self.labelnames, labels)), value
+
+
+class Histogram(_ShardedMetric):
+    """Fixed-bucket histogram (per-bucket counts plus sum, cumulated at scrape time)."""
+
+    type_name = 'histogram'
+    DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, labels=()):
+        bucket = bisect.bisect_left(self.buckets, value)
+        lock, shard = self._stripe()
+        with lock:
+            counts = shard.get(labels)
+            if counts is None:
+                # One slot per bucket, one for +Inf, then the running sum
+                counts = shard[labels] = [0] * (len(self.buckets) + 2)
+            counts[bucket] += 1
+            counts[-1] += value
+
+    def _merge(self, total, values):
+        for labels, counts in values.items():
+            merged = total.setdefault(labels, [0] * (len(self.buckets) + 2))
+            for i, count in enumerate(counts):
+                merged[i] += count
+
+    def samples(self):
+        for labels, counts in sorted(self._collect().items()):
+            labels = tuple(zip(self.labelnames, labels))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(float(bound))
+                yield self.name + '_bucket', labels + (('le', le),), cumulative
+            yield self.name + '_sum', labels, counts[-1]
+            yield self.name + '_count', labels, cumulative
+
+
+class Gauge:
+    """Gauge whose values are produced by a callback at scrape time (nothing on the hot path)."""
+
+    type_name = 'gauge'
+
+    def __init__(self, name, documentation, labelnames=(), callback=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._callback = callback
+
+    def samples(self):
+        for labels, value in self._callback():
+            yield self.name, tuple(zip(self.labelnames, labels)), value
+
+
+class CallbackCounter(Gauge):
+    """Counter whose running totals are kept elsewhere and read by a callback at scrape time."""
+
+    type_name = 'counter'
+
+    def samples(self):
+        for labels, value in self._callback():
+            yield self.name + '_total', tuple(zip(self.labelnames, labels)), value
+
+
+class MetricsRegistry:
+    """Holds the process's metrics and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=(), callback=None):
+        if callback is not None:
+            return self.register(CallbackCounter(name, documentation, labelnames, callback))
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=Histogram.DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def gauge(self, name, documentation, labelnames=(), callback=None):
+        return self.register(Gauge(name, documentation, labelnames, callback))
+
+    @staticmethod
+    def _format_labels(labels):
+        if not labels:
+            return ''
+        return '{' + ','.join(
+            '%s="%s"' % (name, str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n'))
+            for name, value in labels) + '}'
+
+    def render(self):
+        """Return every metric in the Prometheus text exposition format (0.0.4)."""
+        lines = []
+        for metric in self._metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type_name}')
+            for name, labels, value in metric.samples():
+                # Counts stay integers; sums, ages and other floats use repr for full precision
+                value = str(value) if isinstance(value, int) else repr(float(value))
+                lines.append(f'{name}{self._format_labels(labels)} {value}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = MetricsRegistry()
+REQUEST_LATENCY = metrics.histogram(
+    'http_request_duration_seconds', 'Time to produce a response, by route.', ('route', 'method'))
+VAULT_LATENCY = metrics.histogram(
+    'vault_request_duration_seconds', 'Vault API call latency, by operation.', ('operation',))
+VAULT_ERRORS = metrics.counter(
+    'vault_request_errors', 'Failed Vault API calls, by operation.', ('operation',))
+FILE_REFRESH_LATENCY = metrics.histogram(
+    'file_cache_refresh_duration_seconds', 'Time to re-read file-delivered credentials.')
+FILE_READS = metrics.counter(
+    'file_cache_files_read', 'Credential files read from disk (unchanged CSI files are skipped).')
+FILE_SKIPS = metrics.counter(
+    'file_cache_files_skipped', 'CSI credential files left unread because they had not changed.')
+
+
+@app.before_request
+def _start_request_timer():
+    g.request_started = time.perf_counter()
+
+
+@app.after_request
+def _observe_request_latency(response):
+    # Registered before the other after_request hooks, so it runs last and includes them
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        REQUEST_LATENCY.observe(time.perf_counter() - started, (route, request.method))
+    return response
+
+
+# ─── Tracing ────────────────────────────────────────────────────────────────
+# 'none' (default), 'otlp' (OTEL_EXPORTER_OTLP_* settings apply) or 'memory' (ring buffer at /debug/traces)
+OTEL_TRACES_EXPORTER = os.getenv('OTEL_TRACES_EXPORTER', 'none')
+TRACE_RING_SIZE = int(os.getenv('TRACE_RING_SIZE', '1000'))
+
+
+class RingBufferSpanExporter:
+    """Span exporter that keeps the most recent finished spans in memory."""
+
+    def __init__(self, max_spans=1000):
+        self._spans = deque(maxlen=max_spans)
+
+    def export(self, spans):
+        for finished in spans:
+            context = finished.context
+            self._spans.append({
+                'name': finished.name,
+                'trace_id': format(context.trace_id, '032x'),
+                'span_id': format(context.span_id, '016x'),
+                'parent_id': format(finished.parent.span_id, '016x') if finished.parent else None,
+                'start_time': finished.start_time / 1e9,
+                'duration_ms': (finished.end_time - finished.start_time) / 1e6,
+                'attributes': dict(finished.attributes or {}),
+                'status': finished.status.status_code.name,
+            })
+        return SpanExportResult.SUCCESS
+
+    def spans(self):
+        """Return the buffered spans, oldest first."""
+        return list(self._spans)
+
+    def shutdown(self):
+        pass
+
+    def force_flush(self, timeout_millis=30000):
+        return True
+
+
+def _init_tracer(exporter_name):
+    """Build a tracer for the configured exporter; returns (tracer, ring buffer) or (None, None)."""
+    global otel_context, propagate, otel_trace, SpanExportResult
+    if exporter_name in ('', 'none'):
+        return None, None
+    try:
+        from opentelemetry import context as otel_context, propagate, trace as otel_trace
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor, SpanExportResult
+    except ImportError:
+        logger.warning("OTEL_TRACES_EXPORTER=%s but opentelemetry-sdk is not installed; tracing disabled",
+                       exporter_name)
+        return None, None
+    provider = TracerProvider(resource=Resource.create(
+        {'service.name': os.getenv('OTEL_SERVICE_NAME', 'vault-ldap-demo')}))
+    ring = None
+    if exporter_name == 'otlp':
+        try:
+            from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        except ImportError:
+            logger.warning("OTEL_TRACES_EXPORTER=otlp but opentelemetry-exporter-otlp-proto-http is not "
+                           "installed; tracing disabled")
+            return None, None
+        provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    elif exporter_name == 'memory':
+        ring = RingBufferSpanExporter(TRACE_RING_SIZE)
+        provider.add_span_processor(SimpleSpanProcessor(ring))
+    else:
+        logger.warning("Unknown OTEL_TRACES_EXPORTER %r; tracing disabled", exporter_name)
+        return None, None
+    logger.info("Tracing enabled with the %s exporter", exporter_name)
+    return provider.get_tracer('vault-ldap-demo', APP_VERSION), ring
+
+
+tracer, trace_ring = _init_tracer(OTEL_TRACES_EXPORTER)
+# Shared, reusable no-op context manager handed out while tracing is off
+_NO_SPAN = contextlib.nullcontext()
+
+
+def span(name, **attributes):
+    """Context manager for a child span of the current one (a shared no-op when tracing is off)."""
+    if tracer is None:
+        return _NO_SPAN
+    return tracer.start_as_current_span(name, attributes=attributes)
+
+
+def traced(name):
+    """Decorator running a function inside a span; returns the function untouched when tracing is off."""
+    def decorator(fn):
+        if tracer is None:
+            return fn
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with tracer.start_as_current_span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+if tracer is not None:
+    # Hooks are only installed with tracing on, so a disabled tracer costs requests nothing
+    @app.before_request
+    def _start_request_span():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        request_span = tracer.start_span(
+            f'{request.method} {route}',
+            context=propagate.extract(request.headers),
+            kind=otel_trace.SpanKind.SERVER,
+            attributes={'http.request.method': request.method, 'http.route': route},
+        )
+        g.trace_span = request_span
+        g.trace_token = otel_context.attach(otel_trace.set_span_in_context(request_span))
+
+    @app.teardown_request
+    def _end_request_span(exc):
+        request_span = g.pop('trace_span', None)
+        if request_span is None:
+            return
+        if exc is not None:
+            request_span.record_exception(exc)
+        otel_context.detach(g.pop('trace_token'))
+        request_span.end()
+
+
+# ─── Credential Snapshots ───────────────────────────────────────────────────
+# Process-wide counter so every published snapshot gets a unique, increasing version
+_SNAPSHOT_VERSIONS = itertools.count(1)
+# Random per-process tag for those versions: another replica's version 5 is not this one's
+_SNAPSHOT_EPOCH = os.urandom(4).hex()
+# When this process started; env-delivered credentials were current at that moment
+_PROCESS_STARTED_AT = time.time()
+
+
+def _parse_timestamp(value):
+    """Parse an RFC 3339 timestamp from Vault into epoch seconds (None if invalid)."""
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def _to_int(value):
+    """Parse an integer field from Vault or a file (None if missing or invalid)."""
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _first(creds, *keys):
+    """Return the first non-empty value among the aliased keys."""
+    for key in keys:
+        value = creds.get(key)
+        if value is not None and value != '':
+            return value
+    return None
+
+
+@dataclass(frozen=True)
+class CredentialSnapshot:
+    """Normalized, immutable credentials built once whenever the source data changes.
+
+    Key aliasing (LDAP_USERNAME vs username), integer parsing, the CSI
+    ldap-creds.json blob and the last-rotation timestamp are all resolved at
+    build time, so request handlers only read attributes. Missing fields are
+    None; each view applies its own display defaults. Two snapshots compare
+    equal when their credential content matches, regardless of version/timing.
+    """
+
+    source: str
+    username: Optional[str]
+    password: Optional[str]
+    dn: Optional[str]
+    last_vault_rotation: Optional[str]
+    rotation_period: Optional[int]
+    active_account: Optional[str]
+    rotation_state: Optional[str]
+    dual_account_mode: Optional[bool]
+    grace_period_end: Optional[str]
+    standby_username: Optional[str]
+    standby_password: Optional[str]
+    standby_dn: Optional[str]
+    # ttl in seconds as measured at ttl_as_of (epoch seconds)
+    ttl: Optional[int] = field(default=None, compare=False)
+    ttl_as_of: float = field(default=0.0, compare=False)
+    version: int = field(default_factory=lambda: next(_SNAPSHOT_VERSIONS), compare=False)
+    created_at: float = field(default_factory=time.time, compare=False)
+    # Epoch of the process that numbered the version (a shared-memory leader's, on followers)
+    epoch: str = field(default=_SNAPSHOT_EPOCH, compare=False)
+
+    @property
+    def revision(self):
+        """'<epoch>-<version>': identifies this snapshot unambiguously across processes and replicas."""
+        return f'{self.epoch}-{self.version}'
+
+    @classmethod
+    def from_mapping(cls, creds, source, now=None):
+        """Build a snapshot from Vault response data or file/env key-value pairs."""
+        now = time.time() if now is None else now
+        json_blob = creds.get('ldap-creds.json')
+        if json_blob:
+            # CSI full-response mode: one JSON file carries the whole Vault response
+            try:
+                creds = {**creds, **json.loads(json_blob)}
+            except (json.JSONDecodeError, TypeError):
+                pass
+
+        last_rotation = _first(creds, 'LDAP_LAST_VAULT_PASSWORD', 'last_vault_password', 'last_vault_rotation')
+        rotation_period = _to_int(_first(creds, 'ROTATION_PERIOD', 'rotation_period'))
+        ttl = _to_int(_first(creds, 'ROTATION_TTL', 'rotation_ttl', 'ttl'))
+        ttl_as_of = now
+        last_rotation_at = _parse_timestamp(last_rotation)
+        if source != 'vault' and last_rotation_at is not None:
+            # Files/env are only re-rendered periodically, so derive the live
+            # ttl from the rotation time instead of trusting a rendered value
+            period = rotation_period if rotation_period is not None else ROTATION_PERIOD_DEFAULT
+            ttl = max(0, int(period - (now - last_rotation_at)))
+
+        dual_account_mode = creds.get('dual_account_mode', creds.get('DUAL_ACCOUNT_MODE'))
+        if isinstance(dual_account_mode, str):
+            dual_account_mode = dual_account_mode.lower() == 'true'
+
+        return cls(
+            source=source,
+            username=_first(creds, 'LDAP_USERNAME', 'username'),
+            password=_first(creds, 'LDAP_PASSWORD', 'password'),
+            dn=_first(creds, 'LDAP_DN', 'dn'),
+            last_vault_rotation=last_rotation,
+            rotation_period=rotation_period,
+            active_account=_first(creds, 'ACTIVE_ACCOUNT', 'active_account'),
+            rotation_state=_first(creds, 'ROTATION_STATE', 'rotation_state'),
+            dual_account_mode=dual_account_mode,
+            grace_period_end=_first(creds, 'GRACE_PERIOD_END', 'grace_period_end'),
+            standby_username=_first(creds, 'STANDBY_USERNAME', 'standby_username'),
+            standby_password=_first(creds, 'STANDBY_PASSWORD', 'standby_password'),
+            standby_dn=_first(creds, 'STANDBY_DN', 'standby_dn'),
+            ttl=ttl,
+            ttl_as_of=ttl_as_of,
+            created_at=now,
+        )
+
+    @classmethod
+    def from_env(cls):
+        """Build a snapshot from env vars injected by Vault Secrets Operator."""
+        keys = ('LDAP_USERNAME', 'LDAP_PASSWORD', 'LDAP_DN', 'LDAP_LAST_VAULT_PASSWORD',
+                'ROTATION_PERIOD', 'ROTATION_TTL', 'ACTIVE_ACCOUNT', 'ROTATION_STATE',
+                'GRACE_PERIOD_END', 'STANDBY_USERNAME', 'STANDBY_PASSWORD')
+        return cls.from_mapping({key: os.getenv(key) for key in keys}, 'env', now=_PROCESS_STARTED_AT)
+
+    def ttl_remaining(self, now=None):
+        """Seconds until the next rotation, aged from when the ttl was measured."""
+        if self.ttl is None:
+            return None
+        now = time.time() if now is None else now
+        return max(0, int(self.ttl - (now - self.ttl_as_of)))
+
+
+class SnapshotBroadcaster:
+    """Wakes stream subscribers whenever any credential source publishes a new snapshot.
+
+    Sources call notify() after swapping in a new snapshot; subscribers block
+    in wait() on a shared condition, so one refresh fans out to every client.
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._generation = 0
+        # Connected clients by kind: 'stream' (SSE) or 'long_poll' (parked ?wait_version= requests)
+        self._connections = {'stream': 0, 'long_poll': 0}
+        # (event loop, future) pairs for coroutine subscribers in ASGI mode
+        self._async_waiters = set()
+
+    @property
+    def generation(self):
+        """Counter bumped on every publish."""
+        return self._generation
+
+    @property
+    def subscribers(self):
+        """Number of currently connected stream subscribers."""
+        return self._connections['stream']
+
+    @property
+    def long_polls(self):
+        """Number of long-poll requests currently waiting for a new version."""
+        return self._connections['long_poll']
+
+    def notify(self):
+        """Signal that a new snapshot has been published."""
+        with self._cond:
+            self._generation += 1
+            self._cond.notify_all()
+            async_waiters, self._async_waiters = self._async_waiters, set()
+        for loop, future in async_waiters:
+            try:
+                loop.call_soon_threadsafe(_resolve_future, future)
+            except RuntimeError:
+                # The subscriber's event loop has already shut down
+                pass
+
+    def wait(self, generation, timeout):
+        """Block until the generation moves past `generation` or timeout; return the current one."""
+        with self._cond:
+            self._cond.wait_for(lambda: self._generation != generation, timeout)
+            return self._generation
+
+    async def wait_async(self, generation, timeout):
+        """Coroutine form of wait(); parks on a future instead of a thread."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._generation != generation:
+                return self._generation
+            self._async_waiters.add((loop, future))
+        try:
+            await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            with self._cond:
+                self._async_waiters.discard((loop, future))
+        return self._generation
+
+    def subscribe(self, kind='stream'):
+        """Register a connected subscriber of `kind` ('stream' or 'long_poll', for connection counts)."""
+        with self._cond:
+            self._connections[kind] += 1
+
+    def unsubscribe(self, kind='stream'):
+        """Unregister a disconnected subscriber of `kind`."""
+        with self._cond:
+            self._connections[kind] -= 1
+
+
+def _resolve_future(future):
+    """Complete a waiter future on its own event loop (no-op if it already timed out)."""
+    if not future.done():
+        future.set_result(None)
+
+
+snapshot_updates = SnapshotBroadcaster()
+
+
+# ─── Inotify File Watcher ───────────────────────────────────────────────────
+class InotifyWatcher:
+    """Watches one directory with Linux inotify (via ctypes) and reports changed entry names."""
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_IGNORED = 0x00008000
+    IN_NONBLOCK = 0o4000
+    IN_CLOEXEC = 0o2000000
+    WATCH_MASK = (IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO |
+                  IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF)
+    # struct inotify_event: int wd; uint32 mask, cookie, len; char name[len]
+    _EVENT = struct.Struct('iIII')
+
+    def __init__(self, path):
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        if libc.inotify_add_watch(fd, os.fsencode(path), self.WATCH_MASK) < 0:
+            errno = ctypes.get_errno()
+            os.close(fd)
+            raise OSError(errno, f"inotify_add_watch failed for {path}")
+        self._fd = fd
+        self.path = path
+        # Set once the watched directory itself is removed or moved away
+        self.broken = False
+
+    def wait(self, timeout):
+        """Block up to timeout seconds; return the set of entry names that changed."""
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return set()
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return set()
+
+        names = set()
+        offset = 0
+        while offset + self._EVENT.size <= len(data):
+            _, mask, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            if mask & (self.IN_DELETE_SELF | self.IN_MOVE_SELF | self.IN_IGNORED):
+                self.broken = True
+            names.add(os.fsdecode(data[offset:offset + length].rstrip(b'\0')))
+            offset += length
+        return names
+
+    def close(self):
+        """Release the inotify file descriptor."""
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
 # ─── File-Based Credential Cache ────────────────────────────────────────────
+def iter_agent_sections(lines):
+    """Stream (name, digest, lines) sections from a Vault Agent rendered file.
+
+    A `[mount/role]` header starts a named section, so one file can carry
+    many roles. KEY=VALUE lines before the first header (a single-role file)
+    form the unnamed section, yielded with name None. Blank and comment
+    lines are dropped; the digest covers the remaining lines of the section.
+    """
+    name, body = None, []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        if line[0] == '[' and line[-1] == ']':
+            if body or name is not None:
+                yield name, _section_digest(body), body
+            name, body = line[1:-1].strip().strip('/'), []
+            continue
+        body.append(line)
+    if body or name is not None:
+        yield name, _section_digest(body), body
+
+
+def _section_digest(lines):
+    return hashlib.blake2b('\n'.join(lines).encode('utf-8'), digest_size=16).digest()
+
+
+def parse_agent_lines(lines):
+    """Parse stripped KEY=VALUE lines into a dict (lines without '=' are ignored)."""
+    creds = {}
+    for line in lines:
+        key, sep, value = line.partition('=')
+        if sep:
+            creds[key.strip()] = value.strip()
+    return creds
+
+
 class FileCredentialCache:
-    """Periodically reads credentials from files for agent/CSI delivery methods."""
+    """Keeps credentials read from files for agent/CSI delivery methods.
+
+    Changes are picked up through inotify when available: the directory is
+    watched and files are re-read only after a relevant event, including the
+    CSI driver's atomic `..data` symlink swap. Without inotify (or with
+    FILE_WATCH_MODE=poll) the files are re-read every refresh_interval seconds.
+    """
 
-    def __init__(self, delivery_method, refresh_interval=5):
+    # Name of the symlink that Kubernetes atomic writers (CSI, projected volumes) swap on update
+    ATOMIC_DATA_LINK = '..data'
+    # Quiet period used to batch the burst of events from a single update
+    EVENT_SETTLE_SECONDS = 0.02
+
+    def __init__(self, delivery_method, refresh_interval=5, watch_mode=None):
         self._delivery_method = delivery_method
         self._refresh_interval = refresh_interval
+        self._watch_mode = watch_mode or FILE_WATCH_MODE
         self._credentials = {}
+        self._snapshot = None
         self._lock = threading.Lock()
         self._running = False
         self._thread = None
+        # Agent file sections: name (None when unsectioned) -> (digest, parsed keys)
+        self._agent_sections = {}
+        # Snapshots of named agent sections: 'mount/role' -> (digest, CredentialSnapshot)
+        self._role_snapshots = {}
+        # CSI change detection: filename -> ((inode, mtime_ns, size), value)
+        self._csi_files = {}
+        self._csi_data_target = None
+        self._tick_stats = {'read': 0, 'skipped': 0}
 
     def start(self):
-        """Start the background refresh thread."""
+        """Read the files once, then start the background refresh thread."""
         if self._running:
             return
         self._running = True
-        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        # Watch before reading, so a change landing between the two is not missed
+        watcher = self._create_watcher()
+        # The first request after startup should already have credentials to serve
+        self._safe_read()
+        self._thread = threading.Thread(target=self._refresh_loop, args=(watcher,), daemon=True)
         self._thread.start()
         logger.info("FileCredentialCache started for method=%s", self._delivery_method)
 
@@ -72,61 +778,238 @@ class FileCredentialCache:
         with self._lock:
             return self._credentials.copy()
 
-    def _refresh_loop(self):
-        """Background loop that refreshes credentials from files."""
+    def get_snapshot(self):
+        """Get the normalized snapshot of the cached credentials (None if no files were read)."""
+        return self._snapshot
+
+    def get_role_snapshot(self, mount, role_name):
+        """Snapshot of one `[mount/role]` section of a multi-role agent file, or None."""
+        entry = self._role_snapshots.get(f'{mount}/{role_name}')
+        return entry[1] if entry else None
+
+    def roles(self):
+        """(mount, role) for every named section in the agent file, in file order."""
+        return [tuple(name.rsplit('/', 1)) for name in self._role_snapshots if '/' in name]
+
+    def _watch_target(self):
+        """Return (directory to watch, predicate deciding whether an entry name matters)."""
+        if self._delivery_method == 'vault-agent-sidecar':
+            filename = os.path.basename(VAULT_AGENT_CREDS_FILE)
+            return (os.path.dirname(VAULT_AGENT_CREDS_FILE) or '.',
+                    lambda name: name in (filename, self.ATOMIC_DATA_LINK))
+        # CSI: react to the final ..data swap, or to plain files written in place.
+        # Intermediate atomic-writer entries (..<timestamp>, ..data_tmp) are ignored.
+        return (VAULT_CSI_SECRETS_DIR,
+                lambda name: name == self.ATOMIC_DATA_LINK or not name.startswith('..'))
+
+    def _create_watcher(self):
+        """Create an InotifyWatcher for the credential directory, or None to poll."""
+        if self._watch_mode == 'poll':
+            return None
+        directory, _ = self._watch_target()
+        try:
+            return InotifyWatcher(directory)
+        except (OSError, AttributeError) as e:
+            if self._watch_mode == 'inotify':
+                logger.error("inotify unavailable for %s, falling back to polling: %s", directory, e)
+            else:
+                logger.debug("inotify unavailable for %s, polling instead: %s", directory, e)
+            return None
+
+    def _refresh_loop(self, watcher):
+        """Background loop that refreshes credentials on file events (or by polling).
+
+        start() has already created `watcher` (None to poll) and done the first read.
+        """
+        if watcher:
+            logger.info("FileCredentialCache watching %s with inotify", watcher.path)
+
         while self._running:
-            try:
-                self._read_credentials()
-            except Exception as e:
-                logger.error("Error reading credentials from files: %s", e)
-            time.sleep(self._refresh_interval)
+            if watcher is None or watcher.broken:
+                if watcher:
+                    watcher.close()
+                time.sleep(self._refresh_interval)
+                # Retry the watch each tick (e.g. the directory appeared later)
+                watcher = self._create_watcher()
+                self._safe_read()
+                continue
+
+            # The timeout only bounds how quickly stop() is noticed; it does no I/O
+            names = watcher.wait(1.0)
+            _, is_relevant = self._watch_target()
+            if not any(is_relevant(name) for name in names) and not watcher.broken:
+                continue
+            # Let the rest of this update's events arrive (bounded), then reload once
+            for _ in range(50):
+                if not watcher.wait(self.EVENT_SETTLE_SECONDS):
+                    break
+            self._safe_read()
+
+        if watcher:
+            watcher.close()
+
+    def _safe_read(self):
+        """Read credentials, logging instead of raising."""
+        try:
+            self._read_credentials()
+        except Exception as e:
+            logger.error("Error reading credentials from files: %s", e)
 
+    @traced('file_cache.refresh')
     def _read_credentials(self):
-        """Read credentials based on delivery method."""
+        """Read credentials based on delivery method; returns True if they changed."""
         creds = {}
 
+        started = time.perf_counter()
         if self._delivery_method == 'vault-agent-sidecar':
             creds = self._read_agent_sidecar_file()
         elif self._delivery_method == 'vault-csi-driver':
             creds = self._read_csi_files()
+        FILE_REFRESH_LATENCY.observe(time.perf_counter() - started)
 
+        role_snapshots, roles_changed = self._build_role_snapshots()
         with self._lock:
+            if creds == self._credentials and role_snapshots is self._role_snapshots:
+                return False
+            snapshot = self._snapshot
+            primary = next(iter(self._agent_sections), None)
+            if primary is not None:
+                # A sectioned file's first role also feeds the dashboard; share its snapshot
+                snapshot = role_snapshots[primary][1]
+            elif creds != self._credentials:
+                # Normalize once per change; readers only ever see a finished snapshot
+                candidate = CredentialSnapshot.from_mapping(creds, 'file') if creds else None
+                if candidate != snapshot:
+                    # A re-render that only moved ROTATION_TTL keeps the current version
+                    snapshot = candidate
+            changed = snapshot is not self._snapshot or roles_changed
+            self._snapshot = snapshot
             self._credentials = creds
+            self._role_snapshots = role_snapshots
+        if not changed:
+            return False
+        snapshot_updates.notify()
+        logger.info("Credentials reloaded from %s files (%d keys, %d roles)",
+                    self._delivery_method, len(creds), len(role_snapshots))
+        return True
 
     def _read_agent_sidecar_file(self):
-        """Read credentials from Vault Agent rendered file (key=value format)."""
+        """Read credentials from Vault Agent rendered file (key=value format).
+
+        The file is parsed one section at a time as it streams in. A section
+        whose digest matches the previous read keeps its parsed keys instead of
+        being parsed again. Returns the unsectioned keys, or the first section's
+        keys when the file only has `[mount/role]` sections.
+        """
         creds = {}
+        sections = {}
         try:
             with open(VAULT_AGENT_CREDS_FILE, 'r') as f:
-                for line in f:
-                    line = line.strip()
-                    if '=' in line and not line.startswith('#'):
-                        key, value = line.split('=', 1)
-                        creds[key.strip()] = value.strip()
-            logger.debug("Read %d credentials from agent sidecar file", len(creds))
+                FILE_READS.inc()
+                previous = self._agent_sections
+                for name, digest, lines in iter_agent_sections(f):
+                    cached = previous.get(name)
+                    sections[name] = cached if cached and cached[0] == digest else (digest, parse_agent_lines(lines))
+            if sections:
+                creds = next(iter(sections.values()))[1]
+            logger.debug("Read %d credentials in %d sections from agent sidecar file", len(creds), len(sections))
         except FileNotFoundError:
             logger.warning("Vault Agent creds file not found: %s", VAULT_AGENT_CREDS_FILE)
         except Exception as e:
             logger.error("Error reading agent sidecar file: %s", e)
+        self._agent_sections = sections
         return creds
 
+    def _build_role_snapshots(self):
+        """Snapshots for the agent file's named sections, rebuilding only sections whose digest changed.
+
+        Returns (mapping, changed). The mapping is the current one itself when
+        no digest moved. A section whose digest moved but whose snapshot
+        compares equal (the re-render only refreshed ROTATION_TTL) keeps its
+        snapshot and version, so changed is only True when a role's content did.
+        """
+        current = self._role_snapshots
+        named = {name: entry for name, entry in self._agent_sections.items() if name is not None}
+        if named.keys() == current.keys() and all(current[name][0] == digest for name, (digest, _) in named.items()):
+            return current, False
+        snapshots = {}
+        changed = named.keys() != current.keys()
+        for name, (digest, creds) in named.items():
+            previous = current.get(name)
+            if previous is not None and previous[0] == digest:
+                snapshots[name] = previous
+                continue
+            snapshot = CredentialSnapshot.from_mapping(creds, 'file')
+            if previous is not None and previous[1] == snapshot:
+                snapshot = previous[1]
+            else:
+                changed = True
+            snapshots[name] = (digest, snapshot)
+        return snapshots, changed
+
+    def tick_stats(self):
+        """Return how many CSI files the last refresh tick read versus skipped as unchanged."""
+        return dict(self._tick_stats)
+
+    def _read_data_link(self):
+        """Return the CSI directory's ..data symlink target, or None if it has none."""
+        try:
+            return os.readlink(os.path.join(VAULT_CSI_SECRETS_DIR, self.ATOMIC_DATA_LINK))
+        except OSError:
+            return None
+
     def _read_csi_files(self):
-        """Read credentials from Vault CSI Driver individual files."""
+        """Read credentials from Vault CSI Driver individual files.
+
+        Only files whose (inode, mtime, size) fingerprint changed since the last
+        tick are opened. If the ..data symlink still points at the same target,
+        the atomic writer has not published anything new and the tick is skipped.
+        """
         creds = {}
         try:
             if not os.path.isdir(VAULT_CSI_SECRETS_DIR):
                 logger.warning("Vault CSI secrets dir not found: %s", VAULT_CSI_SECRETS_DIR)
+                self._csi_files = {}
+                self._csi_data_target = None
                 return creds
 
-            for filename in os.listdir(VAULT_CSI_SECRETS_DIR):
-                filepath = os.path.join(VAULT_CSI_SECRETS_DIR, filename)
-                if os.path.isfile(filepath):
+            data_target = self._read_data_link()
+            if data_target is not None and data_target == self._csi_data_target:
+                self._tick_stats = {'read': 0, 'skipped': len(self._csi_files)}
+                FILE_SKIPS.inc(amount=len(self._csi_files))
+                return {name: value for name, (_, value) in self._csi_files.items()}
+
+            files = {}
+            read = skipped = 0
+            with os.scandir(VAULT_CSI_SECRETS_DIR) as entries:
+                for entry in entries:
                     try:
-                        with open(filepath, 'r') as f:
-                            creds[filename] = f.read().strip()
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    if not stat.S_ISREG(st.st_mode):
+                        continue
+                    fingerprint = (st.st_ino, st.st_mtime_ns, st.st_size)
+                    cached = self._csi_files.get(entry.name)
+                    if cached and cached[0] == fingerprint:
+                        files[entry.name] = cached
+                        skipped += 1
+                        continue
+                    try:
+                        with open(entry.path, 'r') as f:
+                            files[entry.name] = (fingerprint, f.read().strip())
+                        read += 1
                     except Exception as e:
-                        logger.error("Error reading CSI file %s: %s", filepath, e)
-            logger.debug("Read %d credentials from CSI files", len(creds))
+                        logger.error("Error reading CSI file %s: %s", entry.path, e)
+
+            self._csi_files = files
+            self._csi_data_target = data_target
+            self._tick_stats = {'read': read, 'skipped': skipped}
+            FILE_READS.inc(amount=read)
+            FILE_SKIPS.inc(amount=skipped)
+            creds = {name: value for name, (_, value) in files.items()}
+            logger.debug("Read %d credentials from CSI files (%d read, %d unchanged)",
+                         len(creds), read, skipped)
         except Exception as e:
             logger.error("Error reading CSI directory: %s", e)
         return creds
@@ -134,26 +1017,308 @@ class FileCredentialCache:
 
 # Initialize file credential cache for file-based delivery methods
 file_cred_cache = None
-if SECRET_DELIVERY_METHOD in ('vault-agent-sidecar', 'vault-csi-driver'):
+if SECRET_DELIVERY_METHOD in ('vault-agent-sidecar', 'vault-csi-driver') and SNAPSHOT_SHARING != 'follower':
     file_cred_cache = FileCredentialCache(SECRET_DELIVERY_METHOD)
-    file_cred_cache.start()
+
+
+# ─── Pooled HTTP Session for Vault ──────────────────────────────────────────
+VAULT_HTTP_POOL_SIZE = int(os.getenv('VAULT_HTTP_POOL_SIZE', '10'))
+VAULT_HTTP_CONNECT_TIMEOUT = float(os.getenv('VAULT_HTTP_CONNECT_TIMEOUT', '3'))
+VAULT_HTTP_READ_TIMEOUT = float(os.getenv('VAULT_HTTP_READ_TIMEOUT', '10'))
+VAULT_HTTP_RETRIES = int(os.getenv('VAULT_HTTP_RETRIES', '2'))
+# Static-cred reads a batch keeps in flight; each holds one pooled connection, so keep it <= the pool size
+VAULT_BATCH_MAX_IN_FLIGHT = int(os.getenv('VAULT_BATCH_MAX_IN_FLIGHT', str(VAULT_HTTP_POOL_SIZE)))
+
+
+def _import_vault_libraries():
+    """Import hvac and the requests/urllib3 pieces of the Vault session; False if not installed."""
+    global hvac, requests, HTTPAdapter, HTTPConnection, Retry
+    try:
+        if requests is None:
+            import requests
+            from requests.adapters import HTTPAdapter
+            from urllib3.connection import HTTPConnection
+            from urllib3.util.retry import Retry
+        if hvac is None:
+            import hvac
+    except ImportError:
+        return False
+    return True
+
+
+@functools.cache
+def _tracing_http_adapter():
+    """HTTPAdapter subclass that wraps each Vault request in a client span and sends W3C traceparent."""
+    class TracingHTTPAdapter(HTTPAdapter):
+        def send(self, request, **kwargs):
+            with span(f'vault.http {request.method}', **{
+                'http.request.method': request.method,
+                'url.path': urlsplit(request.url).path,
+            }) as http_span:
+                propagate.inject(request.headers)
+                response = super().send(request, **kwargs)
+                http_span.set_attribute('http.response.status_code', response.status_code)
+                return response
+    return TracingHTTPAdapter
+
+
+def build_vault_session(pool_size=None, retries=None):
+    """Build a long-lived requests session with a sized keep-alive connection pool.
+
+    The session is shared by every hvac client and worker thread, so logins
+    and reads reuse warm (already TLS-negotiated) connections to Vault.
+    """
+    if not _import_vault_libraries():
+        raise RuntimeError('hvac is not installed')
+    pool_size = VAULT_HTTP_POOL_SIZE if pool_size is None else pool_size
+    retries = VAULT_HTTP_RETRIES if retries is None else retries
+    # Connection failures are always safe to retry; 5xx responses are only
+    # retried for idempotent methods (urllib3 default allow-list)
+    retry = Retry(
+        total=retries,
+        connect=retries,
+        read=0,
+        status=retries,
+        backoff_factor=0.2,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False,
+    )
+    # The tracing adapter is only used when tracing is on, so the default path is plain HTTPAdapter
+    adapter_class = _tracing_http_adapter() if tracer is not None else HTTPAdapter
+    adapter = adapter_class(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    # Enable TCP keep-alive so idle pooled connections survive between polls
+    adapter.init_poolmanager(
+        1, pool_size,
+        socket_options=HTTPConnection.default_socket_options + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)],
+    )
+    session = requests.Session()
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers['Connection'] = 'keep-alive'
+    return session
 
 
 # ─── Vault Client (hvac-based) ──────────────────────────────────────────────
+# Consecutive failed Vault reads that open the circuit breaker
+VAULT_BREAKER_FAILURES = int(os.getenv('VAULT_BREAKER_FAILURES', '3'))
+# Seconds the breaker stays open before letting one probe through
+VAULT_BREAKER_RESET_TIMEOUT = float(os.getenv('VAULT_BREAKER_RESET_TIMEOUT', '10'))
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one in-flight call.
+
+    The first caller for a key runs the function; callers arriving while it is
+    in flight wait for it and receive the same result (or exception).
+    """
+
+    class _Call:
+        __slots__ = ('done', 'result', 'error')
+
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.executed = 0
+        self.coalesced = 0
+
+    def do(self, key, fn, *args):
+        """Run fn(*args) for key, or wait for the identical call already in flight."""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = self._Call()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    def stats(self):
+        """Return how many calls ran and how many were coalesced into another."""
+        with self._lock:
+            return {'executed': self.executed, 'coalesced': self.coalesced}
+
+
+def _is_permission_denied(exc):
+    """Return True when an hvac exception is a 403 (token expired or revoked)."""
+    forbidden = getattr(getattr(hvac, 'exceptions', None), 'Forbidden', None)
+    return isinstance(forbidden, type) and isinstance(exc, forbidden)
+
+
+def _is_vault_outage(exc):
+    """Return False for 4xx answers about one path (bad role, bad request), True otherwise.
+
+    Only outages (connection errors, timeouts, 5xx, sealed) should trip the
+    circuit breaker; a misconfigured role must not cut off every other role.
+    """
+    exceptions = getattr(hvac, 'exceptions', None)
+    client_errors = tuple(
+        cls for cls in (getattr(exceptions, name, None) for name in ('InvalidPath', 'InvalidRequest', 'Forbidden'))
+        if isinstance(cls, type))
+    return not isinstance(exc, client_errors)
+
+
+class CircuitBreaker:
+    """Closed/open/half-open breaker that stops calling Vault while it is failing.
+
+    After `failure_threshold` consecutive failures the breaker opens and calls
+    fail fast. Once `reset_timeout` has passed it goes half-open and lets
+    exactly one probe through; the probe's outcome closes or re-opens it.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=3, reset_timeout=10):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """Current state; an expired open breaker reports half-open."""
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def is_closed(self):
+        return self._state == self.CLOSED
+
+    def allow(self):
+        """Return True if a call may go to Vault now (at most one probe while not closed)."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    return False
+                self._state = self.HALF_OPEN
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        """Close the breaker after a successful call."""
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info("Vault circuit breaker closed")
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        """Count a failed call; open the breaker at the threshold or when a probe fails."""
+        with self._lock:
+            self._failures += 1
+            self._probe_in_flight = False
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning("Vault circuit breaker open after %d failure(s)", self._failures)
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
 class VaultClient:
-    """Handles authentication and API calls to Vault using Kubernetes auth via hvac."""
+    """Handles authentication and API calls to Vault using Kubernetes auth via hvac.
+
+    Token validity is tracked locally from the login/renew lease instead of a
+    lookup-self round trip per read. A background thread renews the token with
+    renew-self at 80% of its TTL; a new login happens only when renewal fails
+    or Vault answers 403. Concurrent logins and concurrent reads of the same
+    role are coalesced into a single Vault request, and reads go through a
+    circuit breaker so an unreachable Vault is not retried on every call.
+    A refresh cycle's reads can be issued together with
+    read_static_creds_batch, which runs them concurrently over the pooled
+    keep-alive connections.
+    """
 
-    def __init__(self, vault_addr, auth_role, mount="kubernetes"):
+    # Fraction of the lease after which the token is renewed
+    RENEW_FRACTION = 0.8
+    # Leases shorter than this are not worth renewing; log in again instead
+    MIN_RENEWABLE_LEASE = 10
+
+    def __init__(self, vault_addr, auth_role, mount="kubernetes", session=None, timeout=None,
+                 breaker=None, batch_max_in_flight=None):
         self.vault_addr = vault_addr.rstrip("/")
         self.auth_role = auth_role
         self.auth_mount = mount
+        # One pooled session for the lifetime of the client, reused across re-logins
+        self._session = session if session is not None else build_vault_session()
+        self._timeout = timeout or (VAULT_HTTP_CONNECT_TIMEOUT, VAULT_HTTP_READ_TIMEOUT)
         self._client = None
         self._token_expires_at = 0
+        self._token_renew_at = 0
+        self._token_renewable = False
+        self._login_generation = 0
+        self._login_flight = SingleFlight()
+        self._read_flight = SingleFlight()
+        self.breaker = breaker if breaker is not None else CircuitBreaker(
+            failure_threshold=VAULT_BREAKER_FAILURES, reset_timeout=VAULT_BREAKER_RESET_TIMEOUT)
+        self._batch_max_in_flight = max(1, batch_max_in_flight or VAULT_BATCH_MAX_IN_FLIGHT)
+        self._batch_executor = None
+        self._batch_lock = threading.Lock()
         self._sa_token_path = os.getenv(
             "VAULT_SA_TOKEN_PATH",
             "/var/run/secrets/vault/token"
         )
+        self._running = False
+        self._thread = None
+        self._wakeup = threading.Event()
+
+    def token_expires_in(self, now=None):
+        """Seconds until the current token expires (negative once expired), or None before the first login."""
+        if not self._token_expires_at:
+            return None
+        return self._token_expires_at - (time.time() if now is None else now)
 
+    def start(self):
+        """Start the background token renewal thread."""
+        if self._running:
+            return
+        self._running = True
+        self._thread = threading.Thread(target=self._renew_loop, daemon=True)
+        self._thread.start()
+        logger.info("VaultClient token renewal started")
+
+    def stop(self):
+        """Stop the background token renewal thread and the batch read pool."""
+        self._running = False
+        self._wakeup.set()
+        with self._batch_lock:
+            executor, self._batch_executor = self._batch_executor, None
+        if executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    @traced('vault.read_sa_token')
     def _read_sa_token(self):
         """Read the Kubernetes service account JWT token."""
         try:
@@ -163,60 +1328,1132 @@ class VaultClient:
             logger.error("K8s SA token not found at %s", self._sa_token_path)
             return None
 
+    def _track_lease(self, auth):
+        """Record token expiry and the renewal deadline from a login/renew auth block."""
+        lease_duration = auth.get('lease_duration', 600)
+        now = time.time()
+        self._token_expires_at = now + lease_duration
+        self._token_renew_at = now + (lease_duration * self.RENEW_FRACTION)
+        self._token_renewable = bool(auth.get('renewable', False))
+        self._wakeup.set()
+        return lease_duration
+
+    def _invalidate_token(self):
+        """Forget the current token so the next call logs in again."""
+        self._token_expires_at = 0
+        self._token_renew_at = 0
+
+    def _relogin(self, generation):
+        """Log in unless another caller already did since `generation` was observed."""
+        if self._login_generation != generation and self._client and time.time() < self._token_expires_at:
+            return True
+        return self._login()
+
+    def _login_coalesced(self):
+        """Log in once on behalf of every thread that currently needs a token."""
+        return self._login_flight.do('login', self._relogin, self._login_generation)
+
+    def coalescing_stats(self):
+        """Return single-flight counters for logins and static-cred reads."""
+        return {'login': self._login_flight.stats(), 'read': self._read_flight.stats()}
+
+    @staticmethod
+    def _timed(operation, fn, *args, **kwargs):
+        """Call a Vault API function, recording its latency and any error under `operation`."""
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        except Exception:
+            VAULT_ERRORS.inc((operation,))
+            raise
+        finally:
+            VAULT_LATENCY.observe(time.perf_counter() - started, (operation,))
+
+    @traced('vault.login')
     def _login(self):
         """Authenticate to Vault using Kubernetes auth method via hvac."""
-        jwt = self._read_sa_token()
-        if not jwt:
-            return False
-
         try:
-            self._client = hvac.Client(url=self.vault_addr)
-            response = self._client.auth.kubernetes.login(
+            jwt = self._read_sa_token()
+            if not jwt:
+                return False
+            # Only publish the client once it holds a token, so concurrent
+            # readers never pick up a half-initialized one
+            client = hvac.Client(url=self.vault_addr, session=self._session, timeout=self._timeout)
+            response = self._timed(
+                'login', client.auth.kubernetes.login,
                 role=self.auth_role,
                 jwt=jwt,
                 mount_point=self.auth_mount
             )
-            lease_duration = response.get('auth', {}).get('lease_duration', 600)
-            # Renew at 80% of lease duration
-            self._token_expires_at = time.time() + (lease_duration * 0.8)
+            self._client = client
+            lease_duration = self._track_lease(response.get('auth', {}))
+            self._login_generation += 1
             logger.info("Vault login successful via hvac, token valid for %ds", lease_duration)
             return True
         except Exception as e:
             logger.error("Vault login failed: %s", e)
             self._client = None
+            self._invalidate_token()
             return False
 
+    @traced('vault.renew')
+    def _renew_token(self):
+        """Renew the current token with renew-self; fall back to a fresh login on failure."""
+        if self._client and self._token_renewable and time.time() < self._token_expires_at:
+            try:
+                response = self._timed('renew', self._client.auth.token.renew_self)
+                lease_duration = self._track_lease(response.get('auth', {}))
+                if lease_duration >= self.MIN_RENEWABLE_LEASE:
+                    logger.info("Vault token renewed, valid for %ds", lease_duration)
+                    return True
+                logger.info("Vault token near its max TTL (%ds left), logging in again", lease_duration)
+            except Exception as e:
+                logger.warning("Vault token renewal failed, logging in again: %s", e)
+        return self._login_coalesced()
+
+    def _renew_loop(self):
+        """Background loop that renews the token before it reaches 80% of its TTL."""
+        while self._running:
+            if self._client is None:
+                # No token yet; the first read logs in and wakes this loop
+                delay = 5
+            else:
+                delay = self._token_renew_at - time.time()
+                if delay <= 0:
+                    delay = 0 if self._renew_token() else 5
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+
+    @traced('vault.ensure_authenticated')
     def _ensure_authenticated(self):
-        """Ensure we have a valid authenticated client."""
-        if self._client and self._client.is_authenticated() and time.time() < self._token_expires_at:
+        """Ensure we have a valid authenticated client (checked locally, no Vault call)."""
+        generation = self._login_generation
+        if self._client and time.time() < self._token_expires_at:
             return True
-        return self._login()
+        return self._login_flight.do('login', self._relogin, generation)
 
     def read_static_creds(self, mount, role_name):
+        """Read static credentials from Vault, sharing the result with concurrent callers."""
+        return self._read_flight.do((mount, role_name), self._read_static_creds, mount, role_name)
+
+    @traced('vault.read_static_creds')
+    def _read_static_creds(self, mount, role_name):
         """Read static credentials from Vault."""
-        if not self._ensure_authenticated():
+        if not self.breaker.allow():
+            # Vault is failing: return at once instead of waiting out another timeout
+            return None
+        try:
+            return self._read_admitted(mount, role_name)
+        except Exception as e:
+            # Whatever went wrong, settle the breaker: an admitted half-open probe
+            # that never records an outcome would keep every later call out
+            self.breaker.record_failure()
+            logger.error("Failed to read static creds for %s/%s: %s", mount, role_name, e)
             return None
 
+    def _read_admitted(self, mount, role_name):
+        """The read behind _read_static_creds() once the breaker let it through; records its outcome."""
+        client = self._client if self._ensure_authenticated() else None
+        if client is None:
+            self.breaker.record_failure()
+            return None
+
+        path = f"{mount}/static-cred/{role_name}"
+        generation = self._login_generation
         try:
-            response = self._client.read(f"{mount}/static-cred/{role_name}")
+            try:
+                response = self._timed('read', client.read, path)
+            except Exception as e:
+                if not _is_permission_denied(e):
+                    raise
+                # Token was revoked or expired early: log in once and retry
+                logger.warning("Vault returned 403 for %s, logging in again", path)
+                if not self._login_flight.do('login', self._relogin, generation):
+                    self.breaker.record_failure()
+                    return None
+                response = self._timed('read', self._client.read, path)
+            # Vault answered, even if the role has no data
+            self.breaker.record_success()
             if response:
                 return response.get("data", {})
             return None
         except Exception as e:
+            if _is_vault_outage(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
             logger.error("Failed to read static creds: %s", e)
             return None
 
+    @traced('vault.read_static_creds_batch')
+    def read_static_creds_batch(self, keys, on_result=None):
+        """Read several (mount, role) pairs concurrently; returns {key: (data, error)}.
+
+        The breaker and token are checked once for the whole batch, then up to
+        batch_max_in_flight reads run at a time, each on its own pooled
+        keep-alive connection, so N roles cost about ceil(N / in-flight) round
+        trips instead of N. A half-open breaker admits one probe, so then a
+        single role is read first and the rest only follow once it has closed
+        the breaker. A failed role gets data None and an error string without
+        affecting the others. on_result(key, data, error) is called (on the
+        calling thread) as each read lands, so fast roles can be published
+        before slow ones return.
+        """
+        results = {}
+
+        def finish(key, data, error):
+            if error:
+                logger.error("Failed to read static creds for %s/%s: %s", key[0], key[1], error)
+            results[key] = (data, error)
+            if on_result:
+                on_result(key, data, error)
+
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return results
+        if not self.breaker.allow():
+            for key in keys:
+                finish(key, None, 'circuit breaker open')
+            return results
+        try:
+            self._read_batch_admitted(keys, finish)
+        except Exception as e:
+            # As in _read_static_creds(): never leave an admitted probe unsettled
+            self.breaker.record_failure()
+            for key in keys:
+                if key not in results:
+                    finish(key, None, str(e) or type(e).__name__)
+        return results
+
+    def _read_batch_admitted(self, keys, finish):
+        """The batch behind read_static_creds_batch() once the breaker let it through; records its outcome."""
+        if not self._ensure_authenticated():
+            self.breaker.record_failure()
+            for key in keys:
+                finish(key, None, 'not authenticated to Vault')
+            return
 
-# Initialize Vault client if config is available
+        if not self.breaker.is_closed:
+            # Admitted as the half-open probe: one read decides whether the rest may follow
+            probe, keys = keys[:1], keys[1:]
+            if not self._read_and_record(probe, finish) or not keys or not self.breaker.allow():
+                for key in keys:
+                    finish(key, None, 'circuit breaker open')
+                return
+        self._read_and_record(keys, finish)
+
+    def _read_and_record(self, keys, finish):
+        """Read keys concurrently, retrying 403s after one re-login; record one breaker outcome.
+
+        Returns True if Vault answered any read (the breaker is then closed).
+        """
+        generation = self._login_generation
+        # One entry per finished read: True if Vault answered, False for an outage
+        answered = []
+        denied = self._read_batch(keys, finish, answered)
+        if denied:
+            # Token was revoked or expired early: log in once and retry just those roles
+            logger.warning("Vault returned 403 for %d role(s), logging in again", len(denied))
+            if not self._login_flight.do('login', self._relogin, generation):
+                self.breaker.record_failure()
+                for key in denied:
+                    finish(key, None, 'Vault login failed')
+                return False
+            for key, e in self._read_batch(list(denied), finish, answered).items():
+                answered.append(True)
+                finish(key, None, str(e))
+        # One breaker outcome per batch: a failure only if Vault never answered
+        if any(answered):
+            self.breaker.record_success()
+            return True
+        self.breaker.record_failure()
+        return False
+
+    def _read_batch(self, keys, finish, answered):
+        """Read keys on the batch pool, finishing each as it lands; returns {key: exception} for 403s."""
+        executor = self._get_batch_executor()
+        client = self._client
+        if client is None:
+            # Another caller's failed login dropped the client since this batch authenticated
+            for key in keys:
+                answered.append(False)
+                finish(key, None, 'not authenticated to Vault')
+            return {}
+        futures = {
+            executor.submit(self._timed, 'read', client.read, f"{mount}/static-cred/{role_name}"): (mount, role_name)
+            for mount, role_name in keys
+        }
+        denied = {}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                response = future.result()
+            except Exception as e:
+                if _is_permission_denied(e):
+                    denied[key] = e
+                    continue
+                answered.append(not _is_vault_outage(e))
+                finish(key, None, str(e) or type(e).__name__)
+                continue
+            answered.append(True)
+            data = response.get("data") if response else None
+            finish(key, data or None, None if data else 'no data')
+        return denied
+
+    def _get_batch_executor(self):
+        """The pool bounding how many batch reads are in flight, created on first use."""
+        with self._batch_lock:
+            if self._batch_executor is None:
+                self._batch_executor = ThreadPoolExecutor(max_workers=self._batch_max_in_flight,
+                                                          thread_name_prefix='vault-read')
+            return self._batch_executor
+
+
+# Initialize Vault client if config is available (token renewal starts with the other workers)
 vault_client = None
 vault_addr = os.getenv("VAULT_ADDR", "")
 vault_auth_role = os.getenv("VAULT_AUTH_ROLE", "")
-if vault_addr and vault_auth_role and hvac:
-    vault_client = VaultClient(vault_addr, vault_auth_role)
-    logger.info("VaultClient initialized with hvac: addr=%s role=%s", vault_addr, vault_auth_role)
+if vault_addr and vault_auth_role and SNAPSHOT_SHARING != 'follower':
+    if _import_vault_libraries():
+        vault_client = VaultClient(vault_addr, vault_auth_role)
+        logger.info("VaultClient initialized with hvac: addr=%s role=%s", vault_addr, vault_auth_role)
+    else:
+        logger.warning("VAULT_ADDR is set but hvac is not installed; Vault polling disabled")
+
+
+# ─── Background Vault Credential Poller ─────────────────────────────────────
+class RefreshSchedule:
+    """Min-heap of next-due times per key, so finding due work is O(log n) in the number of roles.
+
+    Rescheduling pushes a new heap entry and leaves the old one behind; stale
+    entries are recognised (their time no longer matches) and dropped when popped.
+    Not thread-safe on its own: callers hold their own lock.
+    """
 
+    def __init__(self):
+        self._heap = []
+        self._due = {}
+
+    def __contains__(self, key):
+        return key in self._due
+
+    def __len__(self):
+        return len(self._due)
+
+    def keys(self):
+        """Return every scheduled or in-flight key."""
+        return self._due.keys()
+
+    def add(self, key, due_at=0):
+        """Schedule a new key; keys already scheduled or in flight are left alone."""
+        if key not in self._due:
+            self.set(key, due_at)
+
+    def set(self, key, due_at):
+        """(Re)schedule key at due_at."""
+        self._due[key] = due_at
+        heapq.heappush(self._heap, (due_at, key))
+
+    def pop_due(self, now):
+        """Remove and return keys due at or before now; they stay known but unscheduled until set() again."""
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            due_at, key = heapq.heappop(self._heap)
+            if self._due.get(key) == due_at:
+                self._due[key] = None
+                due.append(key)
+        return due
+
+    def next_due(self, default):
+        """Earliest live due time, or default when nothing is scheduled."""
+        while self._heap and self._due.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+        return self._heap[0][0] if self._heap else default
+
+
+class CredentialPoller:
+    """Registry of (mount, role) entries, each kept as an immutable snapshot refreshed in the background.
+
+    Request handlers read the latest snapshot without any Vault I/O, so Vault
+    load depends only on the refresh schedule, not on the number of clients.
+    Each role sleeps until just before its next rotation or grace-period end,
+    polls tightly across that boundary until Vault publishes the new version,
+    then backs off again, so Vault QPS tracks rotations rather than roles.
+    Roles that fall due together are read as one batch through the shared
+    VaultClient, whose reads run concurrently over its pooled connections;
+    a bounded worker pool runs the batches.
+    """
+
+    def __init__(self, vault_client, min_interval=1, max_interval=300, retry_interval=5, workers=4,
+                 boundary_lead=1, boundary_poll_interval=0.5):
+        self._vault_client = vault_client
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._retry_interval = retry_interval
+        self._boundary_lead = boundary_lead
+        self._boundary_poll_interval = boundary_poll_interval
+        self._workers = workers
+        self._executor = None
+        self._snapshots = {}
+        self._schedule = RefreshSchedule()
+        # Roles polling across a boundary -> current delay between polls
+        self._boundary_delays = {}
+        # Wall-clock time of each role's last successful read, and roles whose last read failed
+        self._last_success = {}
+        self._failing = set()
+        self._lock = threading.Lock()
+        self._updated = threading.Condition(self._lock)
+        self._wakeup = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def register(self, mount, role_name):
+        """Track a (mount, role) pair; it is refreshed on the next loop iteration."""
+        with self._lock:
+            self._schedule.add((mount, role_name))
+        self._wakeup.set()
 
-# ─── Single-Account HTML Template (unchanged) ───────────────────────────────
+    def roles(self):
+        """Return the registered (mount, role) pairs, sorted."""
+        with self._lock:
+            return sorted(self._schedule.keys())
+
+    def is_registered(self, mount, role_name):
+        """Return True if (mount, role) is tracked by this poller."""
+        return (mount, role_name) in self._schedule
+
+    def start(self):
+        """Start the background refresh thread and its worker pool."""
+        if self._running:
+            return
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self._workers,
+                                            thread_name_prefix='vault-refresh')
+        self._thread = threading.Thread(target=self._refresh_loop, daemon=True)
+        self._thread.start()
+        logger.info("CredentialPoller started for %d role(s) with %d worker(s)",
+                    len(self._schedule), self._workers)
+
+    def stop(self):
+        """Stop the background refresh thread and its worker pool."""
+        self._running = False
+        self._wakeup.set()
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_snapshot(self, mount, role_name):
+        """Return the latest snapshot for (mount, role), or None if not fetched yet."""
+        return self._snapshots.get((mount, role_name))
+
+    def wait_for_snapshot(self, mount, role_name, timeout):
+        """Block until the first snapshot for (mount, role) exists or timeout expires."""
+        key = (mount, role_name)
+        with self._updated:
+            if key in self._schedule:
+                self._updated.wait_for(lambda: key in self._snapshots, timeout)
+            return self._snapshots.get(key)
+
+    def last_success(self, mount, role_name):
+        """Epoch time of the last successful read of (mount, role), or None before the first."""
+        return self._last_success.get((mount, role_name))
+
+    def stale_since(self, mount, role_name):
+        """Epoch time of the last good read if the latest read of (mount, role) failed, else None."""
+        key = (mount, role_name)
+        if key not in self._failing:
+            return None
+        return self._last_success.get(key)
+
+    def stale_age(self, mount, role_name):
+        """Seconds since the last good read if the latest read of (mount, role) failed, else None."""
+        since = self.stale_since(mount, role_name)
+        return None if since is None else max(0, int(time.time() - since))
+
+    @traced('poller.refresh')
+    def refresh(self, mount, role_name):
+        """Read (mount, role) from Vault and publish a new snapshot; returns seconds until the next refresh."""
+        return self._publish((mount, role_name), self._vault_client.read_static_creds(mount, role_name))
+
+    def _publish(self, key, data):
+        """Publish data read for key as its new snapshot (or flag it stale when empty); returns the next interval."""
+        if not data:
+            # Keep serving the last good snapshot (flagged stale) and retry later
+            with self._lock:
+                newly_failing = key not in self._failing
+                self._failing.add(key)
+            if newly_failing and key in self._snapshots:
+                snapshot_updates.notify()
+            return self._retry_interval
+
+        snapshot = CredentialSnapshot.from_mapping(data, 'vault')
+        with self._updated:
+            self._last_success[key] = snapshot.created_at
+            recovered = key in self._failing
+            self._failing.discard(key)
+            current = self._snapshots.get(key)
+            changed = current is None or current != snapshot
+            if changed:
+                # Only a content change produces a new version
+                self._snapshots[key] = snapshot
+                self._updated.notify_all()
+            if changed or recovered:
+                snapshot_updates.notify()
+            return self._next_interval(key, snapshot, changed, snapshot.created_at)
+
+    def _next_interval(self, key, snapshot, changed, now):
+        """Seconds until the next refresh of key, derived from ttl and grace_period_end.
+
+        Vault's data only changes at the rotation boundary (ttl reaching 0) or
+        when the grace period ends. Sleep until boundary_lead seconds before
+        the nearest one, then poll every boundary_poll_interval (doubling while
+        nothing changes) until a new version shows up.
+        """
+        boundary = self._seconds_to_boundary(snapshot, now)
+        if changed or (boundary is not None and boundary > self._boundary_lead):
+            self._boundary_delays.pop(key, None)
+
+        delay = self._boundary_delays.get(key)
+        if delay is not None:
+            # Still waiting for Vault to publish the rotation; back off gradually
+            delay = self._boundary_delays[key] = min(delay * 2, self._max_interval)
+            return delay
+        if boundary is None:
+            return self._max_interval
+        if boundary > self._boundary_lead:
+            return min(max(boundary - self._boundary_lead, self._min_interval), self._max_interval)
+        self._boundary_delays[key] = self._boundary_poll_interval
+        return self._boundary_poll_interval
+
+    @staticmethod
+    def _seconds_to_boundary(snapshot, now):
+        """Seconds until the nearest rotation or grace-period end, or None if Vault gave neither."""
+        boundaries = []
+        ttl = snapshot.ttl_remaining(now)
+        if ttl is not None:
+            boundaries.append(ttl)
+        grace_end = _parse_timestamp(snapshot.grace_period_end)
+        if grace_end and grace_end > now:
+            boundaries.append(grace_end - now)
+        return min(boundaries) if boundaries else None
+
+    @traced('poller.refresh_batch')
+    def _refresh_batch_and_reschedule(self, keys):
+        """Worker-pool task: read due roles as one Vault batch, rescheduling each as its read lands."""
+        pending = set(keys)
+
+        def reschedule(key, interval):
+            pending.discard(key)
+            with self._lock:
+                self._schedule.set(key, time.monotonic() + interval)
+            self._wakeup.set()
+
+        def on_result(key, data, error):
+            try:
+                interval = self._publish(key, data)
+            except Exception as e:
+                logger.error("Error refreshing credentials for %s/%s: %s", key[0], key[1], e)
+                interval = self._retry_interval
+            reschedule(key, interval)
+
+        try:
+            self._vault_client.read_static_creds_batch(keys, on_result=on_result)
+        except Exception as e:
+            logger.error("Error refreshing credentials for %d role(s): %s", len(pending), e)
+        # Roles the batch never reported on are retried like failed reads
+        for key in list(pending):
+            reschedule(key, self._retry_interval)
+
+    def _refresh_loop(self):
+        """Background loop that hands the roles due on each pass to the worker pool as one batch."""
+        while self._running:
+            self._wakeup.clear()
+            now = time.monotonic()
+            with self._lock:
+                due = self._schedule.pop_due(now)
+                next_at = self._schedule.next_due(now + self._max_interval)
+            try:
+                # Each role still reschedules itself as its own read lands, so one
+                # slow read never holds up the others
+                if due:
+                    self._executor.submit(self._refresh_batch_and_reschedule, due)
+            except RuntimeError:
+                # stop() shut the pool down underneath us
+                return
+            self._wakeup.wait(max(0, next_at - time.monotonic()))
+
+
+def parse_role_key(text):
+    """Split 'mount/role' (the mount may itself contain slashes) into (mount, role)."""
+    mount, _, role_name = text.strip().strip('/').rpartition('/')
+    if not mount or not role_name:
+        raise ValueError(f"expected '<mount>/<role>', got {text!r}")
+    return mount, role_name
+
+
+def load_role_registry():
+    """Collect the (mount, role) entries to poll from env and the optional JSON roles file.
+
+    VAULT_ROLES is a comma-separated list of 'mount/role'. VAULT_ROLES_FILE
+    points at a JSON list of 'mount/role' strings or {"mount", "role"} objects.
+    The dashboard's LDAP_MOUNT_PATH/LDAP_STATIC_ROLE_NAME is always included.
+    """
+    roles = [(os.getenv('LDAP_MOUNT_PATH', 'ldap'), os.getenv('LDAP_STATIC_ROLE_NAME', 'dual-rotation-demo'))]
+    for entry in os.getenv('VAULT_ROLES', '').split(','):
+        if entry.strip():
+            roles.append(parse_role_key(entry))
+    roles_file = os.getenv('VAULT_ROLES_FILE', '')
+    if roles_file:
+        with open(roles_file, 'r') as f:
+            for entry in json.load(f):
+                if isinstance(entry, str):
+                    roles.append(parse_role_key(entry))
+                else:
+                    roles.append((entry['mount'].strip('/'), entry['role']))
+    # Drop duplicates, keeping first-seen order
+    return list(dict.fromkeys(roles))
+
+
+# Poll Vault in the background so /api/credentials never waits on Vault
+VAULT_POLL_INITIAL_WAIT = float(os.getenv('VAULT_POLL_INITIAL_WAIT', '2'))
+credential_poller = None
+if vault_client:
+    credential_poller = CredentialPoller(
+        vault_client,
+        min_interval=float(os.getenv('VAULT_POLL_MIN_INTERVAL', '1')),
+        max_interval=float(os.getenv('VAULT_POLL_MAX_INTERVAL', '300')),
+        retry_interval=float(os.getenv('VAULT_POLL_RETRY_INTERVAL', '5')),
+        workers=int(os.getenv('VAULT_POLL_WORKERS', '4')),
+        boundary_lead=float(os.getenv('VAULT_POLL_BOUNDARY_LEAD', '1')),
+        boundary_poll_interval=float(os.getenv('VAULT_POLL_BOUNDARY_INTERVAL', '0.5')),
+    )
+    for mount, role_name in load_role_registry():
+        credential_poller.register(mount, role_name)
+
+
+# ─── Response Compression ───────────────────────────────────────────────────
+# Responses smaller than this are sent uncompressed (headers would eat the saving)
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', '512'))
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'application/javascript', 'image/svg+xml')
+
+
+def negotiate_encoding(accept_encodings):
+    """Pick 'br' or 'gzip' from a parsed Accept-Encoding header, or None for identity."""
+    best, best_quality = None, 0
+    for encoding in ('br', 'gzip'):
+        if encoding == 'br' and brotli is None:
+            continue
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def compress_body(body, encoding, static=False):
+    """Compress bytes; static content uses the slowest, smallest settings."""
+    if encoding == 'br':
+        # Quality 11 is ~3x slower than 10 here for a ~2% smaller dashboard
+        return brotli.compress(body, quality=10 if static else 5)
+    # mtime=0 keeps the output byte-for-byte stable for the same input
+    return gzip.compress(body, compresslevel=9 if static else 6, mtime=0)
+
+
+class CompressionCache:
+    """Compressed bodies keyed by (ETag, encoding), so each representation is compressed once.
+
+    Static content is compressed once with the slowest, smallest settings
+    and pinned (warm_page_caches() does this when the app starts); dynamic
+    bodies are compressed on first request and kept in a bounded FIFO (a new
+    snapshot version brings a new ETag, so the oldest entries are the ones no
+    longer served). Nothing is compressed at import.
+    """
+
+    def __init__(self, max_entries=512):
+        self._max_entries = max_entries
+        self._static = set()
+        self._pinned = {}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register_static(self, etag):
+        """Mark an ETag as static content: compressed once with static settings and never evicted."""
+        self._static.add(etag)
+
+    def get(self, etag, body, encoding):
+        """Return body compressed with `encoding`, compressing only on a cache miss."""
+        key = (etag, encoding)
+        compressed = self._pinned.get(key) or self._entries.get(key)
+        if compressed is not None:
+            return compressed
+        static = etag in self._static
+        compressed = compress_body(body, encoding, static=static)
+        with self._lock:
+            if static:
+                self._pinned[key] = compressed
+                return compressed
+            self._entries[key] = compressed
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+
+compression_cache = CompressionCache()
+
+
+def _is_compressible(mimetype):
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def _response_encoding(length, mimetype):
+    """The coding compress_response() applies to a `length`-byte `mimetype` body for this request, or None."""
+    if length < COMPRESSION_MIN_SIZE or not _is_compressible(mimetype):
+        return None
+    if 'content_encoding' not in g:
+        g.content_encoding = negotiate_encoding(request.accept_encodings)
+    return g.content_encoding
+
+
+def set_representation_etag(response, etag, length, mimetype):
+    """Set the ETag a 200 for this body would carry: weak when it will be compressed.
+
+    Views call this on 304s as well as 200s, so a revalidation answers with
+    the same validator the client was sent.
+    """
+    if _is_compressible(mimetype):
+        response.vary.add('Accept-Encoding')
+    response.set_etag(etag, weak=_response_encoding(length, mimetype) is not None)
+
+
+@app.after_request
+def compress_response(response):
+    """Content-negotiate gzip/br for buffered text responses above COMPRESSION_MIN_SIZE."""
+    if (response.status_code != 200 or response.is_streamed or response.direct_passthrough
+            or 'Content-Encoding' in response.headers or not _is_compressible(response.mimetype or '')):
+        return response
+    response.vary.add('Accept-Encoding')
+    encoding = _response_encoding(response.content_length, response.mimetype)
+    if encoding is None:
+        return response
+
+    etag, _ = response.get_etag()
+    body = response.get_data()
+    # Responses with an ETag are fixed representations, so their compressed form is cached
+    response.set_data(compression_cache.get(etag, body, encoding) if etag
+                      else compress_body(body, encoding))
+    response.headers['Content-Encoding'] = encoding
+    if etag:
+        # The encoded bytes differ, so the validator becomes weak (If-None-Match still matches)
+        response.set_etag(etag, weak=True)
+    return response
+
+
+# ─── Static Assets ──────────────────────────────────────────────────────────
+# Page CSS, logo and dashboard script are served from content-hashed URLs with
+# a one-year immutable Cache-Control, so repeat page loads only fetch the HTML.
+VAULT_LOGO_SVG = """<svg viewBox="0 0 51 51" xmlns="http://www.w3.org/2000/svg">
+    <path fill="#FFD814" fill-rule="nonzero" d="M0,0 L25.4070312,51 L51,0 L0,0 Z M28.5,10.5 L31.5,10.5 L31.5,13.5 L28.5,13.5 L28.5,10.5 Z M22.5,22.5 L19.5,22.5 L19.5,19.5 L22.5,19.5 L22.5,22.5 Z M22.5,18 L19.5,18 L19.5,15 L22.5,15 L22.5,18 Z M22.5,13.5 L19.5,13.5 L19.5,10.5 L22.5,10.5 L22.5,13.5 Z M26.991018,27 L24,27 L24,24 L27,24 L26.991018,27 Z M26.991018,22.5 L24,22.5 L24,19.5 L27,19.5 L26.991018,22.5 Z M26.991018,18 L24,18 L24,15 L27,15 L26.991018,18 Z M26.991018,13.5 L24,13.5 L24,10.5 L27,10.5 L26.991018,13.5 Z M28.5,15 L31.5,15 L31.5,18 L28.5089552,18 L28.5,15 Z M28.5,22.5 L28.5,19.5 L31.5,19.5 L31.5,22.4601182 L28.5,22.5 Z"/>
+</svg>
+"""
+
+SINGLE_ACCOUNT_CSS = """
+:root {
+    --color-vault: #FFD814;
+    --color-black: #000000;
+    --color-surface-primary: #FFFFFF;
+    --color-surface-secondary: #F7F8FA;
+    --color-surface-tertiary: #EBEEF2;
+    --color-surface-strong: #000000;
+    --color-foreground-primary: #1F2D3D;
+    --color-foreground-strong: #000000;
+    --color-foreground-faint: #5F6F84;
+    --color-foreground-success: #15834D;
+    --color-border-primary: #D9DEE5;
+    --color-border-strong: #A7B1BF;
+    --color-highlight: #5B3DE0;
+    --color-success: #15834D;
+    --color-success-surface: #DDF4E8;
+    --font-family-text: -apple-system, BlinkMacSystemFont, "Segoe UI", "Roboto", "Oxygen", "Ubuntu", "Cantarell", "Fira Sans", "Droid Sans", "Helvetica Neue", sans-serif;
+    --font-family-code: "SF Mono", Monaco, "Cascadia Mono", "Roboto Mono", Consolas, "Courier New", monospace;
+    --font-size-display-500: 30px;
+    --font-size-display-400: 24px;
+    --font-size-display-300: 20px;
+    --font-size-body-300: 16px;
+    --font-size-body-200: 14px;
+    --font-size-body-100: 12px;
+    --line-height-display: 1.2;
+    --line-height-body: 1.5;
+    --font-weight-regular: 400;
+    --font-weight-medium: 500;
+    --font-weight-semibold: 600;
+    --font-weight-bold: 700;
+    --spacing-050: 2px;
+    --spacing-100: 4px;
+    --spacing-200: 8px;
+    --spacing-300: 12px;
+    --spacing-400: 16px;
+    --spacing-500: 24px;
+    --spacing-600: 32px;
+    --spacing-700: 40px;
+    --spacing-800: 48px;
+    --radius-small: 4px;
+    --radius-medium: 8px;
+    --radius-large: 12px;
+    --elevation-mid: 0 8px 16px rgba(31, 45, 61, 0.12);
+    --elevation-high: 0 12px 24px rgba(31, 45, 61, 0.16);
+}
+*, *::before, *::after { margin: 0; padding: 0; box-sizing: border-box; }
+body { font-family: var(--font-family-text); background-color: var(--color-surface-strong); min-height: 100vh; display: flex; align-items: center; justify-content: center; padding: var(--spacing-500); color: var(--color-foreground-primary); }
+.container { background: var(--color-surface-primary); border-radius: var(--radius-large); box-shadow: var(--elevation-high); max-width: 900px; width: 100%; overflow: hidden; }
+.brand-header { background: var(--color-black); color: var(--color-surface-primary); padding: var(--spacing-600) var(--spacing-700); text-align: center; border-bottom: 3px solid var(--color-vault); position: relative; }
+.brand-header-content { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); margin-bottom: var(--spacing-400); }
+.vault-logo { width: 48px; height: 48px; flex-shrink: 0; }
+.brand-header h1 { font-size: var(--font-size-display-400); font-weight: var(--font-weight-semibold); line-height: var(--line-height-display); margin: 0; color: var(--color-surface-primary); }
+.brand-header p { font-size: var(--font-size-body-300); color: var(--color-surface-tertiary); margin: 0; line-height: var(--line-height-body); }
+.version-tag { position: absolute; top: var(--spacing-300); right: var(--spacing-400); font-size: 11px; color: var(--color-foreground-faint); font-family: var(--font-family-code); opacity: 0.7; }
+.status-badge { display: inline-flex; align-items: center; gap: var(--spacing-100); background: var(--color-success); color: var(--color-surface-primary); padding: var(--spacing-100) var(--spacing-300); border-radius: var(--radius-large); font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); text-transform: uppercase; letter-spacing: 0.5px; margin-top: var(--spacing-300); }
+.status-badge::before { content: ''; width: 8px; height: 8px; border-radius: 50%; background: var(--color-surface-primary); animation: pulse 2s ease-in-out infinite; }
+@keyframes pulse { 0%, 100% { opacity: 1; } 50% { opacity: 0.5; } }
+.content { padding: var(--spacing-700); }
+.section-title { font-size: var(--font-size-display-300); font-weight: var(--font-weight-semibold); color: var(--color-foreground-strong); margin-bottom: var(--spacing-500); padding-bottom: var(--spacing-300); border-bottom: 2px solid var(--color-surface-tertiary); }
+.credentials-grid { display: grid; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
+.credential-card { background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); transition: all 0.2s ease; }
+.credential-card:hover { border-color: var(--color-border-strong); box-shadow: var(--elevation-mid); }
+.credential-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-200); display: flex; align-items: center; gap: var(--spacing-200); }
+.credential-label::before { content: ''; width: 4px; height: 12px; background: var(--color-vault); border-radius: 2px; }
+.credential-value { font-family: var(--font-family-code); font-size: var(--font-size-body-200); color: var(--color-foreground-strong); background: var(--color-surface-primary); padding: var(--spacing-300); border-radius: var(--radius-small); border: 1px solid var(--color-border-primary); word-break: break-all; line-height: 1.6; }
+.countdown-card { background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-600); text-align: center; }
+.countdown-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-300); }
+.countdown-display { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); }
+.countdown-value { font-family: var(--font-family-code); font-size: var(--font-size-display-500); font-weight: var(--font-weight-bold); color: var(--color-foreground-strong); min-width: 80px; }
+.countdown-unit { font-size: var(--font-size-body-200); color: var(--color-foreground-faint); font-weight: var(--font-weight-medium); }
+.countdown-bar-track { height: 6px; background: var(--color-surface-tertiary); border-radius: 3px; margin-top: var(--spacing-400); overflow: hidden; }
+.countdown-bar-fill { height: 100%; background: var(--color-vault); border-radius: 3px; transition: width 1s linear; }
+.info-section { background: var(--color-success-surface); border: 1px solid rgba(21, 131, 77, 0.3); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-500); }
+.info-section-title { font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); color: var(--color-success); margin-bottom: var(--spacing-300); display: flex; align-items: center; gap: var(--spacing-200); }
+.info-section p { font-size: var(--font-size-body-200); color: var(--color-foreground-primary); line-height: var(--line-height-body); margin: 0; }
+.metadata { display: flex; align-items: center; justify-content: space-between; padding: var(--spacing-500); background: var(--color-surface-secondary); border-top: 1px solid var(--color-border-primary); font-size: var(--font-size-body-200); color: var(--color-foreground-faint); }
+.metadata strong { color: var(--color-foreground-strong); font-weight: var(--font-weight-medium); }
+.powered-by { display: flex; align-items: center; gap: var(--spacing-200); }
+.powered-by a { color: var(--color-highlight); text-decoration: none; font-weight: var(--font-weight-medium); transition: color 0.2s ease; }
+.powered-by a:hover { color: var(--color-foreground-strong); text-decoration: underline; }
+.refresh-btn { display: none; margin-top: var(--spacing-400); padding: var(--spacing-300) var(--spacing-600); background: var(--color-vault); color: var(--color-black); border: none; border-radius: var(--radius-medium); font-family: var(--font-family-text); font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); cursor: pointer; transition: all 0.2s ease; }
+.refresh-btn:hover { background: #e6c200; box-shadow: var(--elevation-mid); }
+.refresh-btn.visible { display: inline-block; animation: fadeIn 0.3s ease-in; }
+@keyframes fadeIn { from { opacity: 0; transform: translateY(4px); } to { opacity: 1; transform: translateY(0); } }
+.delivery-method-card { background: linear-gradient(135deg, var(--color-surface-secondary), var(--color-surface-tertiary)); border: 1px solid var(--color-vault); border-radius: var(--radius-medium); padding: var(--spacing-300) var(--spacing-500); margin-bottom: var(--spacing-500); text-align: center; }
+.delivery-method-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); }
+.delivery-method-value { font-size: var(--font-size-body-300); font-weight: var(--font-weight-bold); color: var(--color-vault); }
+@media (max-width: 640px) { body { padding: var(--spacing-300); } .brand-header { padding: var(--spacing-500); } .brand-header h1 { font-size: var(--font-size-display-300); } .content { padding: var(--spacing-500); } .metadata { flex-direction: column; gap: var(--spacing-300); text-align: center; } }
+"""
+
+DUAL_ACCOUNT_CSS = """
+:root {
+    --color-vault: #FFD814;
+    --color-black: #000000;
+    --color-surface-primary: #FFFFFF;
+    --color-surface-secondary: #F7F8FA;
+    --color-surface-tertiary: #EBEEF2;
+    --color-surface-strong: #000000;
+    --color-foreground-primary: #1F2D3D;
+    --color-foreground-strong: #000000;
+    --color-foreground-faint: #5F6F84;
+    --color-border-primary: #D9DEE5;
+    --color-border-strong: #A7B1BF;
+    --color-highlight: #5B3DE0;
+    --color-success: #15834D;
+    --color-success-surface: #DDF4E8;
+    /* Timeline colors matching reference SVG */
+    --color-active: #B3D9FF;
+    --color-grace: #FFFFCC;
+    --color-inactive: #FFB3B3;
+    --color-active-text: #1a5276;
+    --color-grace-text: #7d6608;
+    --color-inactive-text: #922b21;
+    --font-family-text: -apple-system, BlinkMacSystemFont, "Segoe UI", "Roboto", "Oxygen", "Ubuntu", "Cantarell", "Fira Sans", "Droid Sans", "Helvetica Neue", sans-serif;
+    --font-family-code: "SF Mono", Monaco, "Cascadia Mono", "Roboto Mono", Consolas, "Courier New", monospace;
+    --font-size-display-500: 30px;
+    --font-size-display-400: 24px;
+    --font-size-display-300: 20px;
+    --font-size-body-300: 16px;
+    --font-size-body-200: 14px;
+    --font-size-body-100: 12px;
+    --line-height-display: 1.2;
+    --line-height-body: 1.5;
+    --font-weight-regular: 400;
+    --font-weight-medium: 500;
+    --font-weight-semibold: 600;
+    --font-weight-bold: 700;
+    --spacing-050: 2px;
+    --spacing-100: 4px;
+    --spacing-200: 8px;
+    --spacing-300: 12px;
+    --spacing-400: 16px;
+    --spacing-500: 24px;
+    --spacing-600: 32px;
+    --spacing-700: 40px;
+    --spacing-800: 48px;
+    --radius-small: 4px;
+    --radius-medium: 8px;
+    --radius-large: 12px;
+    --elevation-mid: 0 8px 16px rgba(31, 45, 61, 0.12);
+    --elevation-high: 0 12px 24px rgba(31, 45, 61, 0.16);
+}
+*, *::before, *::after { margin: 0; padding: 0; box-sizing: border-box; }
+body { font-family: var(--font-family-text); background-color: var(--color-surface-strong); min-height: 100vh; display: flex; align-items: center; justify-content: center; padding: var(--spacing-500); color: var(--color-foreground-primary); }
+.container { background: var(--color-surface-primary); border-radius: var(--radius-large); box-shadow: var(--elevation-high); max-width: 960px; width: 100%; overflow: hidden; }
+.brand-header { background: var(--color-black); color: var(--color-surface-primary); padding: var(--spacing-600) var(--spacing-700); text-align: center; border-bottom: 3px solid var(--color-vault); position: relative; }
+.brand-header-content { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); margin-bottom: var(--spacing-400); }
+.vault-logo { width: 48px; height: 48px; flex-shrink: 0; }
+.brand-header h1 { font-size: var(--font-size-display-400); font-weight: var(--font-weight-semibold); line-height: var(--line-height-display); margin: 0; color: var(--color-surface-primary); }
+.brand-header p { font-size: var(--font-size-body-300); color: var(--color-surface-tertiary); margin: 0; }
+.version-tag { position: absolute; top: var(--spacing-300); right: var(--spacing-400); font-size: 11px; color: var(--color-foreground-faint); font-family: var(--font-family-code); opacity: 0.7; }
+.status-badge { display: inline-flex; align-items: center; gap: var(--spacing-100); padding: var(--spacing-100) var(--spacing-300); border-radius: var(--radius-large); font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); text-transform: uppercase; letter-spacing: 0.5px; margin-top: var(--spacing-300); }
+.status-badge-active { background: var(--color-success); color: #fff; }
+.status-badge-grace { background: var(--color-vault); color: var(--color-black); }
+.status-badge::before { content: ''; width: 8px; height: 8px; border-radius: 50%; background: currentColor; opacity: 0.6; animation: pulse 2s ease-in-out infinite; }
+@keyframes pulse { 0%, 100% { opacity: 0.6; } 50% { opacity: 0.2; } }
+
+.content { padding: var(--spacing-600) var(--spacing-700); }
+
+/* ── Rotation Timeline ── */
+
+/* ── Countdown timers ── */
+.timers-row { display: flex; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
+.timer-card { flex: 1; background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); text-align: center; }
+.timer-card-grace { border-color: #d4a500; background: var(--color-grace); }
+.countdown-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-200); }
+.countdown-value { font-family: var(--font-family-code); font-size: var(--font-size-display-500); font-weight: var(--font-weight-bold); color: var(--color-foreground-strong); }
+.countdown-unit { font-size: var(--font-size-body-200); color: var(--color-foreground-faint); margin-left: var(--spacing-200); }
+.countdown-bar-track { height: 6px; background: var(--color-surface-tertiary); border-radius: 3px; margin-top: var(--spacing-300); overflow: hidden; }
+.countdown-bar-fill { height: 100%; border-radius: 3px; transition: width 1s linear; }
+.bar-fill-vault { background: var(--color-vault); }
+.bar-fill-grace { background: #d4a500; }
+
+/* ── Credential cards ── */
+.section-title { font-size: var(--font-size-display-300); font-weight: var(--font-weight-semibold); color: var(--color-foreground-strong); margin-bottom: var(--spacing-500); padding-bottom: var(--spacing-300); border-bottom: 2px solid var(--color-surface-tertiary); }
+.account-cards { display: grid; grid-template-columns: 1fr 1fr; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
+.account-card { border-radius: var(--radius-medium); padding: var(--spacing-500); border: 1px solid var(--color-border-primary); }
+.account-card-active { background: #eaf4ff; border-left: 4px solid #5dade2; }
+.account-card-standby { background: var(--color-grace); border-left: 4px solid #d4a500; }
+.account-card-hidden { background: var(--color-surface-secondary); border-left: 4px solid var(--color-border-primary); opacity: 0.5; }
+.account-card-header { display: flex; align-items: center; gap: var(--spacing-200); font-weight: var(--font-weight-semibold); margin-bottom: var(--spacing-400); font-size: var(--font-size-body-300); }
+.account-indicator { display: inline-flex; align-items: center; justify-content: center; width: 28px; height: 28px; border-radius: 50%; font-size: var(--font-size-body-100); font-weight: var(--font-weight-bold); }
+.indicator-active { background: var(--color-active); color: var(--color-active-text); }
+.indicator-standby { background: var(--color-grace); color: var(--color-grace-text); border: 2px solid #d4a500; }
+.indicator-hidden { background: var(--color-inactive); color: var(--color-inactive-text); }
+.credential-row { display: grid; grid-template-columns: 1fr 1fr; gap: var(--spacing-300); }
+.credential-item { }
+.credential-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); display: flex; align-items: center; gap: var(--spacing-200); }
+.credential-label::before { content: ''; width: 4px; height: 12px; background: var(--color-vault); border-radius: 2px; }
+.credential-value { font-family: var(--font-family-code); font-size: var(--font-size-body-200); color: var(--color-foreground-strong); background: var(--color-surface-primary); padding: var(--spacing-200) var(--spacing-300); border-radius: var(--radius-small); border: 1px solid var(--color-border-primary); word-break: break-all; }
+
+.info-section { background: var(--color-success-surface); border: 1px solid rgba(21, 131, 77, 0.3); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-500); }
+.info-section-title { font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); color: var(--color-success); margin-bottom: var(--spacing-300); }
+.info-section p { font-size: var(--font-size-body-200); color: var(--color-foreground-primary); line-height: var(--line-height-body); margin: 0; }
+
+.metadata { display: flex; align-items: center; justify-content: space-between; padding: var(--spacing-500); background: var(--color-surface-secondary); border-top: 1px solid var(--color-border-primary); font-size: var(--font-size-body-200); color: var(--color-foreground-faint); }
+.metadata strong { color: var(--color-foreground-strong); font-weight: var(--font-weight-medium); }
+.powered-by { display: flex; align-items: center; gap: var(--spacing-200); }
+.powered-by a { color: var(--color-highlight); text-decoration: none; font-weight: var(--font-weight-medium); }
+.powered-by a:hover { color: var(--color-foreground-strong); text-decoration: underline; }
+
+.error-banner { background: #fdecea; border: 1px solid #e74c3c; border-radius: var(--radius-medium); padding: var(--spacing-400); margin-bottom: var(--spacing-500); color: #922b21; font-size: var(--font-size-body-200); display: none; }
+
+.delivery-method-card { background: linear-gradient(135deg, var(--color-surface-secondary), var(--color-surface-tertiary)); border: 1px solid var(--color-vault); border-radius: var(--radius-medium); padding: var(--spacing-300) var(--spacing-500); margin-bottom: var(--spacing-500); text-align: center; }
+.delivery-method-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); }
+.delivery-method-value { font-size: var(--font-size-body-300); font-weight: var(--font-weight-bold); color: var(--color-vault); }
+
+@media (max-width: 768px) {
+    body { padding: var(--spacing-300); }
+    .content { padding: var(--spacing-500); }
+    .account-cards { grid-template-columns: 1fr; }
+    .timers-row { flex-direction: column; }
+    .credential-row { grid-template-columns: 1fr; }
+    .metadata { flex-direction: column; gap: var(--spacing-300); text-align: center; }
+}
+"""
+
+DUAL_ACCOUNT_JS = """
+(function() {
+    var rotationPeriod = 0;
+    var gracePeriod = 0;
+    var lastData = null;
+
+    function formatTime(s) { return Math.max(0, Math.ceil(s)); }
+
+    function updateUI(data) {
+        lastData = data;
+        rotationPeriod = data.rotation_period || 100;
+        gracePeriod = data.grace_period || 20;
+        var ttl = data.ttl || 0;
+        var state = data.rotation_state || 'active';
+        var activeAcct = (data.active_account || 'a').toUpperCase();
+        var standbyAcct = activeAcct === 'A' ? 'B' : 'A';
+
+        // TTL countdown
+        document.getElementById('ttl-value').textContent = formatTime(ttl);
+        var ttlPct = rotationPeriod > 0 ? (ttl / rotationPeriod) * 100 : 0;
+        document.getElementById('ttl-bar').style.width = ttlPct + '%';
+
+        // Grace period timer
+        var graceTimerCard = document.getElementById('grace-timer-card');
+        var stateBadge = document.getElementById('state-badge');
+        if (state === 'grace_period') {
+            graceTimerCard.style.display = '';
+            graceTimerCard.className = 'timer-card timer-card-grace';
+            var graceEnd = data.grace_period_end ? new Date(data.grace_period_end).getTime() : 0;
+            var graceRemaining = graceEnd > 0 ? Math.max(0, (graceEnd - Date.now()) / 1000) : 0;
+            document.getElementById('grace-value').textContent = formatTime(graceRemaining);
+            var gracePctRemaining = gracePeriod > 0 ? (graceRemaining / gracePeriod) * 100 : 0;
+            document.getElementById('grace-bar').style.width = gracePctRemaining + '%';
+            stateBadge.className = 'status-badge status-badge-grace';
+            stateBadge.textContent = '● Grace Period';
+        } else {
+            graceTimerCard.style.display = 'none';
+            stateBadge.className = 'status-badge status-badge-active';
+            stateBadge.textContent = '● Active';
+        }
+
+        // Active credential card
+        document.getElementById('active-indicator').textContent = activeAcct;
+        document.getElementById('active-card-title').textContent = 'Active Account (' + activeAcct + ')';
+        document.getElementById('active-username').textContent = data.username || '--';
+        document.getElementById('active-password').textContent = data.password || '--';
+
+        // Standby credential card
+        var standbyCard = document.getElementById('standby-card');
+        document.getElementById('standby-indicator').textContent = standbyAcct;
+        if (state === 'grace_period' && data.standby_username) {
+            standbyCard.className = 'account-card account-card-standby';
+            document.getElementById('standby-indicator').className = 'account-indicator indicator-standby';
+            document.getElementById('standby-card-title').textContent = 'Standby Account (' + standbyAcct + ') — Password Changed';
+            document.getElementById('standby-username').textContent = data.standby_username || '--';
+            document.getElementById('standby-password').textContent = data.standby_password || '--';
+        } else {
+            standbyCard.className = 'account-card account-card-hidden';
+            document.getElementById('standby-indicator').className = 'account-indicator indicator-hidden';
+            document.getElementById('standby-card-title').textContent = 'Standby Account (' + standbyAcct + ')';
+            document.getElementById('standby-username').textContent = '--';
+            document.getElementById('standby-password').textContent = '●●●●●●●●';
+        }
+
+        // Last poll time
+        document.getElementById('last-poll-time').textContent = new Date().toLocaleTimeString();
+
+        // Hide error banner on success
+        document.getElementById('error-banner').style.display = 'none';
+    }
+
+    function showError(msg) {
+        var banner = document.getElementById('error-banner');
+        banner.textContent = 'Vault polling error: ' + msg;
+        banner.style.display = 'block';
+    }
+
+    // Interpolate TTL between polls
+    var lastPollTime = 0;
+    var lastTTL = 0;
+    function interpolateTick() {
+        if (!lastData) return;
+        var elapsed = (Date.now() - lastPollTime) / 1000;
+        var currentTTL = Math.max(0, lastTTL - elapsed);
+        document.getElementById('ttl-value').textContent = formatTime(currentTTL);
+        var ttlPct = rotationPeriod > 0 ? (currentTTL / rotationPeriod) * 100 : 0;
+        document.getElementById('ttl-bar').style.width = ttlPct + '%';
+
+        // Update grace countdown if in grace period
+        if (lastData.rotation_state === 'grace_period' && lastData.grace_period_end) {
+            var graceEnd = new Date(lastData.grace_period_end).getTime();
+            var gr = Math.max(0, (graceEnd - Date.now()) / 1000);
+            document.getElementById('grace-value').textContent = formatTime(gr);
+            var gPct = gracePeriod > 0 ? (gr / gracePeriod) * 100 : 0;
+            document.getElementById('grace-bar').style.width = gPct + '%';
+        }
+    }
+
+    // The snapshot's ttl is as of when it was taken, so age it by `age` seconds
+    function applySnapshot(data, age) {
+        if (data.error) { showError(data.error); return; }
+        lastPollTime = Date.now() - age * 1000;
+        lastTTL = data.ttl || 0;
+        updateUI(data);
+        if (data.stale) { showError('Vault unreachable, showing last known credentials (' + data.stale_age + 's old)'); }
+        interpolateTick();
+    }
+
+    // Fallback: long-poll with the last revision seen; the server holds the request
+    // until a new version is published and answers 304 if none arrives in time
+    var revision = null;
+    function poll() {
+        var url = revision === null ? '/api/credentials'
+            : '/api/credentials?wait_version=' + revision + '&timeout=25';
+        fetch(url, { cache: 'no-store' })
+            .then(function(r) {
+                if (r.status === 304) { return null; }
+                if (!r.ok) { throw new Error('Server returned ' + r.status); }
+                var age = parseInt(r.headers.get('Age') || '0', 10);
+                return r.json().then(function(data) { return { data: data, age: age }; });
+            })
+            .then(function(result) {
+                if (!result) {
+                    document.getElementById('last-poll-time').textContent = new Date().toLocaleTimeString();
+                } else {
+                    if (result.data.revision !== undefined) { revision = result.data.revision; }
+                    applySnapshot(result.data, result.age);
+                }
+                poll();
+            })
+            .catch(function(e) { showError(e.message); setTimeout(poll, 5000); });
+    }
+
+    var polling = false;
+    function startPolling() {
+        if (polling) { return; }
+        polling = true;
+        poll();
+    }
+
+    // Prefer the push stream: the server sends a snapshot only when credentials change
+    if (window.EventSource) {
+        var source = new EventSource('/api/credentials/stream');
+        source.addEventListener('credentials', function(e) {
+            var msg = JSON.parse(e.data);
+            applySnapshot(msg.snapshot, msg.age);
+        });
+        source.onerror = function() {
+            // EventSource reconnects by itself unless the server refused the stream
+            if (source.readyState === EventSource.CLOSED) { startPolling(); }
+        };
+    } else {
+        startPolling();
+    }
+    // Smooth interpolation every second between polls
+    setInterval(interpolateTick, 1000);
+})();
+"""
+
+# Hashed file name -> (body, mimetype, etag)
+STATIC_ASSETS = {}
+
+
+def _register_static_asset(name, body, mimetype):
+    """Publish an asset under a content-hashed file name and return its URL."""
+    body = body.encode('utf-8')
+    digest = hashlib.sha256(body).hexdigest()[:12]
+    stem, ext = os.path.splitext(name)
+    hashed_name = f'{stem}.{digest}{ext}'
+    STATIC_ASSETS[hashed_name] = (body, mimetype, digest)
+    compression_cache.register_static(digest)
+    return f'/static/{hashed_name}'
+
+
+VAULT_LOGO_URL = _register_static_asset('vault-logo.svg', VAULT_LOGO_SVG, 'image/svg+xml')
+SINGLE_ACCOUNT_CSS_URL = _register_static_asset('single-account.css', SINGLE_ACCOUNT_CSS, 'text/css')
+DUAL_ACCOUNT_CSS_URL = _register_static_asset('dual-account.css', DUAL_ACCOUNT_CSS, 'text/css')
+DUAL_ACCOUNT_JS_URL = _register_static_asset('dual-account.js', DUAL_ACCOUNT_JS, 'text/javascript')
+
+
+# ─── Single-Account HTML Template ───────────────────────────────────────────
 HTML_TEMPLATE = """
 <!DOCTYPE html>
 <html lang="en">
@@ -224,104 +2461,13 @@ HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Vault LDAP Credentials Demo</title>
-    <style>
-        :root {
-            --color-vault: #FFD814;
-            --color-black: #000000;
-            --color-surface-primary: #FFFFFF;
-            --color-surface-secondary: #F7F8FA;
-            --color-surface-tertiary: #EBEEF2;
-            --color-surface-strong: #000000;
-            --color-foreground-primary: #1F2D3D;
-            --color-foreground-strong: #000000;
-            --color-foreground-faint: #5F6F84;
-            --color-foreground-success: #15834D;
-            --color-border-primary: #D9DEE5;
-            --color-border-strong: #A7B1BF;
-            --color-highlight: #5B3DE0;
-            --color-success: #15834D;
-            --color-success-surface: #DDF4E8;
-            --font-family-text: -apple-system, BlinkMacSystemFont, "Segoe UI", "Roboto", "Oxygen", "Ubuntu", "Cantarell", "Fira Sans", "Droid Sans", "Helvetica Neue", sans-serif;
-            --font-family-code: "SF Mono", Monaco, "Cascadia Mono", "Roboto Mono", Consolas, "Courier New", monospace;
-            --font-size-display-500: 30px;
-            --font-size-display-400: 24px;
-            --font-size-display-300: 20px;
-            --font-size-body-300: 16px;
-            --font-size-body-200: 14px;
-            --font-size-body-100: 12px;
-            --line-height-display: 1.2;
-            --line-height-body: 1.5;
-            --font-weight-regular: 400;
-            --font-weight-medium: 500;
-            --font-weight-semibold: 600;
-            --font-weight-bold: 700;
-            --spacing-050: 2px;
-            --spacing-100: 4px;
-            --spacing-200: 8px;
-            --spacing-300: 12px;
-            --spacing-400: 16px;
-            --spacing-500: 24px;
-            --spacing-600: 32px;
-            --spacing-700: 40px;
-            --spacing-800: 48px;
-            --radius-small: 4px;
-            --radius-medium: 8px;
-            --radius-large: 12px;
-            --elevation-mid: 0 8px 16px rgba(31, 45, 61, 0.12);
-            --elevation-high: 0 12px 24px rgba(31, 45, 61, 0.16);
-        }
-        *, *::before, *::after { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: var(--font-family-text); background-color: var(--color-surface-strong); min-height: 100vh; display: flex; align-items: center; justify-content: center; padding: var(--spacing-500); color: var(--color-foreground-primary); }
-        .container { background: var(--color-surface-primary); border-radius: var(--radius-large); box-shadow: var(--elevation-high); max-width: 900px; width: 100%; overflow: hidden; }
-        .brand-header { background: var(--color-black); color: var(--color-surface-primary); padding: var(--spacing-600) var(--spacing-700); text-align: center; border-bottom: 3px solid var(--color-vault); position: relative; }
-        .brand-header-content { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); margin-bottom: var(--spacing-400); }
-        .vault-logo { width: 48px; height: 48px; flex-shrink: 0; }
-        .brand-header h1 { font-size: var(--font-size-display-400); font-weight: var(--font-weight-semibold); line-height: var(--line-height-display); margin: 0; color: var(--color-surface-primary); }
-        .brand-header p { font-size: var(--font-size-body-300); color: var(--color-surface-tertiary); margin: 0; line-height: var(--line-height-body); }
-        .version-tag { position: absolute; top: var(--spacing-300); right: var(--spacing-400); font-size: 11px; color: var(--color-foreground-faint); font-family: var(--font-family-code); opacity: 0.7; }
-        .status-badge { display: inline-flex; align-items: center; gap: var(--spacing-100); background: var(--color-success); color: var(--color-surface-primary); padding: var(--spacing-100) var(--spacing-300); border-radius: var(--radius-large); font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); text-transform: uppercase; letter-spacing: 0.5px; margin-top: var(--spacing-300); }
-        .status-badge::before { content: ''; width: 8px; height: 8px; border-radius: 50%; background: var(--color-surface-primary); animation: pulse 2s ease-in-out infinite; }
-        @keyframes pulse { 0%, 100% { opacity: 1; } 50% { opacity: 0.5; } }
-        .content { padding: var(--spacing-700); }
-        .section-title { font-size: var(--font-size-display-300); font-weight: var(--font-weight-semibold); color: var(--color-foreground-strong); margin-bottom: var(--spacing-500); padding-bottom: var(--spacing-300); border-bottom: 2px solid var(--color-surface-tertiary); }
-        .credentials-grid { display: grid; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
-        .credential-card { background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); transition: all 0.2s ease; }
-        .credential-card:hover { border-color: var(--color-border-strong); box-shadow: var(--elevation-mid); }
-        .credential-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-200); display: flex; align-items: center; gap: var(--spacing-200); }
-        .credential-label::before { content: ''; width: 4px; height: 12px; background: var(--color-vault); border-radius: 2px; }
-        .credential-value { font-family: var(--font-family-code); font-size: var(--font-size-body-200); color: var(--color-foreground-strong); background: var(--color-surface-primary); padding: var(--spacing-300); border-radius: var(--radius-small); border: 1px solid var(--color-border-primary); word-break: break-all; line-height: 1.6; }
-        .countdown-card { background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-600); text-align: center; }
-        .countdown-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-300); }
-        .countdown-display { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); }
-        .countdown-value { font-family: var(--font-family-code); font-size: var(--font-size-display-500); font-weight: var(--font-weight-bold); color: var(--color-foreground-strong); min-width: 80px; }
-        .countdown-unit { font-size: var(--font-size-body-200); color: var(--color-foreground-faint); font-weight: var(--font-weight-medium); }
-        .countdown-bar-track { height: 6px; background: var(--color-surface-tertiary); border-radius: 3px; margin-top: var(--spacing-400); overflow: hidden; }
-        .countdown-bar-fill { height: 100%; background: var(--color-vault); border-radius: 3px; transition: width 1s linear; }
-        .info-section { background: var(--color-success-surface); border: 1px solid rgba(21, 131, 77, 0.3); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-500); }
-        .info-section-title { font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); color: var(--color-success); margin-bottom: var(--spacing-300); display: flex; align-items: center; gap: var(--spacing-200); }
-        .info-section p { font-size: var(--font-size-body-200); color: var(--color-foreground-primary); line-height: var(--line-height-body); margin: 0; }
-        .metadata { display: flex; align-items: center; justify-content: space-between; padding: var(--spacing-500); background: var(--color-surface-secondary); border-top: 1px solid var(--color-border-primary); font-size: var(--font-size-body-200); color: var(--color-foreground-faint); }
-        .metadata strong { color: var(--color-foreground-strong); font-weight: var(--font-weight-medium); }
-        .powered-by { display: flex; align-items: center; gap: var(--spacing-200); }
-        .powered-by a { color: var(--color-highlight); text-decoration: none; font-weight: var(--font-weight-medium); transition: color 0.2s ease; }
-        .powered-by a:hover { color: var(--color-foreground-strong); text-decoration: underline; }
-        .refresh-btn { display: none; margin-top: var(--spacing-400); padding: var(--spacing-300) var(--spacing-600); background: var(--color-vault); color: var(--color-black); border: none; border-radius: var(--radius-medium); font-family: var(--font-family-text); font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); cursor: pointer; transition: all 0.2s ease; }
-        .refresh-btn:hover { background: #e6c200; box-shadow: var(--elevation-mid); }
-        .refresh-btn.visible { display: inline-block; animation: fadeIn 0.3s ease-in; }
-        @keyframes fadeIn { from { opacity: 0; transform: translateY(4px); } to { opacity: 1; transform: translateY(0); } }
-        .delivery-method-card { background: linear-gradient(135deg, var(--color-surface-secondary), var(--color-surface-tertiary)); border: 1px solid var(--color-vault); border-radius: var(--radius-medium); padding: var(--spacing-300) var(--spacing-500); margin-bottom: var(--spacing-500); text-align: center; }
-        .delivery-method-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); }
-        .delivery-method-value { font-size: var(--font-size-body-300); font-weight: var(--font-weight-bold); color: var(--color-vault); }
-        @media (max-width: 640px) { body { padding: var(--spacing-300); } .brand-header { padding: var(--spacing-500); } .brand-header h1 { font-size: var(--font-size-display-300); } .content { padding: var(--spacing-500); } .metadata { flex-direction: column; gap: var(--spacing-300); text-align: center; } }
-    </style>
+    <link rel="stylesheet" href="{{ stylesheet_url }}">
 </head>
 <body>
     <div class="container">
         <div class="brand-header">
             <div class="brand-header-content">
-                <svg class="vault-logo" viewBox="0 0 51 51" xmlns="http://www.w3.org/2000/svg">
-                    <path fill="#FFD814" fill-rule="nonzero" d="M0,0 L25.4070312,51 L51,0 L0,0 Z M28.5,10.5 L31.5,10.5 L31.5,13.5 L28.5,13.5 L28.5,10.5 Z M22.5,22.5 L19.5,22.5 L19.5,19.5 L22.5,19.5 L22.5,22.5 Z M22.5,18 L19.5,18 L19.5,15 L22.5,15 L22.5,18 Z M22.5,13.5 L19.5,13.5 L19.5,10.5 L22.5,10.5 L22.5,13.5 Z M26.991018,27 L24,27 L24,24 L27,24 L26.991018,27 Z M26.991018,22.5 L24,22.5 L24,19.5 L27,19.5 L26.991018,22.5 Z M26.991018,18 L24,18 L24,15 L27,15 L26.991018,18 Z M26.991018,13.5 L24,13.5 L24,10.5 L27,10.5 L26.991018,13.5 Z M28.5,15 L31.5,15 L31.5,18 L28.5089552,18 L28.5,15 Z M28.5,22.5 L28.5,19.5 L31.5,19.5 L31.5,22.4601182 L28.5,22.5 Z"/>
-                </svg>
+                <img class="vault-logo" src="{{ logo_url }}" alt="HashiCorp Vault">
                 <h1>Vault LDAP Credentials</h1>
             </div>
             <p>Automatically rotated credentials managed by HashiCorp Vault</p>
@@ -408,140 +2554,13 @@ DUAL_ACCOUNT_HTML_TEMPLATE = """
     <meta charset="UTF-8">
     <meta name="viewport" content="width=device-width, initial-scale=1.0">
     <title>Vault LDAP Credentials Demo - Dual Account</title>
-    <style>
-        :root {
-            --color-vault: #FFD814;
-            --color-black: #000000;
-            --color-surface-primary: #FFFFFF;
-            --color-surface-secondary: #F7F8FA;
-            --color-surface-tertiary: #EBEEF2;
-            --color-surface-strong: #000000;
-            --color-foreground-primary: #1F2D3D;
-            --color-foreground-strong: #000000;
-            --color-foreground-faint: #5F6F84;
-            --color-border-primary: #D9DEE5;
-            --color-border-strong: #A7B1BF;
-            --color-highlight: #5B3DE0;
-            --color-success: #15834D;
-            --color-success-surface: #DDF4E8;
-            /* Timeline colors matching reference SVG */
-            --color-active: #B3D9FF;
-            --color-grace: #FFFFCC;
-            --color-inactive: #FFB3B3;
-            --color-active-text: #1a5276;
-            --color-grace-text: #7d6608;
-            --color-inactive-text: #922b21;
-            --font-family-text: -apple-system, BlinkMacSystemFont, "Segoe UI", "Roboto", "Oxygen", "Ubuntu", "Cantarell", "Fira Sans", "Droid Sans", "Helvetica Neue", sans-serif;
-            --font-family-code: "SF Mono", Monaco, "Cascadia Mono", "Roboto Mono", Consolas, "Courier New", monospace;
-            --font-size-display-500: 30px;
-            --font-size-display-400: 24px;
-            --font-size-display-300: 20px;
-            --font-size-body-300: 16px;
-            --font-size-body-200: 14px;
-            --font-size-body-100: 12px;
-            --line-height-display: 1.2;
-            --line-height-body: 1.5;
-            --font-weight-regular: 400;
-            --font-weight-medium: 500;
-            --font-weight-semibold: 600;
-            --font-weight-bold: 700;
-            --spacing-050: 2px;
-            --spacing-100: 4px;
-            --spacing-200: 8px;
-            --spacing-300: 12px;
-            --spacing-400: 16px;
-            --spacing-500: 24px;
-            --spacing-600: 32px;
-            --spacing-700: 40px;
-            --spacing-800: 48px;
-            --radius-small: 4px;
-            --radius-medium: 8px;
-            --radius-large: 12px;
-            --elevation-mid: 0 8px 16px rgba(31, 45, 61, 0.12);
-            --elevation-high: 0 12px 24px rgba(31, 45, 61, 0.16);
-        }
-        *, *::before, *::after { margin: 0; padding: 0; box-sizing: border-box; }
-        body { font-family: var(--font-family-text); background-color: var(--color-surface-strong); min-height: 100vh; display: flex; align-items: center; justify-content: center; padding: var(--spacing-500); color: var(--color-foreground-primary); }
-        .container { background: var(--color-surface-primary); border-radius: var(--radius-large); box-shadow: var(--elevation-high); max-width: 960px; width: 100%; overflow: hidden; }
-        .brand-header { background: var(--color-black); color: var(--color-surface-primary); padding: var(--spacing-600) var(--spacing-700); text-align: center; border-bottom: 3px solid var(--color-vault); position: relative; }
-        .brand-header-content { display: flex; align-items: center; justify-content: center; gap: var(--spacing-400); margin-bottom: var(--spacing-400); }
-        .vault-logo { width: 48px; height: 48px; flex-shrink: 0; }
-        .brand-header h1 { font-size: var(--font-size-display-400); font-weight: var(--font-weight-semibold); line-height: var(--line-height-display); margin: 0; color: var(--color-surface-primary); }
-        .brand-header p { font-size: var(--font-size-body-300); color: var(--color-surface-tertiary); margin: 0; }
-        .version-tag { position: absolute; top: var(--spacing-300); right: var(--spacing-400); font-size: 11px; color: var(--color-foreground-faint); font-family: var(--font-family-code); opacity: 0.7; }
-        .status-badge { display: inline-flex; align-items: center; gap: var(--spacing-100); padding: var(--spacing-100) var(--spacing-300); border-radius: var(--radius-large); font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); text-transform: uppercase; letter-spacing: 0.5px; margin-top: var(--spacing-300); }
-        .status-badge-active { background: var(--color-success); color: #fff; }
-        .status-badge-grace { background: var(--color-vault); color: var(--color-black); }
-        .status-badge::before { content: ''; width: 8px; height: 8px; border-radius: 50%; background: currentColor; opacity: 0.6; animation: pulse 2s ease-in-out infinite; }
-        @keyframes pulse { 0%, 100% { opacity: 0.6; } 50% { opacity: 0.2; } }
-
-        .content { padding: var(--spacing-600) var(--spacing-700); }
-
-        /* ── Rotation Timeline ── */
-
-        /* ── Countdown timers ── */
-        .timers-row { display: flex; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
-        .timer-card { flex: 1; background: var(--color-surface-secondary); border: 1px solid var(--color-border-primary); border-radius: var(--radius-medium); padding: var(--spacing-500); text-align: center; }
-        .timer-card-grace { border-color: #d4a500; background: var(--color-grace); }
-        .countdown-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-200); }
-        .countdown-value { font-family: var(--font-family-code); font-size: var(--font-size-display-500); font-weight: var(--font-weight-bold); color: var(--color-foreground-strong); }
-        .countdown-unit { font-size: var(--font-size-body-200); color: var(--color-foreground-faint); margin-left: var(--spacing-200); }
-        .countdown-bar-track { height: 6px; background: var(--color-surface-tertiary); border-radius: 3px; margin-top: var(--spacing-300); overflow: hidden; }
-        .countdown-bar-fill { height: 100%; border-radius: 3px; transition: width 1s linear; }
-        .bar-fill-vault { background: var(--color-vault); }
-        .bar-fill-grace { background: #d4a500; }
-
-        /* ── Credential cards ── */
-        .section-title { font-size: var(--font-size-display-300); font-weight: var(--font-weight-semibold); color: var(--color-foreground-strong); margin-bottom: var(--spacing-500); padding-bottom: var(--spacing-300); border-bottom: 2px solid var(--color-surface-tertiary); }
-        .account-cards { display: grid; grid-template-columns: 1fr 1fr; gap: var(--spacing-400); margin-bottom: var(--spacing-600); }
-        .account-card { border-radius: var(--radius-medium); padding: var(--spacing-500); border: 1px solid var(--color-border-primary); }
-        .account-card-active { background: #eaf4ff; border-left: 4px solid #5dade2; }
-        .account-card-standby { background: var(--color-grace); border-left: 4px solid #d4a500; }
-        .account-card-hidden { background: var(--color-surface-secondary); border-left: 4px solid var(--color-border-primary); opacity: 0.5; }
-        .account-card-header { display: flex; align-items: center; gap: var(--spacing-200); font-weight: var(--font-weight-semibold); margin-bottom: var(--spacing-400); font-size: var(--font-size-body-300); }
-        .account-indicator { display: inline-flex; align-items: center; justify-content: center; width: 28px; height: 28px; border-radius: 50%; font-size: var(--font-size-body-100); font-weight: var(--font-weight-bold); }
-        .indicator-active { background: var(--color-active); color: var(--color-active-text); }
-        .indicator-standby { background: var(--color-grace); color: var(--color-grace-text); border: 2px solid #d4a500; }
-        .indicator-hidden { background: var(--color-inactive); color: var(--color-inactive-text); }
-        .credential-row { display: grid; grid-template-columns: 1fr 1fr; gap: var(--spacing-300); }
-        .credential-item { }
-        .credential-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); display: flex; align-items: center; gap: var(--spacing-200); }
-        .credential-label::before { content: ''; width: 4px; height: 12px; background: var(--color-vault); border-radius: 2px; }
-        .credential-value { font-family: var(--font-family-code); font-size: var(--font-size-body-200); color: var(--color-foreground-strong); background: var(--color-surface-primary); padding: var(--spacing-200) var(--spacing-300); border-radius: var(--radius-small); border: 1px solid var(--color-border-primary); word-break: break-all; }
-
-        .info-section { background: var(--color-success-surface); border: 1px solid rgba(21, 131, 77, 0.3); border-radius: var(--radius-medium); padding: var(--spacing-500); margin-bottom: var(--spacing-500); }
-        .info-section-title { font-size: var(--font-size-body-300); font-weight: var(--font-weight-semibold); color: var(--color-success); margin-bottom: var(--spacing-300); }
-        .info-section p { font-size: var(--font-size-body-200); color: var(--color-foreground-primary); line-height: var(--line-height-body); margin: 0; }
-
-        .metadata { display: flex; align-items: center; justify-content: space-between; padding: var(--spacing-500); background: var(--color-surface-secondary); border-top: 1px solid var(--color-border-primary); font-size: var(--font-size-body-200); color: var(--color-foreground-faint); }
-        .metadata strong { color: var(--color-foreground-strong); font-weight: var(--font-weight-medium); }
-        .powered-by { display: flex; align-items: center; gap: var(--spacing-200); }
-        .powered-by a { color: var(--color-highlight); text-decoration: none; font-weight: var(--font-weight-medium); }
-        .powered-by a:hover { color: var(--color-foreground-strong); text-decoration: underline; }
-
-        .error-banner { background: #fdecea; border: 1px solid #e74c3c; border-radius: var(--radius-medium); padding: var(--spacing-400); margin-bottom: var(--spacing-500); color: #922b21; font-size: var(--font-size-body-200); display: none; }
-
-        .delivery-method-card { background: linear-gradient(135deg, var(--color-surface-secondary), var(--color-surface-tertiary)); border: 1px solid var(--color-vault); border-radius: var(--radius-medium); padding: var(--spacing-300) var(--spacing-500); margin-bottom: var(--spacing-500); text-align: center; }
-        .delivery-method-label { font-size: var(--font-size-body-100); font-weight: var(--font-weight-semibold); color: var(--color-foreground-faint); text-transform: uppercase; letter-spacing: 0.5px; margin-bottom: var(--spacing-100); }
-        .delivery-method-value { font-size: var(--font-size-body-300); font-weight: var(--font-weight-bold); color: var(--color-vault); }
-
-        @media (max-width: 768px) {
-            body { padding: var(--spacing-300); }
-            .content { padding: var(--spacing-500); }
-            .account-cards { grid-template-columns: 1fr; }
-            .timers-row { flex-direction: column; }
-            .credential-row { grid-template-columns: 1fr; }
-            .metadata { flex-direction: column; gap: var(--spacing-300); text-align: center; }
-        }
-    </style>
+    <link rel="stylesheet" href="{{ stylesheet_url }}">
 </head>
 <body>
     <div class="container">
         <div class="brand-header">
             <div class="brand-header-content">
-                <svg class="vault-logo" viewBox="0 0 51 51" xmlns="http://www.w3.org/2000/svg">
-                    <path fill="#FFD814" fill-rule="nonzero" d="M0,0 L25.4070312,51 L51,0 L0,0 Z M28.5,10.5 L31.5,10.5 L31.5,13.5 L28.5,13.5 L28.5,10.5 Z M22.5,22.5 L19.5,22.5 L19.5,19.5 L22.5,19.5 L22.5,22.5 Z M22.5,18 L19.5,18 L19.5,15 L22.5,15 L22.5,18 Z M22.5,13.5 L19.5,13.5 L19.5,10.5 L22.5,10.5 L22.5,13.5 Z M26.991018,27 L24,27 L24,24 L27,24 L26.991018,27 Z M26.991018,22.5 L24,22.5 L24,19.5 L27,19.5 L26.991018,22.5 Z M26.991018,18 L24,18 L24,15 L27,15 L26.991018,18 Z M26.991018,13.5 L24,13.5 L24,10.5 L27,10.5 L26.991018,13.5 Z M28.5,15 L31.5,15 L31.5,18 L28.5089552,18 L28.5,15 Z M28.5,22.5 L28.5,19.5 L31.5,19.5 L31.5,22.4601182 L28.5,22.5 Z"/>
-                </svg>
+                <img class="vault-logo" src="{{ logo_url }}" alt="HashiCorp Vault">
                 <h1>Vault LDAP Credentials</h1>
             </div>
             <p>Dual-Account (Blue/Green) Credential Rotation</p>
@@ -619,8 +2638,8 @@ DUAL_ACCOUNT_HTML_TEMPLATE = """
                     Two AD service accounts are managed simultaneously with blue/green rotation.
                     When a rotation occurs, the standby account's password is changed and it becomes
                     the new active account. During the grace period, both credentials are valid —
-                    giving applications time to switch. This app polls Vault directly every second
-                    for real-time data. The timeline above shows the current position in the rotation cycle.
+                    giving applications time to switch. This app polls Vault in the background and
+                    pushes each new credential version to the page as it appears. The timeline above shows the current position in the rotation cycle.
                 </p>
             </div>
         </div>
@@ -631,292 +2650,1344 @@ DUAL_ACCOUNT_HTML_TEMPLATE = """
         </div>
     </div>
 
-    <script>
-    (function() {
-        var rotationPeriod = 0;
-        var gracePeriod = 0;
-        var lastData = null;
-
-        function formatTime(s) { return Math.max(0, Math.ceil(s)); }
-
-        function updateUI(data) {
-            lastData = data;
-            rotationPeriod = data.rotation_period || 100;
-            gracePeriod = data.grace_period || 20;
-            var ttl = data.ttl || 0;
-            var state = data.rotation_state || 'active';
-            var activeAcct = (data.active_account || 'a').toUpperCase();
-            var standbyAcct = activeAcct === 'A' ? 'B' : 'A';
-
-            // TTL countdown
-            document.getElementById('ttl-value').textContent = formatTime(ttl);
-            var ttlPct = rotationPeriod > 0 ? (ttl / rotationPeriod) * 100 : 0;
-            document.getElementById('ttl-bar').style.width = ttlPct + '%';
-
-            // Grace period timer
-            var graceTimerCard = document.getElementById('grace-timer-card');
-            var stateBadge = document.getElementById('state-badge');
-            if (state === 'grace_period') {
-                graceTimerCard.style.display = '';
-                graceTimerCard.className = 'timer-card timer-card-grace';
-                var graceEnd = data.grace_period_end ? new Date(data.grace_period_end).getTime() : 0;
-                var graceRemaining = graceEnd > 0 ? Math.max(0, (graceEnd - Date.now()) / 1000) : 0;
-                document.getElementById('grace-value').textContent = formatTime(graceRemaining);
-                var gracePctRemaining = gracePeriod > 0 ? (graceRemaining / gracePeriod) * 100 : 0;
-                document.getElementById('grace-bar').style.width = gracePctRemaining + '%';
-                stateBadge.className = 'status-badge status-badge-grace';
-                stateBadge.textContent = '● Grace Period';
-            } else {
-                graceTimerCard.style.display = 'none';
-                stateBadge.className = 'status-badge status-badge-active';
-                stateBadge.textContent = '● Active';
-            }
+    <script src="{{ script_url }}" defer></script>
+</body>
+</html>
+"""
 
-            // Active credential card
-            document.getElementById('active-indicator').textContent = activeAcct;
-            document.getElementById('active-card-title').textContent = 'Active Account (' + activeAcct + ')';
-            document.getElementById('active-username').textContent = data.username || '--';
-            document.getElementById('active-password').textContent = data.password || '--';
-
-            // Standby credential card
-            var standbyCard = document.getElementById('standby-card');
-            document.getElementById('standby-indicator').textContent = standbyAcct;
-            if (state === 'grace_period' && data.standby_username) {
-                standbyCard.className = 'account-card account-card-standby';
-                document.getElementById('standby-indicator').className = 'account-indicator indicator-standby';
-                document.getElementById('standby-card-title').textContent = 'Standby Account (' + standbyAcct + ') — Password Changed';
-                document.getElementById('standby-username').textContent = data.standby_username || '--';
-                document.getElementById('standby-password').textContent = data.standby_password || '--';
-            } else {
-                standbyCard.className = 'account-card account-card-hidden';
-                document.getElementById('standby-indicator').className = 'account-indicator indicator-hidden';
-                document.getElementById('standby-card-title').textContent = 'Standby Account (' + standbyAcct + ')';
-                document.getElementById('standby-username').textContent = '--';
-                document.getElementById('standby-password').textContent = '●●●●●●●●';
-            }
 
-            // Last poll time
-            document.getElementById('last-poll-time').textContent = new Date().toLocaleTimeString();
+# Dual-account role served by /api/credentials (fixed for the life of the pod)
+LDAP_MOUNT_PATH = os.getenv('LDAP_MOUNT_PATH', 'ldap')
+LDAP_STATIC_ROLE_NAME = os.getenv('LDAP_STATIC_ROLE_NAME', 'dual-rotation-demo')
+# Env-delivered credentials never change while the process runs
+_env_snapshot = CredentialSnapshot.from_env()
+# Served until a file-based method's first read lands; built once so it keeps one version
+_empty_file_snapshot = CredentialSnapshot.from_mapping({}, 'file')
 
-            // Hide error banner on success
-            document.getElementById('error-banner').style.display = 'none';
-        }
 
-        function showError(msg) {
-            var banner = document.getElementById('error-banner');
-            banner.textContent = 'Vault polling error: ' + msg;
-            banner.style.display = 'block';
-        }
+def _get_credentials_from_source():
+    """Get the credential snapshot for the configured SECRET_DELIVERY_METHOD.
 
-        // Interpolate TTL between polls
-        var lastPollTime = 0;
-        var lastTTL = 0;
-        function interpolateTick() {
-            if (!lastData) return;
-            var elapsed = (Date.now() - lastPollTime) / 1000;
-            var currentTTL = Math.max(0, lastTTL - elapsed);
-            document.getElementById('ttl-value').textContent = formatTime(currentTTL);
-            var ttlPct = rotationPeriod > 0 ? (currentTTL / rotationPeriod) * 100 : 0;
-            document.getElementById('ttl-bar').style.width = ttlPct + '%';
-
-            // Update grace countdown if in grace period
-            if (lastData.rotation_state === 'grace_period' && lastData.grace_period_end) {
-                var graceEnd = new Date(lastData.grace_period_end).getTime();
-                var gr = Math.max(0, (graceEnd - Date.now()) / 1000);
-                document.getElementById('grace-value').textContent = formatTime(gr);
-                var gPct = gracePeriod > 0 ? (gr / gracePeriod) * 100 : 0;
-                document.getElementById('grace-bar').style.width = gPct + '%';
-            }
-        }
+    File-based methods read the cache's latest snapshot; otherwise the
+    snapshot of env vars delivered by Vault Secrets Operator is used.
+    Follower workers serve whatever the leader published.
+    """
+    if shared_snapshots:
+        return shared_snapshots.get() or _env_snapshot
+    if file_cred_cache and SECRET_DELIVERY_METHOD in ('vault-agent-sidecar', 'vault-csi-driver'):
+        return file_cred_cache.get_snapshot() or _empty_file_snapshot
+    return _env_snapshot
+
+
+def _api_payload(snapshot, now=None):
+    """Build the /api/credentials JSON body from a snapshot."""
+    # Env fallback shows placeholders; Vault and file sources show blanks
+    missing = 'Not configured' if snapshot.source == 'env' else ''
+    payload = {
+        'username': snapshot.username or missing,
+        'password': snapshot.password or missing,
+        'dn': snapshot.dn or '',
+        'active_account': snapshot.active_account or 'a',
+        'rotation_state': snapshot.rotation_state or 'active',
+        'dual_account_mode': snapshot.dual_account_mode if snapshot.dual_account_mode is not None else True,
+        'rotation_period': snapshot.rotation_period or ROTATION_PERIOD_DEFAULT,
+        'ttl': snapshot.ttl_remaining(now) or 0,
+        'last_vault_rotation': snapshot.last_vault_rotation or '',
+        'grace_period': GRACE_PERIOD,
+        'grace_period_end': snapshot.grace_period_end or '',
+        'standby_username': snapshot.standby_username or '',
+        'standby_password': snapshot.standby_password or '',
+        'standby_dn': snapshot.standby_dn or '',
+    }
+    if snapshot.source == 'file':
+        payload['source'] = 'file_cache_fallback'
+    elif snapshot.source == 'env':
+        payload['error'] = 'Vault client not available, showing env var fallback'
+    return payload
 
-        function poll() {
-            fetch('/api/credentials')
-                .then(function(r) { return r.json(); })
-                .then(function(data) {
-                    if (data.error) { showError(data.error); return; }
-                    lastPollTime = Date.now();
-                    lastTTL = data.ttl || 0;
-                    updateUI(data);
-                })
-                .catch(function(e) { showError(e.message); });
-        }
 
-        // Initial poll, then every 5 seconds for fresh Vault data
-        poll();
-        setInterval(poll, 5000);
-        // Smooth interpolation every second between polls
-        setInterval(interpolateTick, 1000);
-    })();
-    </script>
-</body>
-</html>
-"""
+_delivery_method_display = DELIVERY_METHOD_DISPLAY.get(SECRET_DELIVERY_METHOD, SECRET_DELIVERY_METHOD)
 
 
-def _get_credentials_from_source():
-    """Get credentials based on the configured SECRET_DELIVERY_METHOD.
-    
-    Returns a dict with keys: username, password, last_vault_password, 
-    rotation_period, rotation_ttl
+# Built once, by warm_page_caches() for the page this pod serves, rather than per
+# request by render_template_string() or for both pages at import
+@functools.cache
+def _single_account_template():
+    return app.jinja_env.from_string(HTML_TEMPLATE)
+
+
+@functools.cache
+def _dual_account_page():
+    """The dual-account page and its ETag; it has no per-request data (the script fetches it)."""
+    page = app.jinja_env.from_string(DUAL_ACCOUNT_HTML_TEMPLATE).render(
+        version=APP_VERSION,
+        delivery_method_display=_delivery_method_display,
+        stylesheet_url=DUAL_ACCOUNT_CSS_URL,
+        logo_url=VAULT_LOGO_URL,
+        script_url=DUAL_ACCOUNT_JS_URL,
+    ).encode('utf-8')
+    etag = hashlib.sha256(page).hexdigest()[:32]
+    compression_cache.register_static(etag)
+    return page, etag
+
+
+def warm_page_caches():
+    """Build this pod's page and pre-compress it and its assets, so the first visitor pays for neither.
+
+    Only the page DUAL_ACCOUNT_MODE selects is built, as on first use. Called
+    from start_background_workers(); importing the module still does no work.
     """
-    # For file-based methods, use cached credentials
-    if file_cred_cache and SECRET_DELIVERY_METHOD in ('vault-agent-sidecar', 'vault-csi-driver'):
-        creds = file_cred_cache.get_credentials()
-        
-        # Map file keys to expected credential keys
-        # For vault-agent-sidecar (key=value file format): LDAP_USERNAME, LDAP_PASSWORD, etc.
-        # For vault-csi-driver (individual files): username, password, etc. OR LDAP_USERNAME, etc.
-        username = creds.get('LDAP_USERNAME') or creds.get('username') or 'Not configured'
-        password = creds.get('LDAP_PASSWORD') or creds.get('password') or 'Not configured'
-        last_vault_password = (creds.get('LDAP_LAST_VAULT_PASSWORD') or 
-                              creds.get('last_vault_password') or 'Not configured')
-        rotation_period = int(creds.get('ROTATION_PERIOD') or 
-                             creds.get('rotation_period') or 
-                             os.getenv('ROTATION_PERIOD', '30'))
-        rotation_ttl = int(creds.get('ROTATION_TTL') or 
-                          creds.get('rotation_ttl') or 
-                          os.getenv('ROTATION_TTL', '0'))
-        
-        return {
-            'username': username,
-            'password': password,
-            'last_vault_password': last_vault_password,
-            'rotation_period': rotation_period,
-            'rotation_ttl': rotation_ttl,
-        }
-    
-    # Default: read from environment variables (vault-secrets-operator mode)
-    return {
-        'username': os.getenv('LDAP_USERNAME', 'Not configured'),
-        'password': os.getenv('LDAP_PASSWORD', 'Not configured'),
-        'last_vault_password': os.getenv('LDAP_LAST_VAULT_PASSWORD', 'Not configured'),
-        'rotation_period': int(os.getenv('ROTATION_PERIOD', '30')),
-        'rotation_ttl': int(os.getenv('ROTATION_TTL', '0')),
-    }
+    dual_account_mode = os.getenv('DUAL_ACCOUNT_MODE', '').lower() == 'true'
+    if dual_account_mode:
+        page, etag = _dual_account_page()
+        bodies = [(page, etag)]
+        urls = (DUAL_ACCOUNT_CSS_URL, DUAL_ACCOUNT_JS_URL, VAULT_LOGO_URL)
+    else:
+        _single_account_template()
+        bodies = []
+        urls = (SINGLE_ACCOUNT_CSS_URL, VAULT_LOGO_URL)
+    for url in urls:
+        body, _, etag = STATIC_ASSETS[url.rsplit('/', 1)[1]]
+        bodies.append((body, etag))
+    for body, etag in bodies:
+        if len(body) >= COMPRESSION_MIN_SIZE:
+            for encoding in ('br', 'gzip') if brotli else ('gzip',):
+                compression_cache.get(etag, body, encoding)
 
 
 @app.route('/')
 def index():
     """Display LDAP credentials."""
     dual_account_mode = os.getenv('DUAL_ACCOUNT_MODE', '').lower() == 'true'
-    delivery_method_display = DELIVERY_METHOD_DISPLAY.get(
-        SECRET_DELIVERY_METHOD, SECRET_DELIVERY_METHOD)
 
     if dual_account_mode:
-        # Dual-account mode — page is rendered with JS that polls /api/credentials
-        return render_template_string(
-            DUAL_ACCOUNT_HTML_TEMPLATE, 
-            version=APP_VERSION,
-            delivery_method_display=delivery_method_display
-        )
+        # Dual-account mode — pre-rendered page whose script streams /api/credentials
+        page, etag = _dual_account_page()
+        response = Response(page, mimetype='text/html')
+        set_representation_etag(response, etag, len(page), 'text/html')
+        response.headers['Cache-Control'] = 'no-cache'
+        return response.make_conditional(request)
     else:
         # Single-account mode — read credentials based on delivery method
-        creds = _get_credentials_from_source()
+        snapshot = _get_credentials_from_source()
         credentials = {
-            'username': creds['username'],
-            'password': creds['password'],
-            'last_vault_password': creds['last_vault_password'],
-            'rotation_period': creds['rotation_period'],
-            'rotation_ttl': creds['rotation_ttl'],
+            'username': snapshot.username or 'Not configured',
+            'password': snapshot.password or 'Not configured',
+            'last_vault_password': snapshot.last_vault_rotation or 'Not configured',
+            'rotation_period': snapshot.rotation_period or 30,
+            'rotation_ttl': snapshot.ttl_remaining() or 0,
             'current_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S UTC'),
-            'delivery_method_display': delivery_method_display,
+            'delivery_method_display': _delivery_method_display,
         }
-        return render_template_string(HTML_TEMPLATE, version=APP_VERSION, **credentials)
+        return _single_account_template().render(
+            version=APP_VERSION,
+            stylesheet_url=SINGLE_ACCOUNT_CSS_URL,
+            logo_url=VAULT_LOGO_URL,
+            **credentials
+        )
 
 
-@app.route('/api/credentials')
-def api_credentials():
-    """Return live credential data from Vault (dual-account mode only)."""
-    mount_path = os.getenv('LDAP_MOUNT_PATH', 'ldap')
-    role_name = os.getenv('LDAP_STATIC_ROLE_NAME', 'dual-rotation-demo')
-    rotation_period = int(os.getenv('ROTATION_PERIOD', '300'))
-    grace_period = int(os.getenv('GRACE_PERIOD', '60'))
-
-    # Try direct Vault polling first
-    if vault_client:
-        data = vault_client.read_static_creds(mount_path, role_name)
-        if data:
-            return jsonify({
-                'username': data.get('username', ''),
-                'password': data.get('password', ''),
-                'dn': data.get('dn', ''),
-                'active_account': data.get('active_account', 'a'),
-                'rotation_state': data.get('rotation_state', 'active'),
-                'dual_account_mode': data.get('dual_account_mode', True),
-                'rotation_period': data.get('rotation_period', rotation_period),
-                'ttl': data.get('ttl', 0),
-                'last_vault_rotation': data.get('last_vault_rotation', ''),
-                'grace_period': grace_period,
-                'grace_period_end': data.get('grace_period_end', ''),
-                'standby_username': data.get('standby_username', ''),
-                'standby_password': data.get('standby_password', ''),
-                'standby_dn': data.get('standby_dn', ''),
-            })
+@app.route('/static/<filename>')
+def static_asset(filename):
+    """Serve a content-hashed CSS/SVG/JS asset with a long-lived immutable cache header."""
+    asset = STATIC_ASSETS.get(filename)
+    if asset is None:
+        return {'error': 'not found'}, 404
+    body, mimetype, etag = asset
+    response = Response(body, mimetype=mimetype)
+    set_representation_etag(response, etag, len(body), mimetype)
+    # The file name changes whenever the content does, so browsers never need to revalidate
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response.make_conditional(request)
+
+
+def _registry_snapshot(mount, role_name, timeout=None):
+    """Latest registry snapshot for (mount, role), waiting up to timeout (VAULT_POLL_INITIAL_WAIT) for its first read."""
+    snapshot = credential_poller.get_snapshot(mount, role_name)
+    if snapshot is None and not (vault_client and not vault_client.breaker.is_closed):
+        # No point waiting on a first read while the breaker is failing Vault calls fast
+        snapshot = credential_poller.wait_for_snapshot(
+            mount, role_name, VAULT_POLL_INITIAL_WAIT if timeout is None else timeout)
+    return snapshot
+
+
+def _stale_age(snapshot, mount=None, role_name=None):
+    """Seconds since a Vault snapshot was last confirmed, when Vault is currently failing; else None."""
+    source = credential_poller or shared_snapshots
+    if not source or snapshot.source != 'vault':
+        return None
+    return source.stale_age(mount or LDAP_MOUNT_PATH, role_name or LDAP_STATIC_ROLE_NAME)
+
+
+def _mark_stale(body, stale_age):
+    """Add stale/stale_age to a cached JSON object body without re-serializing it."""
+    if stale_age is None:
+        return body
+    return body[:-1] + b',"stale":true,"stale_age":%d}' % stale_age
+
+
+def _current_snapshot():
+    """Pick the snapshot /api/credentials serves: Vault poller, then file cache, then env."""
+    # Followers serve the leader's published snapshot
+    if shared_snapshots:
+        snapshot = shared_snapshots.get()
+        if snapshot:
+            return snapshot
+
+    # Serve the background poller's snapshot first (no Vault I/O on this path)
+    if credential_poller:
+        snapshot = _registry_snapshot(LDAP_MOUNT_PATH, LDAP_STATIC_ROLE_NAME)
+        if snapshot:
+            return snapshot
 
     # Fallback to file-based credentials (agent sidecar / CSI driver)
     if file_cred_cache:
-        creds = file_cred_cache.get_credentials()
-        if creds:
-            # Parse JSON blob for CSI full-response mode
-            json_blob = creds.get('ldap-creds.json', '')
-            if json_blob:
-                try:
-                    parsed = json.loads(json_blob)
-                    creds.update(parsed)
-                except (json.JSONDecodeError, TypeError):
-                    pass
-
-            username = creds.get('LDAP_USERNAME') or creds.get('username', '')
-            password = creds.get('LDAP_PASSWORD') or creds.get('password', '')
-            last_rotation = creds.get('LDAP_LAST_VAULT_PASSWORD') or creds.get('last_vault_rotation', '')
-            rot_period = int(creds.get('ROTATION_PERIOD') or creds.get('rotation_period', rotation_period))
-            # Calculate TTL dynamically from last_vault_rotation + rotation_period
-            computed_ttl = int(creds.get('ROTATION_TTL') or creds.get('ttl', 0))
-            if last_rotation:
-                try:
-                    from datetime import datetime, timezone
-                    rot_time = datetime.fromisoformat(last_rotation.replace('Z', '+00:00'))
-                    elapsed = (datetime.now(timezone.utc) - rot_time).total_seconds()
-                    computed_ttl = max(0, int(rot_period - elapsed))
-                except Exception:
-                    pass
-            return jsonify({
-                'username': username,
-                'password': password,
-                'active_account': creds.get('ACTIVE_ACCOUNT') or creds.get('active_account', 'a'),
-                'rotation_state': creds.get('ROTATION_STATE') or creds.get('rotation_state', 'active'),
-                'dual_account_mode': True,
-                'rotation_period': rot_period,
-                'ttl': computed_ttl,
-                'last_vault_rotation': last_rotation,
-                'grace_period': grace_period,
-                'grace_period_end': creds.get('GRACE_PERIOD_END') or creds.get('grace_period_end', ''),
-                'standby_username': creds.get('STANDBY_USERNAME') or creds.get('standby_username', ''),
-                'standby_password': creds.get('STANDBY_PASSWORD') or creds.get('standby_password', ''),
-                'source': 'file_cache_fallback',
-            })
+        snapshot = file_cred_cache.get_snapshot()
+        if snapshot:
+            return snapshot
+
     # Fallback to env vars
-    return jsonify({
-        'username': os.getenv('LDAP_USERNAME', 'Not configured'),
-        'password': os.getenv('LDAP_PASSWORD', 'Not configured'),
-        'active_account': os.getenv('ACTIVE_ACCOUNT', 'a'),
-        'rotation_state': os.getenv('ROTATION_STATE', 'active'),
-        'dual_account_mode': True,
-        'rotation_period': rotation_period,
-        'ttl': int(os.getenv('ROTATION_TTL', '0')),
-        'grace_period': grace_period,
-        'grace_period_end': os.getenv('GRACE_PERIOD_END', ''),
-        'standby_username': os.getenv('STANDBY_USERNAME', ''),
-        'standby_password': os.getenv('STANDBY_PASSWORD', ''),
-        'error': 'Vault client not available, showing env var fallback'
-    })
+    return _env_snapshot
+
+
+class SerializedResponseCache:
+    """Pre-serialized JSON bodies and strong ETags, built once per snapshot version.
+
+    The cached body reports ttl as of the snapshot's ttl_as_of; responses carry
+    an Age header so clients can age it themselves without a new body.
+    """
+
+    def __init__(self, max_entries=256):
+        self._max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, snapshot):
+        """Return (body bytes, etag) for a snapshot, serializing it on first use."""
+        # Versions from a shared-memory leader and this process's own can overlap; created_at tells them apart
+        key = (snapshot.version, snapshot.created_at)
+        entry = self._entries.get(key)
+        if entry is not None:
+            return entry
+
+        entry = self._serialize(snapshot)
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    @staticmethod
+    @traced('snapshot.serialize')
+    def _serialize(snapshot):
+        """Serialize a snapshot to (JSON bytes, ETag)."""
+        payload = _api_payload(snapshot, now=snapshot.ttl_as_of)
+        payload['version'] = snapshot.version
+        payload['revision'] = snapshot.revision
+        body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+        # Hash of the exact bytes, as a strong ETag requires. The body carries this process's
+        # version and ttl_as_of, so ETags are per process: another replica's never match.
+        return body, hashlib.sha256(body).hexdigest()[:32]
+
+
+response_cache = SerializedResponseCache()
+
+
+def _snapshot_response(snapshot, stale_age=None):
+    """Serve a snapshot's cached JSON bytes, or 304 when the client's ETag matches.
+
+    Stale snapshots (Vault failing) are always sent in full, flagged stale and without an ETag.
+    """
+    body, etag = response_cache.get(snapshot)
+    if stale_age is not None:
+        response = Response(_mark_stale(body, stale_age), mimetype='application/json')
+        response.headers['Age'] = str(max(0, int(time.time() - snapshot.ttl_as_of)))
+        response.headers['Cache-Control'] = 'no-cache'
+        return response
+    if request.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    set_representation_etag(response, etag, len(body), 'application/json')
+    response.headers['Age'] = str(max(0, int(time.time() - snapshot.ttl_as_of)))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _published_role_snapshot(mount, role_name):
+    """Snapshot of a role not polled in this process: a leader-published role or an agent-file section."""
+    if shared_snapshots:
+        return shared_snapshots.get_role(mount, role_name)
+    return file_cred_cache.get_role_snapshot(mount, role_name) if file_cred_cache else None
+
+
+def _bulk_credentials_response(roles_param):
+    """Serve several registry or agent-file roles in one body, reusing each role's cached JSON bytes."""
+    if roles_param.strip() == '*':
+        keys = credential_poller.roles() if credential_poller else []
+        for source in (file_cred_cache, shared_snapshots):
+            if source:
+                keys += [key for key in source.roles() if key not in keys]
+    else:
+        try:
+            keys = [parse_role_key(entry) for entry in roles_param.split(',') if entry.strip()]
+        except ValueError as e:
+            return {'error': str(e)}, 400
+
+    now = time.time()
+    # The poller reads cold roles concurrently, so the whole request shares one first-read wait
+    deadline = time.monotonic() + VAULT_POLL_INITIAL_WAIT
+    parts, missing = [], []
+    for mount, role_name in keys:
+        snapshot = None
+        if credential_poller and credential_poller.is_registered(mount, role_name):
+            snapshot = _registry_snapshot(mount, role_name, max(0.0, deadline - time.monotonic()))
+        else:
+            snapshot = _published_role_snapshot(mount, role_name)
+        if snapshot is None:
+            missing.append(f'{mount}/{role_name}')
+            continue
+        body, _ = response_cache.get(snapshot)
+        body = _mark_stale(body, _stale_age(snapshot, mount, role_name))
+        age = max(0, int(now - snapshot.ttl_as_of))
+        parts.append(b'%s:{"age":%d,"snapshot":%s}' % (
+            json.dumps(f'{mount}/{role_name}').encode('utf-8'), age, body))
+    body = b''.join((b'{"roles":{', b','.join(parts), b'},"missing":',
+                     json.dumps(missing).encode('utf-8'), b'}'))
+    response = Response(body, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+# Long-poll: ?wait_version=<revision>&timeout=<seconds> holds the request until the revision changes
+LONG_POLL_DEFAULT_TIMEOUT = float(os.getenv('LONG_POLL_DEFAULT_TIMEOUT', '30'))
+LONG_POLL_MAX_TIMEOUT = float(os.getenv('LONG_POLL_MAX_TIMEOUT', '60'))
+_LONG_POLL_ARGS_ERROR = {'error': 'wait_version must be a revision and timeout a non-negative number'}
+
+
+def _long_poll_args(args):
+    """Return (wait_version, timeout) from query args; wait_version is None when not long-polling.
+
+    wait_version is the `revision` of a previous body. Raises ValueError for
+    an empty wait_version or a malformed timeout. The timeout is capped at
+    LONG_POLL_MAX_TIMEOUT.
+    """
+    wait_version = args.get('wait_version')
+    if wait_version is None:
+        return None, 0
+    if not wait_version:
+        raise ValueError(wait_version)
+    timeout = args.get('timeout')
+    timeout = LONG_POLL_DEFAULT_TIMEOUT if not timeout else float(timeout)
+    if not timeout >= 0:
+        raise ValueError(timeout)
+    return wait_version, min(timeout, LONG_POLL_MAX_TIMEOUT)
+
+
+def _wait_for_new_version(current, wait_version, timeout):
+    """Block until current() returns a snapshot whose revision isn't wait_version, or timeout.
+
+    Any other revision counts as new, so a client that last talked to another
+    replica (or sends a bare version number) is answered at once. Returns the
+    latest snapshot (None if it vanished).
+    """
+    deadline = time.monotonic() + timeout
+    generation = snapshot_updates.generation
+    snapshot = current()
+    if snapshot is None or snapshot.revision != wait_version:
+        return snapshot
+    snapshot_updates.subscribe('long_poll')
+    try:
+        while snapshot is not None and snapshot.revision == wait_version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            generation = snapshot_updates.wait(generation, remaining)
+            snapshot = current()
+    finally:
+        snapshot_updates.unsubscribe('long_poll')
+    return snapshot
+
+
+def _long_poll_response(snapshot, wait_version, stale_age=None):
+    """304 (with the current ETag) if the revision never moved past wait_version, else the snapshot.
+
+    A stale snapshot is always sent in full, as _snapshot_response() does.
+    """
+    if snapshot.revision != wait_version or stale_age is not None:
+        return _snapshot_response(snapshot, stale_age)
+    body, etag = response_cache.get(snapshot)
+    response = Response(status=304)
+    set_representation_etag(response, etag, len(body), 'application/json')
+    response.headers['Age'] = str(max(0, int(time.time() - snapshot.ttl_as_of)))
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@app.route('/api/credentials')
+def api_credentials():
+    """Return live credential data (Vault poller snapshot, file cache or env fallback).
+
+    With ?roles=mount/role,... (or ?roles=*) returns several registry roles at once.
+    With ?wait_version=R[&timeout=S] waits up to S seconds for a revision other
+    than R, then returns it, or 304 if nothing was published.
+    """
+    roles_param = request.args.get('roles')
+    if roles_param is not None:
+        if not credential_poller and not file_cred_cache and not shared_snapshots:
+            return {'error': 'Vault client not available'}, 503
+        return _bulk_credentials_response(roles_param)
+    try:
+        wait_version, timeout = _long_poll_args(request.args)
+    except ValueError:
+        return _LONG_POLL_ARGS_ERROR, 400
+    if wait_version is not None:
+        snapshot = _wait_for_new_version(_current_snapshot, wait_version, timeout)
+        return _long_poll_response(snapshot, wait_version, _stale_age(snapshot))
+    snapshot = _current_snapshot()
+    return _snapshot_response(snapshot, _stale_age(snapshot))
+
+
+def _role_snapshot_source(mount, role_name):
+    """(snapshot, current, None) for a role, where current() re-reads it; (None, None, (body, status)) on error."""
+    if not credential_poller or not credential_poller.is_registered(mount, role_name):
+        snapshot = _published_role_snapshot(mount, role_name)
+        if snapshot is None:
+            if not credential_poller and not file_cred_cache and not shared_snapshots:
+                return None, None, ({'error': 'Vault client not available'}, 503)
+            return None, None, ({'error': f'role {mount}/{role_name} is not in the registry'}, 404)
+        return snapshot, functools.partial(_published_role_snapshot, mount, role_name), None
+    snapshot = _registry_snapshot(mount, role_name)
+    if snapshot is None:
+        return None, None, ({'error': f'credentials for {mount}/{role_name} not read from Vault yet'}, 503)
+    return snapshot, functools.partial(credential_poller.get_snapshot, mount, role_name), None
+
+
+@app.route('/api/credentials/<path:mount>/<role_name>')
+def api_role_credentials(mount, role_name):
+    """Return one registry role's credentials, with the same ETag/Age/long-poll handling as /api/credentials.
+
+    Roles not polled from Vault are looked up in the sections of a multi-role
+    agent file, or in the leader's published snapshots on a follower worker.
+    """
+    try:
+        wait_version, timeout = _long_poll_args(request.args)
+    except ValueError:
+        return _LONG_POLL_ARGS_ERROR, 400
+    snapshot, current, error = _role_snapshot_source(mount, role_name)
+    if error:
+        return error
+    if wait_version is not None:
+        snapshot = _wait_for_new_version(current, wait_version, timeout)
+        if snapshot is None:
+            return {'error': f'role {mount}/{role_name} is not in the registry'}, 404
+        return _long_poll_response(snapshot, wait_version, _stale_age(snapshot, mount, role_name))
+    return _snapshot_response(snapshot, _stale_age(snapshot, mount, role_name))
+
+
+# Seconds between SSE comment heartbeats on an idle stream
+SSE_HEARTBEAT_INTERVAL = float(os.getenv('SSE_HEARTBEAT_INTERVAL', '15'))
+# Sent in addition to the event-stream content type; X-Accel-Buffering stops nginx buffering
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def _sse_event(snapshot, stale_age=None):
+    """Encode a snapshot as an SSE `credentials` event around its cached JSON body."""
+    body = _mark_stale(response_cache.get(snapshot)[0], stale_age)
+    age = max(0, int(time.time() - snapshot.ttl_as_of))
+    return b''.join((
+        b'id: %s\nevent: credentials\ndata: {"age":%d,"snapshot":' % (snapshot.revision.encode(), age),
+        body,
+        b'}\n\n',
+    ))
+
+
+@app.route('/api/credentials/stream')
+def api_credentials_stream():
+    """Push the current snapshot as Server-Sent Events whenever its version changes."""
+    last_event_id = request.headers.get('Last-Event-ID', '')
+
+    def generate():
+        snapshot_updates.subscribe()
+        try:
+            # Tell EventSource how quickly to reconnect after a dropped connection
+            yield b'retry: 3000\n\n'
+            # (revision, stale) last sent; a new revision or a stale flip sends an event. An ID
+            # from another process (or a bare version) never matches, so that client is resent.
+            last_state = (last_event_id, False)
+            generation = snapshot_updates.generation
+            while True:
+                snapshot = _current_snapshot()
+                stale_age = _stale_age(snapshot)
+                if (snapshot.revision, stale_age is not None) != last_state:
+                    last_state = (snapshot.revision, stale_age is not None)
+                    yield _sse_event(snapshot, stale_age)
+                new_generation = snapshot_updates.wait(generation, SSE_HEARTBEAT_INTERVAL)
+                if new_generation == generation:
+                    # Idle: a comment line keeps proxies from closing the connection
+                    yield b': heartbeat\n\n'
+                generation = new_generation
+        finally:
+            snapshot_updates.unsubscribe()
+
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers.update(SSE_HEADERS)
+    return response
+
+
+def _snapshot_samples(value_of):
+    """Yield ((source, role), value) for every published snapshot, for the per-role gauges."""
+    now = time.time()
+    if credential_poller:
+        for mount, role_name in credential_poller.roles():
+            snapshot = credential_poller.get_snapshot(mount, role_name)
+            if snapshot:
+                yield ('vault', f'{mount}/{role_name}'), value_of(snapshot, now)
+    if file_cred_cache:
+        snapshot = file_cred_cache.get_snapshot()
+        if snapshot:
+            yield ('file', SECRET_DELIVERY_METHOD), value_of(snapshot, now)
+    if shared_snapshots:
+        for mount, role_name in shared_snapshots.roles():
+            yield ('shared', f'{mount}/{role_name}'), value_of(shared_snapshots.get_role(mount, role_name), now)
+
+
+def _stale_samples():
+    if credential_poller:
+        for mount, role_name in credential_poller.roles():
+            yield (f'{mount}/{role_name}',), int(credential_poller.stale_age(mount, role_name) is not None)
+    if shared_snapshots:
+        for mount, role_name in shared_snapshots.roles():
+            yield (f'{mount}/{role_name}',), int(shared_snapshots.stale_age(mount, role_name) is not None)
+
+
+_BREAKER_STATE_VALUES = {CircuitBreaker.CLOSED: 0, CircuitBreaker.HALF_OPEN: 1, CircuitBreaker.OPEN: 2}
+
+metrics.gauge('credential_snapshot_version', 'Version of the latest snapshot, by role.', ('source', 'role'),
+              lambda: _snapshot_samples(lambda snapshot, now: snapshot.version))
+metrics.gauge('credential_snapshot_age_seconds', 'Seconds since the snapshot content last changed, by role.',
+              ('source', 'role'), lambda: _snapshot_samples(lambda snapshot, now: now - snapshot.created_at))
+metrics.gauge('credential_snapshot_stale', '1 while Vault reads for the role are failing.', ('role',),
+              _stale_samples)
+metrics.gauge('credential_stream_connections', 'Connected credential stream subscribers.', (),
+              lambda: [((), snapshot_updates.subscribers)])
+metrics.gauge('credential_long_poll_connections', 'Long-poll requests waiting for a new credential version.', (),
+              lambda: [((), snapshot_updates.long_polls)])
+metrics.gauge('vault_circuit_breaker_state', 'Vault circuit breaker: 0 closed, 1 half-open, 2 open.', (),
+              lambda: [((), _BREAKER_STATE_VALUES[vault_client.breaker.state])] if vault_client else [])
+
+
+def _coalescing_samples():
+    if not vault_client:
+        return
+    for operation, counts in vault_client.coalescing_stats().items():
+        for outcome, value in sorted(counts.items()):
+            yield (operation, outcome), value
+
+
+metrics.counter('vault_singleflight_calls', 'Vault logins and reads by whether they ran or joined one in flight.',
+                ('operation', 'outcome'), _coalescing_samples)
+
+
+@app.route('/metrics')
+def metrics_endpoint():
+    """Prometheus scrape endpoint."""
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@app.route('/debug/traces')
+def debug_traces():
+    """Recent spans from the in-memory ring buffer (OTEL_TRACES_EXPORTER=memory)."""
+    if trace_ring is None:
+        return {'error': 'in-memory trace buffer is not enabled'}, 404
+    return {'spans': trace_ring.spans()}
 
 
 @app.route('/health')
 def health():
-    """Health check endpoint for Kubernetes liveness/readiness probes."""
+    """Liveness check: the process is up and serving (see /ready for credential freshness)."""
     return {'status': 'healthy', 'timestamp': datetime.now().isoformat()}, 200
 
 
+# Readiness thresholds. /ready only reads in-memory state, so probing it adds no Vault or file I/O.
+# A Vault role failing for longer than this (seconds since its last good read) makes the pod unready
+READY_MAX_STALE_AGE = float(os.getenv('READY_MAX_STALE_AGE', '300'))
+# Seconds since the served credentials last changed before the pod is unready (0 disables;
+# for file delivery, a little over ROTATION_PERIOD + GRACE_PERIOD catches an agent that stopped rendering)
+READY_MAX_SNAPSHOT_AGE = float(os.getenv('READY_MAX_SNAPSHOT_AGE', '0'))
+# The Vault token must have more than this many seconds left
+READY_MIN_TOKEN_TTL = float(os.getenv('READY_MIN_TOKEN_TTL', '0'))
+# By default an open breaker alone doesn't fail readiness: stale credentials are still served
+READY_FAIL_ON_OPEN_BREAKER = os.getenv('READY_FAIL_ON_OPEN_BREAKER', 'false').lower() == 'true'
+
+
+def readiness(now=None):
+    """Return (ready, checks) from in-memory state only: no Vault or file I/O and no waiting.
+
+    The snapshot must exist (first Vault read done, files read or the leader
+    published), the default role must not have been failing for more than
+    READY_MAX_STALE_AGE, and with a Vault client the token must outlive
+    READY_MIN_TOKEN_TTL. Each check reports the values it was decided on.
+    """
+    now = time.time() if now is None else now
+    snapshot = None
+    if shared_snapshots:
+        snapshot = shared_snapshots.get()
+    if snapshot is None and credential_poller:
+        snapshot = credential_poller.get_snapshot(LDAP_MOUNT_PATH, LDAP_STATIC_ROLE_NAME)
+    if snapshot is None and file_cred_cache:
+        snapshot = file_cred_cache.get_snapshot()
+    if not (shared_snapshots or credential_poller or file_cred_cache):
+        snapshot = _env_snapshot
+
+    checks = {}
+    if snapshot is None:
+        checks['snapshot'] = {'ok': False}
+    else:
+        age = max(0, int(now - snapshot.created_at))
+        checks['snapshot'] = {
+            'ok': not (READY_MAX_SNAPSHOT_AGE > 0 and age > READY_MAX_SNAPSHOT_AGE),
+            'source': snapshot.source,
+            'version': snapshot.version,
+            'age': age,
+        }
+        stale_age = _stale_age(snapshot)
+        checks['refresh'] = {'ok': stale_age is None or stale_age <= READY_MAX_STALE_AGE, 'stale_age': stale_age}
+        if credential_poller:
+            last_success = credential_poller.last_success(LDAP_MOUNT_PATH, LDAP_STATIC_ROLE_NAME)
+            checks['refresh']['last_success_age'] = (
+                None if last_success is None else max(0, int(now - last_success)))
+    if vault_client:
+        expires_in = vault_client.token_expires_in(now)
+        checks['token'] = {
+            'ok': expires_in is not None and expires_in > READY_MIN_TOKEN_TTL,
+            'expires_in': None if expires_in is None else int(expires_in),
+        }
+        state = vault_client.breaker.state
+        checks['breaker'] = {'ok': not (READY_FAIL_ON_OPEN_BREAKER and state == CircuitBreaker.OPEN), 'state': state}
+    return all(check['ok'] for check in checks.values()), checks
+
+
+def _readiness_response():
+    """(status code, JSON body) for /ready."""
+    ready, checks = readiness()
+    body = json.dumps({'status': 'ready' if ready else 'not ready', 'checks': checks},
+                      separators=(',', ':')).encode('utf-8')
+    return (200 if ready else 503), body
+
+
+@app.route('/ready')
+def ready():
+    """Readiness check: 200 while the served credentials are fresh, else 503 with the failing checks."""
+    status, body = _readiness_response()
+    response = Response(body, status=status, mimetype='application/json')
+    response.headers['Cache-Control'] = 'no-store'
+    return response
+
+
+# ─── Shared Snapshot Segment ────────────────────────────────────────────────
+# With several worker processes per pod, SNAPSHOT_SHARING=leader runs the Vault
+# poller / file watcher once and publishes every snapshot into an mmap-backed
+# file (tmpfs by default); SNAPSHOT_SHARING=follower workers map the same file
+# and only read it, so Vault and file refreshes cost the same per pod whatever
+# the worker count, and every worker serves the same snapshot versions.
+SHARED_SNAPSHOT_PATH = os.getenv('SHARED_SNAPSHOT_PATH', '/dev/shm/vault-ldap-demo.snapshot')
+SHARED_SNAPSHOT_SIZE = int(os.getenv('SHARED_SNAPSHOT_SIZE', str(1024 * 1024)))
+# How often followers check the segment's sequence number to wake streams and long-polls
+SHARED_SNAPSHOT_POLL_INTERVAL = float(os.getenv('SHARED_SNAPSHOT_POLL_INTERVAL', '0.1'))
+
+
+class SnapshotSegment:
+    """One published payload in a shared file, guarded by a seqlock.
+
+    Layout: magic, a 64-bit sequence number, the payload length, its CRC-32,
+    then the payload. The single writer makes the sequence odd, writes
+    payload, length and checksum, then makes it even again; readers copy the
+    payload between two reads of the sequence and retry if it was odd or
+    moved, so neither side takes a lock.
+
+    Python gives no memory barriers around mmap stores. On x86 (total store
+    order) the writer's stores become visible in program order, which is all
+    the sequence check needs; on weakly ordered CPUs (ARM) a reader could see
+    the even sequence before the payload bytes land. The checksum covers that
+    case: a payload that does not match it is treated as torn and re-read.
+    """
+
+    MAGIC = b'VLDSNAP2'
+    _HEADER = struct.Struct('<8sQII')
+    _SEQUENCE = struct.Struct('<Q')
+    # Payload length and its CRC-32
+    _PAYLOAD_INFO = struct.Struct('<II')
+    _SEQUENCE_OFFSET = 8
+    _PAYLOAD_INFO_OFFSET = 16
+
+    def __init__(self, path, size=SHARED_SNAPSHOT_SIZE, create=False):
+        self.path = path
+        fd = os.open(path, (os.O_RDWR | os.O_CREAT) if create else os.O_RDONLY, 0o600)
+        try:
+            if create and os.fstat(fd).st_size < size:
+                os.ftruncate(fd, size)
+            if os.fstat(fd).st_size < self._HEADER.size:
+                raise ValueError(f'{path} is not a snapshot segment')
+            self._mm = mmap.mmap(fd, 0, prot=mmap.PROT_READ | (mmap.PROT_WRITE if create else 0))
+        finally:
+            os.close(fd)
+        magic, sequence, _, _ = self._HEADER.unpack_from(self._mm)
+        if not create:
+            if magic != self.MAGIC:
+                self._mm.close()
+                raise ValueError(f'{path} is not a snapshot segment')
+        elif magic != self.MAGIC:
+            self._HEADER.pack_into(self._mm, 0, self.MAGIC, 0, 0, 0)
+        elif sequence & 1:
+            # The previous leader died mid-write: drop its payload but keep the
+            # sequence moving so followers still notice the next publish
+            self._PAYLOAD_INFO.pack_into(self._mm, self._PAYLOAD_INFO_OFFSET, 0, zlib.crc32(b''))
+            self._SEQUENCE.pack_into(self._mm, self._SEQUENCE_OFFSET, sequence + 1)
+
+    @property
+    def sequence(self):
+        """Current sequence number; odd while a write is in progress."""
+        return self._SEQUENCE.unpack_from(self._mm, self._SEQUENCE_OFFSET)[0]
+
+    def publish(self, payload):
+        """Replace the payload (leader only); returns the new sequence number."""
+        end = self._HEADER.size + len(payload)
+        if end > len(self._mm):
+            raise ValueError(f'{len(payload)}-byte snapshot payload does not fit in {self.path}; '
+                             f'raise SHARED_SNAPSHOT_SIZE')
+        sequence = self.sequence + 1
+        self._SEQUENCE.pack_into(self._mm, self._SEQUENCE_OFFSET, sequence)
+        self._mm[self._HEADER.size:end] = payload
+        self._PAYLOAD_INFO.pack_into(self._mm, self._PAYLOAD_INFO_OFFSET, len(payload), zlib.crc32(payload))
+        self._SEQUENCE.pack_into(self._mm, self._SEQUENCE_OFFSET, sequence + 1)
+        return sequence + 1
+
+    def read(self, attempts=1000):
+        """Return (sequence, payload) from one complete publish; payload is b'' before the first."""
+        for _ in range(attempts):
+            sequence = self.sequence
+            if not sequence & 1:
+                length, checksum = self._PAYLOAD_INFO.unpack_from(self._mm, self._PAYLOAD_INFO_OFFSET)
+                payload = self._mm[self._HEADER.size:self._HEADER.size + length]
+                if self.sequence == sequence and zlib.crc32(payload) == checksum:
+                    return sequence, payload
+            # The writer is mid-publish (or its stores are not all visible yet); let it finish
+            time.sleep(0)
+        raise TimeoutError(f'{self.path} stayed mid-write for {attempts} reads')
+
+    def close(self):
+        self._mm.close()
+
+
+def _shared_entry(snapshot, stale_since=None):
+    return {'snapshot': asdict(snapshot), 'stale_since': stale_since}
+
+
+def _shared_payload():
+    """Everything a follower serves: the default snapshot plus every registry and agent-file role."""
+    roles = {}
+    if file_cred_cache:
+        for mount, role_name in file_cred_cache.roles():
+            roles[f'{mount}/{role_name}'] = _shared_entry(file_cred_cache.get_role_snapshot(mount, role_name))
+    if credential_poller:
+        for mount, role_name in credential_poller.roles():
+            snapshot = credential_poller.get_snapshot(mount, role_name)
+            if snapshot:
+                roles[f'{mount}/{role_name}'] = _shared_entry(
+                    snapshot, credential_poller.stale_since(mount, role_name))
+    default = credential_poller and credential_poller.get_snapshot(LDAP_MOUNT_PATH, LDAP_STATIC_ROLE_NAME)
+    if not default and file_cred_cache:
+        default = file_cred_cache.get_snapshot()
+    return {'default': asdict(default or _env_snapshot), 'roles': roles}
+
+
+class SnapshotPublisher:
+    """Leader side: writes this process's snapshots into the segment whenever one changes.
+
+    Wakes on every snapshot_updates notification and, as a backstop, every
+    `interval` seconds; the payload is only written when its bytes changed.
+    """
+
+    def __init__(self, segment, collect, interval=1.0):
+        self._segment = segment
+        self._collect = collect
+        self._interval = interval
+        self._last_payload = None
+        self._running = False
+        self._thread = None
+
+    def publish(self):
+        """Publish the current snapshots if they differ from the last payload written."""
+        payload = json.dumps(self._collect(), separators=(',', ':')).encode('utf-8')
+        if payload != self._last_payload:
+            sequence = self._segment.publish(payload)
+            self._last_payload = payload
+            logger.debug("Published %d-byte snapshot payload to %s (sequence %d)",
+                         len(payload), self._segment.path, sequence)
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True, name='snapshot-publisher')
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        snapshot_updates.notify()
+
+    def _run(self):
+        while self._running:
+            generation = snapshot_updates.generation
+            try:
+                self.publish()
+            except Exception as e:
+                logger.error("Failed to publish shared snapshots: %s", e)
+            snapshot_updates.wait(generation, self._interval)
+
+
+class SharedSnapshots:
+    """Follower side: the leader's snapshots, decoded once per published sequence.
+
+    Lookups cost one read of the segment's sequence number while nothing
+    changed; only after a publish is the payload copied and decoded, and
+    snapshots whose version did not change keep their identity so cached
+    response bodies stay valid. A watcher thread notifies snapshot_updates
+    when the sequence moves, waking streams and long-polls in this worker.
+    """
+
+    def __init__(self, path, poll_interval=SHARED_SNAPSHOT_POLL_INTERVAL):
+        self.path = path
+        self._poll_interval = poll_interval
+        self._segment = None
+        self._next_open_at = 0.0
+        # (sequence, default snapshot, {'mount/role': (snapshot, stale_since)})
+        self._state = (None, None, {})
+        self._lock = threading.Lock()
+        self._running = False
+        self._thread = None
+
+    def _open(self):
+        """Map the leader's segment, retrying at most once a second until it exists."""
+        now = time.monotonic()
+        if now < self._next_open_at:
+            return None
+        self._next_open_at = now + 1.0
+        try:
+            self._segment = SnapshotSegment(self.path)
+        except (OSError, ValueError) as e:
+            logger.debug("Shared snapshot segment %s not available yet: %s", self.path, e)
+        return self._segment
+
+    def _current(self):
+        state = self._state
+        segment = self._segment or self._open()
+        if segment is None or segment.sequence == state[0]:
+            return state
+        with self._lock:
+            if segment.sequence != self._state[0]:
+                try:
+                    self._state = self._decode(*segment.read())
+                except TimeoutError as e:
+                    # Keep serving the last good snapshots; the next lookup reads again
+                    logger.warning("Shared snapshot read failed, serving the previous publish: %s", e)
+            return self._state
+
+    def _decode(self, sequence, payload):
+        if not payload:
+            return sequence, None, {}
+        try:
+            data = json.loads(payload)
+        except ValueError as e:
+            # Keep serving the previous snapshots; the next lookup reads again
+            logger.error("Undecodable shared snapshot payload (sequence %d): %s", sequence, e)
+            return self._state
+        _, previous_default, previous_roles = self._state
+
+        def build(fields, previous):
+            if previous is not None and previous.version == fields['version'] \
+                    and previous.created_at == fields['created_at']:
+                return previous
+            return CredentialSnapshot(**fields)
+
+        default = build(data['default'], previous_default)
+        roles = {
+            name: (build(entry['snapshot'], previous_roles.get(name, (None,))[0]), entry['stale_since'])
+            for name, entry in data['roles'].items()
+        }
+        return sequence, default, roles
+
+    def get(self):
+        """The leader's default snapshot, or None before its first publish."""
+        return self._current()[1]
+
+    def get_role(self, mount, role_name):
+        entry = self._current()[2].get(f'{mount}/{role_name}')
+        return entry[0] if entry else None
+
+    def stale_age(self, mount, role_name):
+        """Seconds since the leader last read the role from Vault, while its reads are failing; else None."""
+        entry = self._current()[2].get(f'{mount}/{role_name}')
+        if not entry or entry[1] is None:
+            return None
+        return max(0, int(time.time() - entry[1]))
+
+    def roles(self):
+        return [tuple(name.rsplit('/', 1)) for name in self._current()[2]]
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._watch, daemon=True, name='shared-snapshot-watcher')
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+
+    def _watch(self):
+        notified = None
+        while self._running:
+            try:
+                sequence = self._current()[0]
+            except Exception as e:
+                logger.error("Failed to read shared snapshots from %s: %s", self.path, e)
+                sequence = notified
+            if sequence != notified:
+                notified = sequence
+                snapshot_updates.notify()
+            time.sleep(self._poll_interval)
+
+
+# The leader's publisher maps (and may create) the segment file, so it is only
+# built by start_background_workers(); a follower maps the file on first lookup
+snapshot_publisher = None
+shared_snapshots = None
+if SNAPSHOT_SHARING == 'follower':
+    shared_snapshots = SharedSnapshots(SHARED_SNAPSHOT_PATH)
+    logger.info("Reading credential snapshots published to %s", SHARED_SNAPSHOT_PATH)
+
+
+# ─── ASGI Server Mode ───────────────────────────────────────────────────────
+# SERVER_MODE=asgi serves the app with uvicorn on one asyncio event loop. The
+# hot endpoints (stream, JSON, per-role JSON, health) are native coroutines, so
+# an idle SSE connection or long-poll costs a parked future rather than a
+# thread; every other route is the same Flask view, run on a worker thread by
+# the WSGI bridge below.
+SERVER_MODE = os.getenv('SERVER_MODE', 'werkzeug')
+SERVER_HOST = os.getenv('SERVER_HOST', '0.0.0.0')
+SERVER_PORT = int(os.getenv('SERVER_PORT', '8080'))
+
+
+async def _current_snapshot_async():
+    """_current_snapshot() without blocking the event loop on the poller's first read."""
+    if credential_poller and credential_poller.get_snapshot(LDAP_MOUNT_PATH, LDAP_STATIC_ROLE_NAME) is None:
+        # Only the initial wait_for_snapshot() can block; park it on a worker thread
+        return await asyncio.to_thread(_current_snapshot)
+    return _current_snapshot()
+
+
+def _asgi_headers(headers):
+    """Encode a header dict for an ASGI response start message."""
+    return [(name.lower().encode('latin-1'), value.encode('latin-1'))
+            for name, value in headers.items()]
+
+
+async def _asgi_send(send, status, body, headers):
+    """Send a complete, non-streaming ASGI response."""
+    await send({'type': 'http.response.start', 'status': status,
+                'headers': _asgi_headers(headers)})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _asgi_send_json(send, status, payload):
+    """Send a small JSON response (errors)."""
+    body = json.dumps(payload).encode('utf-8')
+    await _asgi_send(send, status, body, {'Content-Type': 'application/json', 'Content-Length': str(len(body))})
+
+
+def _asgi_long_poll_args(scope):
+    """_long_poll_args() for an ASGI scope's query string."""
+    return _long_poll_args(dict(parse_qsl(scope.get('query_string', b'').decode('latin-1'), keep_blank_values=True)))
+
+
+async def _wait_for_new_version_async(current, wait_version, timeout):
+    """_wait_for_new_version() with an async current(), parked on a future instead of a thread."""
+    deadline = time.monotonic() + timeout
+    generation = snapshot_updates.generation
+    snapshot = await current()
+    if snapshot is None or snapshot.revision != wait_version:
+        return snapshot
+    snapshot_updates.subscribe('long_poll')
+    try:
+        while snapshot is not None and snapshot.revision == wait_version:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            generation = await snapshot_updates.wait_async(generation, remaining)
+            snapshot = await current()
+    finally:
+        snapshot_updates.unsubscribe('long_poll')
+    return snapshot
+
+
+async def _asgi_api_credentials(scope, receive, send):
+    """Async /api/credentials: same cached bytes, ETag, Age and long-poll as the Flask view."""
+    try:
+        wait_version, timeout = _asgi_long_poll_args(scope)
+    except ValueError:
+        await _asgi_send_json(send, 400, _LONG_POLL_ARGS_ERROR)
+        return
+    if wait_version is not None:
+        snapshot = await _wait_for_new_version_async(_current_snapshot_async, wait_version, timeout)
+    else:
+        snapshot = await _current_snapshot_async()
+    await _asgi_snapshot_response(scope, send, snapshot, wait_version, _stale_age(snapshot))
+
+
+def _asgi_role_key(path):
+    """(mount, role) from an /api/credentials/<mount>/<role> path, or None if it isn't one."""
+    if not path.startswith('/api/credentials/') or path in _ASGI_ROUTES:
+        return None
+    mount, _, role_name = path[len('/api/credentials/'):].rpartition('/')
+    return (mount, role_name) if mount and role_name else None
+
+
+async def _role_snapshot_source_async(mount, role_name):
+    """_role_snapshot_source() without blocking the event loop on a registry role's first read."""
+    if credential_poller and credential_poller.is_registered(mount, role_name) \
+            and credential_poller.get_snapshot(mount, role_name) is None:
+        return await asyncio.to_thread(_role_snapshot_source, mount, role_name)
+    return _role_snapshot_source(mount, role_name)
+
+
+async def _asgi_role_credentials(scope, receive, send):
+    """Async /api/credentials/<mount>/<role>: same handling as the Flask view, long-polls parked on a future."""
+    mount, role_name = _asgi_role_key(scope['path'])
+    try:
+        wait_version, timeout = _asgi_long_poll_args(scope)
+    except ValueError:
+        await _asgi_send_json(send, 400, _LONG_POLL_ARGS_ERROR)
+        return
+    snapshot, current, error = await _role_snapshot_source_async(mount, role_name)
+    if error:
+        await _asgi_send_json(send, error[1], error[0])
+        return
+    if wait_version is not None:
+        async def current_async():
+            return current()
+
+        snapshot = await _wait_for_new_version_async(current_async, wait_version, timeout)
+        if snapshot is None:
+            await _asgi_send_json(send, 404, {'error': f'role {mount}/{role_name} is not in the registry'})
+            return
+    await _asgi_snapshot_response(scope, send, snapshot, wait_version, _stale_age(snapshot, mount, role_name))
+
+
+async def _asgi_snapshot_response(scope, send, snapshot, wait_version, stale_age):
+    """Send a snapshot's cached bytes with the ETag, Age, 304 and compression handling of _snapshot_response()."""
+    body, etag = response_cache.get(snapshot)
+    headers = {
+        'ETag': quote_etag(etag),
+        'Age': str(max(0, int(time.time() - snapshot.ttl_as_of))),
+        'Cache-Control': 'no-cache',
+    }
+    if stale_age is not None:
+        # Same as the Flask view: stale bodies are sent in full without a validator
+        body = _mark_stale(body, stale_age)
+        del headers['ETag']
+        await _asgi_send(send, 200, body, {**headers, 'Content-Type': 'application/json',
+                                            'Content-Length': str(len(body))})
+        return
+    request_headers = dict(scope['headers'])
+    headers['Vary'] = 'Accept-Encoding'
+    encoding = None
+    if len(body) >= COMPRESSION_MIN_SIZE:
+        encoding = negotiate_encoding(parse_accept_header(
+            request_headers.get(b'accept-encoding', b'').decode('latin-1')))
+    if encoding:
+        # Weak on the 304 too, so it matches the validator a compressed 200 carries
+        headers['ETag'] = 'W/' + quote_etag(etag)
+    if snapshot.revision == wait_version or \
+            parse_etags(request_headers.get(b'if-none-match', b'').decode('latin-1')).contains_weak(etag):
+        await _asgi_send(send, 304, b'', headers)
+        return
+    headers['Content-Type'] = 'application/json'
+    if encoding:
+        body = compression_cache.get(etag, body, encoding)
+        headers['Content-Encoding'] = encoding
+    headers['Content-Length'] = str(len(body))
+    await _asgi_send(send, 200, body, headers)
+
+
+async def _asgi_wait_for_disconnect(receive):
+    """Return once the client has gone away."""
+    while (await receive())['type'] != 'http.disconnect':
+        pass
+
+
+async def _asgi_credentials_stream(scope, receive, send):
+    """Async /api/credentials/stream: one coroutine per connection, same events as the Flask view."""
+    last_event_id = dict(scope['headers']).get(b'last-event-id', b'').decode('latin-1')
+    last_state = (last_event_id, False)
+
+    disconnected = asyncio.ensure_future(_asgi_wait_for_disconnect(receive))
+    snapshot_updates.subscribe()
+    try:
+        await send({'type': 'http.response.start', 'status': 200,
+                    'headers': _asgi_headers({'Content-Type': 'text/event-stream', **SSE_HEADERS})})
+        await send({'type': 'http.response.body', 'body': b'retry: 3000\n\n', 'more_body': True})
+        generation = snapshot_updates.generation
+        while True:
+            snapshot = await _current_snapshot_async()
+            stale_age = _stale_age(snapshot)
+            if (snapshot.revision, stale_age is not None) != last_state:
+                last_state = (snapshot.revision, stale_age is not None)
+                await send({'type': 'http.response.body', 'body': _sse_event(snapshot, stale_age),
+                            'more_body': True})
+            waiter = asyncio.ensure_future(snapshot_updates.wait_async(generation, SSE_HEARTBEAT_INTERVAL))
+            await asyncio.wait((waiter, disconnected), return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                waiter.cancel()
+                return
+            new_generation = waiter.result()
+            if new_generation == generation:
+                await send({'type': 'http.response.body', 'body': b': heartbeat\n\n', 'more_body': True})
+            generation = new_generation
+    finally:
+        disconnected.cancel()
+        snapshot_updates.unsubscribe()
+
+
+async def _asgi_health(scope, receive, send):
+    """Async /health: answered on the event loop so probes never queue behind workers."""
+    body = json.dumps({'status': 'healthy', 'timestamp': datetime.now().isoformat()}).encode('utf-8')
+    await _asgi_send(send, 200, body, {'Content-Type': 'application/json',
+                                       'Content-Length': str(len(body))})
+
+
+async def _asgi_ready(scope, receive, send):
+    """Async /ready: the same in-memory checks as the Flask view, without a worker thread."""
+    status, body = _readiness_response()
+    await _asgi_send(send, status, body, {'Content-Type': 'application/json', 'Cache-Control': 'no-store',
+                                          'Content-Length': str(len(body))})
+
+
+def _wsgi_environ(scope, body):
+    """Build a WSGI environ for an ASGI HTTP scope and its buffered request body."""
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', '').encode('utf-8').decode('latin-1'),
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'REMOTE_ADDR': client[0],
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': io.BytesIO(body),
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    for name, value in scope['headers']:
+        name, value = name.decode('latin-1'), value.decode('latin-1')
+        if name == 'content-type':
+            environ['CONTENT_TYPE'] = value
+        elif name != 'content-length':
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            environ[key] = f'{environ[key]},{value}' if key in environ else value
+    return environ
+
+
+async def _asgi_wsgi_fallback(scope, receive, send):
+    """Serve a request through the Flask app, running the view and body iteration on worker threads.
+
+    Every call gets its own thread from the loop's default pool, so fallback
+    requests run concurrently and a keep-alive connection can issue any number
+    of them (asgiref's thread-sensitive adapter serializes them on one thread
+    and refuses a second call from the same connection's context).
+    """
+    body = bytearray()
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    started = {}
+
+    def start_response(status, headers, exc_info=None):
+        started['status'] = int(status.split(' ', 1)[0])
+        started['headers'] = [(name.lower().encode('latin-1'), value.encode('latin-1'))
+                              for name, value in headers]
+
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, app, _wsgi_environ(scope, bytes(body)), start_response)
+    chunks = iter(result)
+    disconnected = asyncio.ensure_future(_asgi_wait_for_disconnect(receive))
+    try:
+        await send({'type': 'http.response.start', 'status': started['status'],
+                    'headers': started['headers']})
+        # Streaming views (e.g. the SSE fallback) block between chunks, so pull each on a thread
+        while not disconnected.done():
+            chunk = await loop.run_in_executor(None, next, chunks, None)
+            if chunk is None:
+                await send({'type': 'http.response.body', 'body': b''})
+                break
+            if chunk:
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+    finally:
+        disconnected.cancel()
+        if hasattr(result, 'close'):
+            await loop.run_in_executor(None, result.close)
+
+
+# Per-role paths are served natively too, and labelled with the Flask rule so metrics stay per route
+_ASGI_ROLE_ROUTE = '/api/credentials/<path:mount>/<role_name>'
+
+# Query parameters the native handlers understand; any other parameter goes to Flask
+_ASGI_QUERY_PARAMS = {
+    '/api/credentials': frozenset({'wait_version', 'timeout'}),
+    _ASGI_ROLE_ROUTE: frozenset({'wait_version', 'timeout'}),
+}
+
+_ASGI_ROUTES = {
+    '/api/credentials': _asgi_api_credentials,
+    '/api/credentials/stream': _asgi_credentials_stream,
+    '/health': _asgi_health,
+    '/ready': _asgi_ready,
+}
+
+
+async def _asgi_lifespan(receive, send):
+    """Start the background workers on startup and stop them on shutdown."""
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            start_background_workers()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            for worker in (snapshot_publisher, shared_snapshots, credential_poller, vault_client, file_cred_cache):
+                if worker:
+                    worker.stop()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+def _asgi_request_span(scope, route):
+    """Server span for a native ASGI handler, continuing the caller's traceparent if any."""
+    if tracer is None:
+        return _NO_SPAN
+    headers = {name.decode('latin-1'): value.decode('latin-1') for name, value in scope['headers']}
+    return tracer.start_as_current_span(
+        f"{scope['method']} {route}", context=propagate.extract(headers),
+        kind=otel_trace.SpanKind.SERVER, attributes={'http.route': route})
+
+
+async def asgi_app(scope, receive, send):
+    """ASGI entry point: native handlers for hot paths, Flask for everything else."""
+    if scope['type'] == 'lifespan':
+        await _asgi_lifespan(receive, send)
+        return
+    if not _workers_started:
+        # Servers run without lifespan events never sent startup
+        start_background_workers()
+    handler, route = None, scope['path']
+    if scope['method'] == 'GET':
+        handler = _ASGI_ROUTES.get(route)
+        if handler is None and _asgi_role_key(route):
+            handler, route = _asgi_role_credentials, _ASGI_ROLE_ROUTE
+        query = scope.get('query_string')
+        # Query parameters other than the native ones (e.g. ?roles=) are handled by the Flask views
+        if query and {name for name, _ in parse_qsl(query.decode('latin-1'), keep_blank_values=True)} \
+                - _ASGI_QUERY_PARAMS.get(route, frozenset()):
+            handler = None
+    if handler is None:
+        handler = _asgi_wsgi_fallback
+    elif handler is not _asgi_credentials_stream:
+        # Flask-served routes are timed by the Flask hooks; streams would only measure connection length
+        started = time.perf_counter()
+        with _asgi_request_span(scope, route):
+            await handler(scope, receive, send)
+        REQUEST_LATENCY.observe(time.perf_counter() - started, (route, 'GET'))
+        return
+    await handler(scope, receive, send)
+
+
+# ─── App Factory ────────────────────────────────────────────────────────────
+# Importing this module only builds configuration and idle objects: no thread
+# starts, no file is read or mapped and nothing is compressed. create_app()
+# (what `python app.py` runs, or `gunicorn 'app:create_app()'`) warms the page
+# caches, creates the shared snapshot segment and starts the background
+# workers; ASGI lifespan startup and the first request do the same for servers
+# that import `app` / `asgi_app` directly.
+# Workers configured at import; tests that swap a module global don't get theirs started
+_background_workers = [worker for worker in (file_cred_cache, vault_client, credential_poller,
+                                             shared_snapshots) if worker]
+_workers_started = False
+_workers_lock = threading.Lock()
+# Seconds spent in each startup phase, served as app_startup_seconds
+STARTUP_SECONDS = {'import': time.perf_counter() - _IMPORT_STARTED}
+
+metrics.gauge('app_startup_seconds', 'Seconds spent importing the app and starting its background workers.',
+              ('phase',), lambda: [((phase,), seconds) for phase, seconds in STARTUP_SECONDS.items()])
+
+
+def start_background_workers():
+    """Warm the page caches, then start the file watcher, Vault token renewal, poller and snapshot sharing (once)."""
+    global _workers_started, snapshot_publisher
+    with _workers_lock:
+        if _workers_started:
+            return
+        started = time.perf_counter()
+        warm_page_caches()
+        STARTUP_SECONDS['caches'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        workers = list(_background_workers)
+        if SNAPSHOT_SHARING == 'leader':
+            snapshot_publisher = SnapshotPublisher(SnapshotSegment(SHARED_SNAPSHOT_PATH, create=True),
+                                                   _shared_payload)
+            logger.info("Publishing credential snapshots to %s", SHARED_SNAPSHOT_PATH)
+            workers.append(snapshot_publisher)
+        for worker in workers:
+            worker.start()
+        STARTUP_SECONDS['workers'] = time.perf_counter() - started
+        _workers_started = True
+    logger.info("Started in %.1fms (import %.1fms, page caches %.1fms, background workers %.1fms)",
+                sum(STARTUP_SECONDS.values()) * 1000, STARTUP_SECONDS['import'] * 1000,
+                STARTUP_SECONDS['caches'] * 1000, STARTUP_SECONDS['workers'] * 1000)
+
+
+@app.before_request
+def _start_workers_on_first_request():
+    if not _workers_started:
+        start_background_workers()
+
+
+def create_app():
+    """App factory: start this process's background workers and return the Flask app."""
+    start_background_workers()
+    return app
+
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=8080, debug=False)
+    create_app()
+    if SERVER_MODE == 'none':
+        # A dedicated refresher (SNAPSHOT_SHARING=leader) that serves no HTTP itself
+        logger.info("SERVER_MODE=none: running background refresh only")
+        try:
+            threading.Event().wait()
+        except KeyboardInterrupt:
+            pass
+    elif SERVER_MODE == 'asgi':
+        import uvicorn
+        # Pass the app object (not "app:asgi_app") so this module isn't imported a second time
+        uvicorn.run(asgi_app, host=SERVER_HOST, port=SERVER_PORT, log_level='info')
+    else:
+        app.run(host=SERVER_HOST, port=SERVER_PORT, debug=False)
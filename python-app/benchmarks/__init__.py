@@ -0,0 +1,9 @@
+"""
+Benchmark and load-test tooling for the LDAP credentials demo app.
+
+- fake_vault: local Vault stand-in with latency/error injection
+- fixtures: synthetic Vault Agent / CSI credential files
+- loadtest: load driver reporting RPS and latency percentiles as JSON
+- file_cache_bench: FileCredentialCache reader microbenchmarks
+- startup_bench: cold-start time-to-first-200 on /health
+"""
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Local stand-in for the parts of the Vault HTTP API the app uses.
+
+Serves Kubernetes auth login, token renew-self and LDAP static-cred reads,
+with configurable latency and error injection per operation, so load tests
+can exercise the Vault delivery path without a real Vault or LDAP server.
+
+    python -m benchmarks.fake_vault --port 8200 --read-latency 0.02 --read-error-rate 0.01
+"""
+
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FaultConfig:
+    """Latency (seconds, plus uniform jitter) and error rate injected into one operation."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_status=503):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+
+    def apply(self, rng):
+        """Sleep for the configured latency; return an error status to send, or None."""
+        delay = self.latency + (rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay > 0:
+            time.sleep(delay)
+        if self.error_rate and rng.random() < self.error_rate:
+            return self.error_status
+        return None
+
+
+class _QuietHTTPServer(ThreadingHTTPServer):
+    """Doesn't print tracebacks for clients that hang up, such as app processes being stopped."""
+
+    def handle_error(self, request, client_address):
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeVault:
+    """Threaded HTTP server answering login, renew-self and static-cred reads.
+
+    Each static role rotates every `rotation_period` seconds from server start:
+    its password changes and ttl counts down to the next boundary, the same
+    shape of data the real LDAP secrets engine returns.
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, rotation_period=300, lease_duration=3600,
+                 login=None, read=None, renew=None, seed=None):
+        self.rotation_period = rotation_period
+        self.lease_duration = lease_duration
+        self.faults = {
+            'login': login or FaultConfig(),
+            'read': read or FaultConfig(),
+            'renew': renew or FaultConfig(),
+        }
+        self.counts = {'login': 0, 'read': 0, 'renew': 0, 'errors': 0}
+        self._started_at = time.time()
+        self._tokens = itertools.count(1)
+        self._lock = threading.Lock()
+        self._rng = random.Random(seed)
+        self._server = _QuietHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serve in a background thread; returns self for chaining."""
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, operation, failed):
+        with self._lock:
+            self.counts[operation] += 1
+            if failed:
+                self.counts['errors'] += 1
+
+    def _auth_block(self):
+        return {'auth': {
+            'client_token': f'fake-token-{next(self._tokens)}',
+            'lease_duration': self.lease_duration,
+            'renewable': True,
+            'policies': ['default'],
+        }}
+
+    def static_creds(self, mount, role):
+        """The static-cred response body for a role at the current time."""
+        elapsed = time.time() - self._started_at
+        generation = int(elapsed // self.rotation_period)
+        rotated_at = self._started_at + generation * self.rotation_period
+        return {'data': {
+            'username': f'svc-{role}',
+            'password': f'{mount}-{role}-pw-{generation}',
+            'dn': f'CN=svc-{role},CN=Users,DC=example,DC=local',
+            'last_vault_rotation': datetime.fromtimestamp(rotated_at, timezone.utc).isoformat(),
+            'rotation_period': self.rotation_period,
+            'ttl': max(0, int(rotated_at + self.rotation_period - time.time())),
+        }}
+
+    def _handler_class(self):
+        vault = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _drain_body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                if length:
+                    self.rfile.read(length)
+
+            def _serve(self, operation, build):
+                status = vault.faults[operation].apply(vault._rng)
+                vault._count(operation, status is not None)
+                if status is not None:
+                    self._send(status, {'errors': [f'injected {operation} failure']})
+                else:
+                    self._send(200, build())
+
+            def do_GET(self):
+                path = self.path.split('?', 1)[0]
+                if path == '/v1/sys/health':
+                    self._send(200, {'initialized': True, 'sealed': False})
+                    return
+                mount, sep, role = path[len('/v1/'):].rpartition('/static-cred/')
+                if path.startswith('/v1/') and sep and role:
+                    self._serve('read', lambda: vault.static_creds(mount, role))
+                    return
+                self._send(404, {'errors': []})
+
+            def do_POST(self):
+                self._drain_body()
+                path = self.path.split('?', 1)[0]
+                if path.startswith('/v1/auth/') and path.endswith('/login'):
+                    self._serve('login', vault._auth_block)
+                elif path == '/v1/auth/token/renew-self':
+                    self._serve('renew', vault._auth_block)
+                else:
+                    self._send(404, {'errors': []})
+
+            do_PUT = do_POST
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8200)
+    parser.add_argument('--rotation-period', type=int, default=300)
+    for operation in ('login', 'read', 'renew'):
+        parser.add_argument(f'--{operation}-latency', type=float, default=0.0)
+        parser.add_argument(f'--{operation}-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    vault = FakeVault(
+        host=args.host, port=args.port, rotation_period=args.rotation_period,
+        **{op: FaultConfig(latency=getattr(args, f'{op}_latency'), error_rate=getattr(args, f'{op}_error_rate'))
+           for op in ('login', 'read', 'renew')},
+    )
+    print(f'Fake Vault listening on {vault.url}')
+    try:
+        vault._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Microbenchmarks for FileCredentialCache's agent and CSI readers.
+
+Builds synthetic Vault Agent files (up to thousands of keys) and CSI
+directories (up to hundreds of secret files), then measures for each size:
+
+- parse time: min and median over repeated runs of the reader
+- allocations: tracemalloc peak and retained bytes for one run
+- syscalls: files opened and directories scanned (audit hooks), plus read
+  syscalls from /proc/self/io on Linux
+
+Results are written as JSON. `--compare baseline.json` fails (exit status 1)
+when a case got slower or allocates more than `--tolerance` allows, or
+opens, scans or reads more than before.
+
+    python -m benchmarks.file_cache_bench --output file-cache.json
+    python -m benchmarks.file_cache_bench --compare file-cache.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import Counter
+from datetime import datetime, timezone
+
+from benchmarks.fixtures import (
+    synthetic_credentials, synthetic_roles, write_agent_file, write_csi_tree, write_sectioned_agent_file,
+)
+
+AGENT_SIZES = (10, 100, 1000, 10000)
+SECTION_SIZES = (10, 100, 1000)
+CSI_SIZES = (10, 100, 500)
+AUDITED_EVENTS = ('open', 'os.scandir', 'os.listdir')
+
+_audit_counts = None
+_audit_installed = False
+
+
+def _audit(event, args):
+    if _audit_counts is not None and event in AUDITED_EVENTS:
+        _audit_counts[event] += 1
+
+
+def _read_syscalls():
+    """Read syscalls made by this process so far (Linux /proc/self/io), or None."""
+    try:
+        fd = os.open('/proc/self/io', os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        data = os.read(fd, 4096)
+    finally:
+        os.close(fd)
+    for line in data.splitlines():
+        if line.startswith(b'syscr:'):
+            return int(line.split()[1])
+    return None
+
+
+def count_syscalls(fn):
+    """Run fn once; return (opens, directory scans, read syscalls or None)."""
+    global _audit_counts, _audit_installed
+    if not _audit_installed:
+        # Audit hooks can't be removed, so one hook stays installed and is gated by _audit_counts
+        sys.addaudithook(_audit)
+        _audit_installed = True
+    baseline = _read_syscalls()
+    # Calibrate away the reads made by _read_syscalls() itself
+    overhead = None if baseline is None else _read_syscalls() - baseline
+    before = _read_syscalls()
+    counts = _audit_counts = Counter()
+    try:
+        fn()
+    finally:
+        _audit_counts = None
+    after = _read_syscalls()
+    reads = None if before is None else max(0, after - before - overhead)
+    return counts['open'], counts['os.scandir'] + counts['os.listdir'], reads
+
+
+def measure_allocations(fn):
+    """Peak and retained bytes allocated by one run of fn."""
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        result = fn()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    del result
+    return peak - before, current - before
+
+
+def measure_time(fn, repeat):
+    """(min, median) seconds over `repeat` runs of fn."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings), statistics.median(timings)
+
+
+def _load_app():
+    """Import app.py without starting any file watcher or Vault client."""
+    os.environ['SECRET_DELIVERY_METHOD'] = 'vault-secrets-operator'
+    os.environ.pop('VAULT_ADDR', None)
+    app_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    if app_dir not in sys.path:
+        sys.path.insert(0, app_dir)
+    import app as app_module
+    return app_module
+
+
+def build_cases(app_module, workdir, agent_sizes=AGENT_SIZES, csi_sizes=CSI_SIZES, section_sizes=SECTION_SIZES):
+    """Yield (name, size, reader) for every scenario, with its files written under workdir.
+
+    Scenarios:
+    - agent: parse a KEY=VALUE file of `size` keys
+    - agent_sections: refresh an unchanged multi-role file of `size` [mount/role] sections
+    - csi_cold: read `size` CSI files into an empty fingerprint cache
+    - csi_warm: tick again after nothing was published (same ..data target)
+    - csi_stat_only: files written in place without ..data, unchanged since the last tick
+    """
+    for size in agent_sizes:
+        path = write_agent_file(os.path.join(workdir, f'agent-{size}'), synthetic_credentials(size))
+        cache = app_module.FileCredentialCache('vault-agent-sidecar')
+
+        def agent(cache=cache, path=path):
+            app_module.VAULT_AGENT_CREDS_FILE = path
+            return cache._read_agent_sidecar_file()
+        yield 'agent', size, agent
+
+    for size in section_sizes:
+        path = write_sectioned_agent_file(os.path.join(workdir, f'sections-{size}'), synthetic_roles(size))
+        cache = app_module.FileCredentialCache('vault-agent-sidecar')
+        app_module.VAULT_AGENT_CREDS_FILE = path
+        cache._read_credentials()
+
+        def agent_sections(cache=cache, path=path):
+            app_module.VAULT_AGENT_CREDS_FILE = path
+            cache._read_credentials()
+            return cache.roles()
+        yield 'agent_sections', size, agent_sections
+
+    for size in csi_sizes:
+        credentials = synthetic_credentials(size, prefix='role', separator='-')
+        csi_dir = os.path.join(workdir, f'csi-{size}')
+        os.makedirs(csi_dir)
+        write_csi_tree(csi_dir, credentials, generation=1)
+        cold = app_module.FileCredentialCache('vault-csi-driver')
+
+        def csi_cold(csi_dir=csi_dir, cold=cold):
+            app_module.VAULT_CSI_SECRETS_DIR = csi_dir
+            cold._csi_files = {}
+            cold._csi_data_target = None
+            return cold._read_csi_files()
+        yield 'csi_cold', size, csi_cold
+
+        warm = app_module.FileCredentialCache('vault-csi-driver')
+        app_module.VAULT_CSI_SECRETS_DIR = csi_dir
+        warm._read_csi_files()
+
+        def csi_warm(warm=warm, csi_dir=csi_dir):
+            app_module.VAULT_CSI_SECRETS_DIR = csi_dir
+            return warm._read_csi_files()
+        yield 'csi_warm', size, csi_warm
+
+        plain_dir = os.path.join(workdir, f'csi-plain-{size}')
+        os.makedirs(plain_dir)
+        for name, value in credentials.items():
+            with open(os.path.join(plain_dir, name), 'w') as f:
+                f.write(value)
+        plain = app_module.FileCredentialCache('vault-csi-driver')
+        app_module.VAULT_CSI_SECRETS_DIR = plain_dir
+        plain._read_csi_files()
+
+        def csi_stat_only(plain=plain, plain_dir=plain_dir):
+            app_module.VAULT_CSI_SECRETS_DIR = plain_dir
+            return plain._read_csi_files()
+        yield 'csi_stat_only', size, csi_stat_only
+
+
+def run_case(name, size, fn, repeat):
+    """Time, allocation and syscall figures for one scenario."""
+    keys = len(fn())
+    if keys != size and name != 'csi_warm':
+        raise RuntimeError(f'{name}/{size}: reader returned {keys} keys')
+    fastest, median = measure_time(fn, repeat)
+    peak, retained = measure_allocations(fn)
+    opens, scans, reads = count_syscalls(fn)
+    return {
+        'case': name,
+        'size': size,
+        'time_us': {'min': round(fastest * 1e6, 1), 'median': round(median * 1e6, 1),
+                    'per_key': round(median * 1e6 / size, 3)},
+        'alloc_bytes': {'peak': peak, 'retained': retained},
+        'syscalls': {'opens': opens, 'dir_scans': scans, 'reads': reads},
+    }
+
+
+def run_suite(repeat=20, agent_sizes=AGENT_SIZES, csi_sizes=CSI_SIZES, section_sizes=SECTION_SIZES):
+    """Run every scenario and return the report dict."""
+    app_module = _load_app()
+    results = []
+    with tempfile.TemporaryDirectory(prefix='file-cache-bench-') as workdir:
+        for name, size, fn in build_cases(app_module, workdir, agent_sizes, csi_sizes, section_sizes):
+            result = run_case(name, size, fn, repeat)
+            results.append(result)
+            print(f"{name:14} n={size:<6} median={result['time_us']['median']:>10.1f}us "
+                  f"({result['time_us']['per_key']:.2f}us/key)  peak={result['alloc_bytes']['peak'] / 1024:>8.1f}KiB  "
+                  f"opens={result['syscalls']['opens']:<4} scans={result['syscalls']['dir_scans']} "
+                  f"reads={result['syscalls']['reads']}", flush=True)
+    return {
+        'meta': {
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'repeat': repeat,
+        },
+        'results': results,
+    }
+
+
+def find_regressions(baseline, current, tolerance=0.25):
+    """Describe every case that got slower/bigger beyond tolerance or makes more syscalls."""
+    before = {(r['case'], r['size']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get((result['case'], result['size']))
+        if old is None:
+            continue
+        label = f"{result['case']}/{result['size']}"
+        if result['time_us']['median'] > old['time_us']['median'] * (1 + tolerance):
+            regressions.append(f"{label}: median {old['time_us']['median']}us -> {result['time_us']['median']}us")
+        if result['alloc_bytes']['peak'] > old['alloc_bytes']['peak'] * (1 + tolerance):
+            regressions.append(f"{label}: peak {old['alloc_bytes']['peak']}B -> {result['alloc_bytes']['peak']}B")
+        for counter in ('opens', 'dir_scans', 'reads'):
+            new_count, old_count = result['syscalls'][counter], old['syscalls'][counter]
+            if new_count is not None and old_count is not None and new_count > old_count:
+                regressions.append(f"{label}: {counter} {old_count} -> {new_count}")
+    return regressions
+
+
+def _sizes(value):
+    return tuple(int(size) for size in value.split(',') if size.strip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--agent-sizes', type=_sizes, default=AGENT_SIZES)
+    parser.add_argument('--csi-sizes', type=_sizes, default=CSI_SIZES)
+    parser.add_argument('--section-sizes', type=_sizes, default=SECTION_SIZES)
+    parser.add_argument('--repeat', type=int, default=20, help='Timed runs per case')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', help='Baseline JSON report; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase in median time and peak allocation (default 0.25)')
+    args = parser.parse_args()
+
+    report = run_suite(args.repeat, args.agent_sizes, args.csi_sizes, args.section_sizes)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = find_regressions(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
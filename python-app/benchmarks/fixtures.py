@@ -0,0 +1,96 @@
+"""
+Synthetic credential files for the file-based delivery modes.
+
+Writes the same layouts the app reads in production: a Vault Agent
+KEY=VALUE template and a CSI directory published with the kubelet atomic
+writer's `..data` symlink swap.
+"""
+
+import os
+import time
+
+SAMPLE_CREDENTIALS = {
+    'username': 'svc-benchmark',
+    'password': 'benchmark-password-0',
+    'dn': 'CN=svc-benchmark,CN=Users,DC=example,DC=local',
+    'last_vault_rotation': '2026-01-01T00:00:00Z',
+    'rotation_period': '300',
+    'ttl': '300',
+}
+
+
+def synthetic_credentials(count, prefix='ROLE', separator='_'):
+    """`count` deterministic keys spread over roles of four fields each, as a large template renders them."""
+    fields = ('USERNAME', 'PASSWORD', 'DN', 'LAST_VAULT_ROTATION')
+    credentials = {}
+    for i in range(count):
+        role, field = divmod(i, len(fields))
+        key = separator.join((prefix, f'{role:05d}', fields[field]))
+        credentials[key] = f'value-{role:05d}-{field}-' + 'x' * 24
+    return credentials
+
+
+def write_agent_file(path, credentials=None):
+    """Write a Vault Agent style KEY=VALUE file atomically (temp file + rename)."""
+    credentials = credentials or SAMPLE_CREDENTIALS
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for key, value in credentials.items():
+            f.write(f'{key}={value}\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def write_sectioned_agent_file(path, roles):
+    """Write a multi-role agent file: one `[mount/role]` section of KEY=VALUE lines per role."""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        for name, credentials in roles.items():
+            f.write(f'[{name}]\n')
+            for key, value in credentials.items():
+                f.write(f'{key}={value}\n')
+    os.replace(tmp_path, path)
+    return path
+
+
+def synthetic_roles(count, mount='ldap'):
+    """`count` roles keyed 'mount/role-N', each with the four fields a dual-account template renders."""
+    return {
+        f'{mount}/role-{i:05d}': {
+            'LDAP_USERNAME': f'svc-{i:05d}',
+            'LDAP_PASSWORD': f'password-{i:05d}-' + 'x' * 24,
+            'LDAP_DN': f'CN=svc-{i:05d},CN=Users,DC=example,DC=local',
+            'LDAP_LAST_VAULT_PASSWORD': '2026-01-01T00:00:00Z',
+        }
+        for i in range(count)
+    }
+
+
+def write_csi_tree(directory, credentials=None, generation=None):
+    """Publish one file per key under `directory` the way the CSI driver does.
+
+    Files land in a fresh `..<generation>` directory, `..data` is swapped to it
+    atomically, and each key is a symlink through `..data`.
+    """
+    credentials = credentials or SAMPLE_CREDENTIALS
+    generation = generation if generation is not None else time.time_ns()
+    data_dir = os.path.join(directory, f'..{generation}')
+    os.makedirs(data_dir)
+    for name, value in credentials.items():
+        with open(os.path.join(data_dir, name), 'w') as f:
+            f.write(str(value))
+    tmp_link = os.path.join(directory, '..data_tmp')
+    os.symlink(os.path.basename(data_dir), tmp_link)
+    os.replace(tmp_link, os.path.join(directory, '..data'))
+    for name in credentials:
+        link = os.path.join(directory, name)
+        if not os.path.islink(link):
+            os.symlink(os.path.join('..data', name), link)
+    return directory
+
+
+def write_sa_token(path, token='fake-service-account-jwt'):
+    """Write a stand-in Kubernetes service account token for Vault login."""
+    with open(path, 'w') as f:
+        f.write(token)
+    return path
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""
+Load driver for the LDAP credentials demo app.
+
+Starts app.py once per delivery mode (and server mode) against local
+fixtures or the fake Vault, drives `/`, `/api/credentials` and `/health`
+with keep-alive clients at each concurrency level, and writes RPS plus
+p50/p95/p99 latency as JSON so runs can be compared between commits.
+
+    python -m benchmarks.loadtest --output results.json
+    python -m benchmarks.loadtest --modes vault --concurrency 1,16 --vault-read-latency 0.05
+    python -m benchmarks.loadtest --output new.json --compare results.json
+"""
+
+import argparse
+import http.client
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from benchmarks.fake_vault import FakeVault, FaultConfig
+from benchmarks.fixtures import write_agent_file, write_csi_tree, write_sa_token
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DELIVERY_MODES = ('vso', 'agent', 'csi', 'vault')
+SERVER_MODES = ('werkzeug', 'asgi')
+ENDPOINTS = ('/', '/api/credentials', '/health')
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list (0 when empty)."""
+    if not sorted_values:
+        return 0
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def summarize(latencies, errors, elapsed):
+    """RPS and latency percentiles (milliseconds) for one load run."""
+    latencies = sorted(latencies)
+    total = len(latencies)
+    return {
+        'requests': total,
+        'errors': errors,
+        'rps': round(total / elapsed, 1) if elapsed else 0,
+        'latency_ms': {
+            'p50': round(percentile(latencies, 50) * 1000, 3),
+            'p95': round(percentile(latencies, 95) * 1000, 3),
+            'p99': round(percentile(latencies, 99) * 1000, 3),
+            'max': round(latencies[-1] * 1000, 3) if latencies else 0,
+            'mean': round(sum(latencies) / total * 1000, 3) if total else 0,
+        },
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _delivery_env(mode, workdir, vault_url):
+    """Environment selecting one delivery mode, with its fixtures written under workdir."""
+    env = {
+        'LDAP_USERNAME': 'svc-benchmark',
+        'LDAP_PASSWORD': 'benchmark-password-0',
+        'LDAP_DN': 'CN=svc-benchmark,CN=Users,DC=example,DC=local',
+        'LDAP_LAST_VAULT_PASSWORD': 'benchmark-password-prev',
+    }
+    if mode == 'agent':
+        env['SECRET_DELIVERY_METHOD'] = 'vault-agent-sidecar'
+        env['VAULT_AGENT_CREDS_FILE'] = write_agent_file(os.path.join(workdir, 'ldap-creds'))
+    elif mode == 'csi':
+        csi_dir = os.path.join(workdir, 'csi')
+        os.makedirs(csi_dir, exist_ok=True)
+        env['SECRET_DELIVERY_METHOD'] = 'vault-csi-driver'
+        env['VAULT_CSI_SECRETS_DIR'] = write_csi_tree(csi_dir, generation=1)
+    elif mode == 'vault':
+        env['DUAL_ACCOUNT_MODE'] = 'true'
+        env['VAULT_ADDR'] = vault_url
+        env['VAULT_AUTH_ROLE'] = 'benchmark'
+        env['VAULT_SA_TOKEN_PATH'] = write_sa_token(os.path.join(workdir, 'sa-token'))
+    return env
+
+
+class AppProcess:
+    """app.py running in a child process on a free port, stopped on exit.
+
+    `time_to_healthy` is the seconds from spawning the process to its first
+    200 from /health, measured to within `poll_interval`.
+    """
+
+    def __init__(self, env, startup_timeout=15.0, poll_interval=0.1):
+        self.port = _free_port()
+        self._env = dict(os.environ, SERVER_HOST='127.0.0.1', SERVER_PORT=str(self.port), **env)
+        self._startup_timeout = startup_timeout
+        self._poll_interval = poll_interval
+        self._proc = None
+        self.time_to_healthy = None
+
+    def __enter__(self):
+        started = time.perf_counter()
+        self._proc = subprocess.Popen(
+            [sys.executable, 'app.py'], cwd=APP_DIR, env=self._env,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + self._startup_timeout
+        while time.monotonic() < deadline:
+            if self._proc.poll() is not None:
+                raise RuntimeError(f'app.py exited with status {self._proc.returncode}')
+            conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=1)
+            try:
+                conn.request('GET', '/health')
+                if conn.getresponse().status == 200:
+                    self.time_to_healthy = time.perf_counter() - started
+                    return self
+            except OSError:
+                pass
+            finally:
+                conn.close()
+            # Not listening yet, or up but not healthy (e.g. 503): wait before asking again
+            time.sleep(self._poll_interval)
+        self.__exit__(None, None, None)
+        raise RuntimeError(f'app.py did not become healthy within {self._startup_timeout}s')
+
+    def __exit__(self, *exc_info):
+        self._proc.terminate()
+        try:
+            self._proc.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self._proc.kill()
+            self._proc.wait()
+
+
+def run_load(port, path, concurrency, duration, warmup=0.5):
+    """Drive GET `path` from `concurrency` keep-alive clients for `duration` seconds."""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    start_gate = threading.Barrier(concurrency + 1)
+    bounds = {}
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local_latencies = []
+        local_errors = 0
+        start_gate.wait()
+        measure_from, stop_at = bounds['measure_from'], bounds['stop_at']
+        while True:
+            started = time.perf_counter()
+            if started >= stop_at:
+                break
+            try:
+                conn.request('GET', path, headers={'Accept-Encoding': 'gzip, br'})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 400
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                ok = False
+            if started >= measure_from:
+                if ok:
+                    local_latencies.append(time.perf_counter() - started)
+                else:
+                    local_errors += 1
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=client, daemon=True) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    now = time.perf_counter()
+    bounds['measure_from'] = now + warmup
+    bounds['stop_at'] = now + warmup + duration
+    start_gate.wait()
+    for thread in threads:
+        thread.join()
+    return summarize(latencies, errors[0], duration)
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=APP_DIR, text=True,
+            stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(modes, server_modes, endpoints, concurrency_levels, duration, vault_faults):
+    """Run every (mode, server, endpoint, concurrency) combination and return the report dict."""
+    results = []
+    vault = FakeVault(**vault_faults).start()
+    try:
+        for mode in modes:
+            for server_mode in server_modes:
+                with tempfile.TemporaryDirectory(prefix=f'bench-{mode}-') as workdir:
+                    env = _delivery_env(mode, workdir, vault.url)
+                    env['SERVER_MODE'] = server_mode
+                    with AppProcess(env) as proc:
+                        for endpoint in endpoints:
+                            for concurrency in concurrency_levels:
+                                summary = run_load(proc.port, endpoint, concurrency, duration)
+                                results.append({
+                                    'mode': mode, 'server': server_mode, 'endpoint': endpoint,
+                                    'concurrency': concurrency, **summary,
+                                })
+                                print(f"{mode:6} {server_mode:8} {endpoint:18} c={concurrency:<4} "
+                                      f"{summary['rps']:>9.1f} rps  p50={summary['latency_ms']['p50']:.2f}ms "
+                                      f"p99={summary['latency_ms']['p99']:.2f}ms  errors={summary['errors']}",
+                                      flush=True)
+    finally:
+        vault.stop()
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+            'duration': duration,
+            'vault_counts': vault.counts,
+        },
+        'results': results,
+    }
+
+
+def compare(baseline, current):
+    """Print RPS and p99 change per matching result between two reports."""
+    def key(result):
+        return (result['mode'], result['server'], result['endpoint'], result['concurrency'])
+
+    before = {key(r): r for r in baseline['results']}
+    print(f"\nCompared with {baseline['meta'].get('commit') or 'baseline'}:")
+    for result in current['results']:
+        old = before.get(key(result))
+        if old is None:
+            continue
+        rps_change = (result['rps'] - old['rps']) / old['rps'] * 100 if old['rps'] else 0
+        old_p99, new_p99 = old['latency_ms']['p99'], result['latency_ms']['p99']
+        p99_change = (new_p99 - old_p99) / old_p99 * 100 if old_p99 else 0
+        print(f"{result['mode']:6} {result['server']:8} {result['endpoint']:18} c={result['concurrency']:<4} "
+              f"rps {rps_change:+6.1f}%  p99 {p99_change:+6.1f}%")
+
+
+def _csv(value):
+    return [item.strip() for item in value.split(',') if item.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', type=_csv, default=list(DELIVERY_MODES),
+                        help='Delivery modes: vso, agent, csi, vault (default: all)')
+    parser.add_argument('--servers', type=_csv, default=['werkzeug'],
+                        help='Server modes: werkzeug, asgi (default: werkzeug)')
+    parser.add_argument('--endpoints', type=_csv, default=list(ENDPOINTS))
+    parser.add_argument('--concurrency', type=lambda v: [int(c) for c in _csv(v)], default=[1, 8, 32])
+    parser.add_argument('--duration', type=float, default=5.0, help='Measured seconds per run')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', help='Baseline JSON report to compare against')
+    for operation in ('login', 'read'):
+        parser.add_argument(f'--vault-{operation}-latency', type=float, default=0.0)
+        parser.add_argument(f'--vault-{operation}-jitter', type=float, default=0.0)
+        parser.add_argument(f'--vault-{operation}-error-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    unknown = set(args.modes) - set(DELIVERY_MODES) | set(args.servers) - set(SERVER_MODES)
+    if unknown:
+        parser.error(f'unknown mode(s): {", ".join(sorted(unknown))}')
+
+    vault_faults = {
+        op: FaultConfig(latency=getattr(args, f'vault_{op}_latency'),
+                        jitter=getattr(args, f'vault_{op}_jitter'),
+                        error_rate=getattr(args, f'vault_{op}_error_rate'))
+        for op in ('login', 'read')
+    }
+    report = run_suite(args.modes, args.servers, args.endpoints, args.concurrency, args.duration, vault_faults)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+
+if __name__ == '__main__':
+    main()
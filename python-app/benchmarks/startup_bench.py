@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the LDAP credentials demo app.
+
+Launches app.py repeatedly per delivery mode (and server mode) and records
+time-to-first-200 on /health from process spawn, plus the import,
+page-cache and background-worker phases the app reports as
+`app_startup_seconds` on /metrics. Results are written as JSON; `--compare baseline.json` fails
+(exit status 1) when the median time-to-first-200 of a case grew by more
+than `--tolerance`.
+
+    python -m benchmarks.startup_bench --output startup.json
+    python -m benchmarks.startup_bench --modes vso,vault --runs 10 --compare startup.json
+"""
+
+import argparse
+import http.client
+import json
+import platform
+import statistics
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+from benchmarks.fake_vault import FakeVault
+from benchmarks.loadtest import DELIVERY_MODES, SERVER_MODES, AppProcess, _csv, _delivery_env, git_commit
+
+
+def reported_phases(port):
+    """The app's own {phase: seconds} startup timings, scraped from /metrics."""
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+    try:
+        conn.request('GET', '/metrics')
+        text = conn.getresponse().read().decode('utf-8')
+    finally:
+        conn.close()
+    phases = {}
+    for line in text.splitlines():
+        if line.startswith('app_startup_seconds{'):
+            labels, value = line.rsplit(' ', 1)
+            phases[labels.split('phase="', 1)[1].split('"', 1)[0]] = float(value)
+    return phases
+
+
+def _milliseconds(values):
+    return {
+        'min': round(min(values) * 1000, 1),
+        'median': round(statistics.median(values) * 1000, 1),
+        'max': round(max(values) * 1000, 1),
+    }
+
+
+def measure_startup(mode, server_mode, runs, vault_url):
+    """Start app.py `runs` times in one mode; return its time-to-first-200 and phase timings."""
+    ready, phases = [], {}
+    with tempfile.TemporaryDirectory(prefix=f'startup-{mode}-') as workdir:
+        env = _delivery_env(mode, workdir, vault_url)
+        env['SERVER_MODE'] = server_mode
+        for _ in range(runs):
+            with AppProcess(env, poll_interval=0.005) as proc:
+                ready.append(proc.time_to_healthy)
+                for phase, seconds in reported_phases(proc.port).items():
+                    phases.setdefault(phase, []).append(seconds)
+    return {
+        'mode': mode,
+        'server': server_mode,
+        'runs': runs,
+        'time_to_first_200_ms': _milliseconds(ready),
+        'phases_ms': {phase: _milliseconds(values) for phase, values in phases.items()},
+    }
+
+
+def run_suite(modes, server_modes, runs):
+    """Measure every (mode, server) combination and return the report dict."""
+    results = []
+    vault = FakeVault().start()
+    try:
+        for mode in modes:
+            for server_mode in server_modes:
+                result = measure_startup(mode, server_mode, runs, vault.url)
+                results.append(result)
+                phases = '  '.join(f"{phase}={timing['median']:.1f}ms"
+                                   for phase, timing in result['phases_ms'].items())
+                print(f"{mode:6} {server_mode:8} first 200 median={result['time_to_first_200_ms']['median']:.1f}ms "
+                      f"min={result['time_to_first_200_ms']['min']:.1f}ms  {phases}", flush=True)
+    finally:
+        vault.stop()
+    return {
+        'meta': {
+            'commit': git_commit(),
+            'timestamp': datetime.now(timezone.utc).isoformat(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'runs': runs,
+        },
+        'results': results,
+    }
+
+
+def find_regressions(baseline, current, tolerance=0.25):
+    """Describe every case whose median time-to-first-200 grew beyond tolerance."""
+    before = {(r['mode'], r['server']): r for r in baseline['results']}
+    regressions = []
+    for result in current['results']:
+        old = before.get((result['mode'], result['server']))
+        if old is None:
+            continue
+        old_median = old['time_to_first_200_ms']['median']
+        new_median = result['time_to_first_200_ms']['median']
+        if new_median > old_median * (1 + tolerance):
+            regressions.append(f"{result['mode']}/{result['server']}: first 200 median "
+                               f"{old_median}ms -> {new_median}ms")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--modes', type=_csv, default=list(DELIVERY_MODES),
+                        help='Delivery modes: vso, agent, csi, vault (default: all)')
+    parser.add_argument('--servers', type=_csv, default=['werkzeug'],
+                        help='Server modes: werkzeug, asgi (default: werkzeug)')
+    parser.add_argument('--runs', type=int, default=5, help='Launches per case')
+    parser.add_argument('--output', help='Write the JSON report here')
+    parser.add_argument('--compare', help='Baseline JSON report; exit 1 on regressions')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='Allowed relative increase in median time-to-first-200 (default 0.25)')
+    args = parser.parse_args()
+
+    unknown = set(args.modes) - set(DELIVERY_MODES) | set(args.servers) - set(SERVER_MODES)
+    if unknown:
+        parser.error(f'unknown mode(s): {", ".join(sorted(unknown))}')
+
+    report = run_suite(args.modes, args.servers, args.runs)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = find_regressions(json.load(f), report, args.tolerance)
+        for regression in regressions:
+            print(f'REGRESSION {regression}')
+        if regressions:
+            sys.exit(1)
+        print('No regressions')
+
+
+if __name__ == '__main__':
+    main()
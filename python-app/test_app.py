@@ -5,11 +5,21 @@ Tests cover multiple secret delivery methods: vault-secrets-operator,
 vault-agent-sidecar, and vault-csi-driver.
 """
 
+import asyncio
+import dataclasses
+import http.client
+import json
 import os
+import socket
 import sys
+import threading
+import time
 import pytest
+from datetime import datetime, timezone
 from unittest.mock import MagicMock
 
+from benchmarks.fixtures import write_csi_tree
+
 # Patch hvac import before importing app module
 sys.modules['hvac'] = MagicMock()
 
@@ -37,6 +47,192 @@ class TestHealthEndpoint:
         assert 'T' in data['timestamp']
 
 
+class TestReadyEndpoint:
+    """Tests for the /ready endpoint and its in-memory freshness checks."""
+
+    @pytest.fixture
+    def poller(self, client, monkeypatch):
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        monkeypatch.setattr(app_module, 'credential_poller', poller)
+        return poller, vault
+
+    @pytest.fixture
+    def vault_client(self, client, monkeypatch):
+        import app as app_module
+        fake = MagicMock()
+        fake.token_expires_in.return_value = 3600
+        fake.breaker = app_module.CircuitBreaker()
+        monkeypatch.setattr(app_module, 'vault_client', fake)
+        return fake
+
+    def test_env_delivery_is_ready(self, client):
+        """Env-delivered credentials are always present, so the pod is ready."""
+        response = client.get('/ready')
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['status'] == 'ready'
+        assert data['checks']['snapshot']['source'] == 'env'
+        assert response.headers['Cache-Control'] == 'no-store'
+
+    def test_not_ready_before_the_first_vault_read(self, client, poller, vault_client):
+        """With a poller but no snapshot yet the pod is unready, without touching Vault."""
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['checks']['snapshot'] == {'ok': False}
+        poller[1].read_static_creds.assert_not_called()
+
+        poller[0].refresh('ldap', 'dual-rotation-demo')
+        data = client.get('/ready').get_json()
+        assert data['status'] == 'ready'
+        assert data['checks']['refresh'] == {'ok': True, 'stale_age': None, 'last_success_age': 0}
+        assert poller[1].read_static_creds.call_count == 1
+
+    def test_not_ready_once_vault_failures_exceed_max_stale_age(self, client, poller, vault_client, monkeypatch):
+        """A role failing for longer than READY_MAX_STALE_AGE makes the pod unready."""
+        import app as app_module
+        credential_poller, vault = poller
+        credential_poller.refresh('ldap', 'dual-rotation-demo')
+        vault.read_static_creds.return_value = None
+        credential_poller.refresh('ldap', 'dual-rotation-demo')
+        assert client.get('/ready').status_code == 200
+        monkeypatch.setattr(app_module, 'READY_MAX_STALE_AGE', 60)
+        credential_poller._last_success[('ldap', 'dual-rotation-demo')] -= 120
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['checks']['refresh']['ok'] is False
+        assert response.get_json()['checks']['refresh']['stale_age'] >= 120
+
+    def test_token_expiry_and_breaker(self, client, poller, vault_client, monkeypatch):
+        """An expiring token fails readiness; an open breaker only does when configured to."""
+        import app as app_module
+        poller[0].refresh('ldap', 'dual-rotation-demo')
+        monkeypatch.setattr(app_module, 'READY_MIN_TOKEN_TTL', 30)
+        vault_client.token_expires_in.return_value = 10
+        assert client.get('/ready').get_json()['checks']['token'] == {'ok': False, 'expires_in': 10}
+
+        vault_client.token_expires_in.return_value = 3600
+        for _ in range(3):
+            vault_client.breaker.record_failure()
+        response = client.get('/ready')
+        assert response.status_code == 200
+        assert response.get_json()['checks']['breaker'] == {'ok': True, 'state': 'open'}
+        monkeypatch.setattr(app_module, 'READY_FAIL_ON_OPEN_BREAKER', True)
+        assert client.get('/ready').status_code == 503
+
+    def test_max_snapshot_age(self, client, monkeypatch):
+        """READY_MAX_SNAPSHOT_AGE fails readiness when the served credentials stopped changing."""
+        import app as app_module
+        monkeypatch.setattr(app_module, '_env_snapshot', app_module.CredentialSnapshot.from_mapping(
+            {'username': 'old'}, 'env', now=time.time() - 600))
+        assert client.get('/ready').status_code == 200
+        monkeypatch.setattr(app_module, 'READY_MAX_SNAPSHOT_AGE', 300)
+        response = client.get('/ready')
+        assert response.status_code == 503
+        assert response.get_json()['checks']['snapshot']['age'] >= 600
+
+    def test_file_cache_not_read_yet(self, client_agent, monkeypatch):
+        """A file cache that has not read its files yet is unready."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'file_cred_cache', app_module.FileCredentialCache('vault-agent-sidecar'))
+        assert client_agent.get('/ready').status_code == 503
+
+    def test_asgi_ready_matches_flask_view(self, client, poller):
+        """The native ASGI /ready answers from the same checks."""
+        import app as app_module
+        status, headers, body = asyncio.run(_asgi_request(app_module.asgi_app, '/ready'))
+        assert status == 503
+        assert json.loads(body)['checks']['snapshot'] == {'ok': False}
+        poller[0].refresh('ldap', 'dual-rotation-demo')
+        status, _, _ = asyncio.run(_asgi_request(app_module.asgi_app, '/ready'))
+        assert status == 200
+
+
+class TestAppFactory:
+    """Tests for deferred imports and starting background workers only when serving."""
+
+    def test_import_starts_nothing(self, client_agent):
+        """Importing the module builds the file cache without starting it or importing hvac."""
+        import app as app_module
+        assert app_module._workers_started is False
+        assert app_module.file_cred_cache._running is False
+        assert app_module.hvac is None and app_module.requests is None
+        assert app_module.STARTUP_SECONDS['import'] > 0
+
+    def test_first_request_starts_workers(self, client_agent):
+        """Servers that import `app` directly get the workers started by the first request."""
+        import app as app_module
+        response = client_agent.get('/api/credentials')
+        assert response.get_json()['username'] == 'agent-user'
+        assert app_module.file_cred_cache._running is True
+        assert 'workers' in app_module.STARTUP_SECONDS
+        app_module.file_cred_cache.stop()
+
+    def test_create_app_starts_workers_once(self, client_agent, monkeypatch):
+        """create_app() starts every configured worker exactly once and reports startup timing."""
+        import app as app_module
+        started = []
+        monkeypatch.setattr(app_module.file_cred_cache, 'start', lambda: started.append(True))
+        assert app_module.create_app() is app_module.app
+        app_module.create_app()
+        assert started == [True]
+        metrics = client_agent.get('/metrics').get_data(as_text=True)
+        assert 'app_startup_seconds{phase="import"}' in metrics
+        assert 'app_startup_seconds{phase="workers"}' in metrics
+
+    def test_create_app_warms_the_page_caches(self, client, monkeypatch):
+        """The page this pod serves and its compressed assets are built by create_app(), not the first visitor."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'COMPRESSION_MIN_SIZE', 0)
+        app_module.create_app()
+        assert app_module._single_account_template.cache_info().currsize == 1
+        assert app_module._dual_account_page.cache_info().currsize == 0
+
+        compress = MagicMock(side_effect=AssertionError("compressed on a request"))
+        monkeypatch.setattr(app_module, 'compress_body', compress)
+        for url in (app_module.SINGLE_ACCOUNT_CSS_URL, app_module.VAULT_LOGO_URL):
+            assert client.get(url, headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+    def test_leader_segment_is_created_by_the_factory(self, monkeypatch, tmp_path):
+        """SNAPSHOT_SHARING=leader maps its segment file when workers start, not at import."""
+        import importlib
+        import app as app_module
+        path = tmp_path / 'snapshots'
+        monkeypatch.setenv('SNAPSHOT_SHARING', 'leader')
+        monkeypatch.setenv('SHARED_SNAPSHOT_PATH', str(path))
+        importlib.reload(app_module)
+        try:
+            assert app_module.snapshot_publisher is None
+            assert not path.exists()
+            app_module.create_app()
+            assert path.exists()
+            assert app_module.snapshot_publisher._running is True
+        finally:
+            if app_module.snapshot_publisher:
+                app_module.snapshot_publisher.stop()
+            monkeypatch.undo()
+            importlib.reload(app_module)
+
+    def test_vault_mode_imports_hvac_on_demand(self, monkeypatch, tmp_path):
+        """With VAULT_ADDR/VAULT_AUTH_ROLE set, hvac is imported and the client built but not started."""
+        import importlib
+        import app as app_module
+        monkeypatch.setenv('VAULT_ADDR', 'http://127.0.0.1:1')
+        monkeypatch.setenv('VAULT_AUTH_ROLE', 'demo')
+        importlib.reload(app_module)
+        try:
+            assert app_module.hvac is sys.modules['hvac']
+            assert app_module.requests is not None
+            assert app_module.vault_client._running is False
+            assert app_module.credential_poller._running is False
+        finally:
+            monkeypatch.undo()
+            importlib.reload(app_module)
+
+
 class TestFileCredentialCacheAgentMode:
     """Tests for FileCredentialCache with vault-agent-sidecar delivery."""
 
@@ -132,6 +328,93 @@ class TestFileCredentialCacheAgentMode:
             app_module.VAULT_AGENT_CREDS_FILE = original
 
 
+class TestAgentFileSections:
+    """Tests for multi-role [mount/role] sections in the Vault Agent rendered file."""
+
+    SECTIONED = (
+        "# rendered by vault agent\n"
+        "[ldap/role-a]\n"
+        "LDAP_USERNAME=svc-a\n"
+        "LDAP_PASSWORD=pass-a\n"
+        "\n"
+        "[ldap/role-b]\n"
+        "LDAP_USERNAME=svc-b\n"
+        "LDAP_PASSWORD=pass-b\n"
+    )
+
+    @pytest.fixture
+    def agent_cache(self, monkeypatch, tmp_path):
+        import app as app_module
+        creds_file = tmp_path / "ldap-creds"
+        creds_file.write_text(self.SECTIONED)
+        monkeypatch.setattr(app_module, 'VAULT_AGENT_CREDS_FILE', str(creds_file))
+        cache = app_module.FileCredentialCache('vault-agent-sidecar')
+        cache._read_credentials()
+        return cache, creds_file
+
+    def test_iter_sections_streams_named_and_unsectioned_keys(self):
+        """Keys before the first header form the unnamed section; comments and blanks are dropped."""
+        import app as app_module
+        lines = iter(["A=1\n", "# note\n", "\n", "[ldap/x]\n", "B=2\n", "[ /ldap/y/ ]\n"])
+        sections = [(name, body) for name, _, body in app_module.iter_agent_sections(lines)]
+        assert sections == [(None, ['A=1']), ('ldap/x', ['B=2']), ('ldap/y', [])]
+
+    def test_sections_are_indexed_by_role(self, agent_cache):
+        """Each section gets its own snapshot; the first one also feeds the dashboard."""
+        cache, _ = agent_cache
+        assert cache.roles() == [('ldap', 'role-a'), ('ldap', 'role-b')]
+        assert cache.get_role_snapshot('ldap', 'role-b').username == 'svc-b'
+        assert cache.get_role_snapshot('ldap', 'missing') is None
+        assert cache.get_snapshot() is cache.get_role_snapshot('ldap', 'role-a')
+        assert cache.get_credentials() == {'LDAP_USERNAME': 'svc-a', 'LDAP_PASSWORD': 'pass-a'}
+
+    def test_only_changed_sections_are_rebuilt(self, agent_cache):
+        """Rewriting one section rebuilds its snapshot and keeps the others as they were."""
+        cache, creds_file = agent_cache
+        snapshot_a = cache.get_role_snapshot('ldap', 'role-a')
+        snapshot_b = cache.get_role_snapshot('ldap', 'role-b')
+        creds_file.write_text(self.SECTIONED.replace('pass-b', 'pass-b2'))
+        assert cache._read_credentials() is True
+        assert cache.get_role_snapshot('ldap', 'role-a') is snapshot_a
+        assert cache.get_role_snapshot('ldap', 'role-b') is not snapshot_b
+        assert cache.get_role_snapshot('ldap', 'role-b').password == 'pass-b2'
+
+    def test_ttl_only_rerender_keeps_role_versions(self, agent_cache):
+        """Re-rendering sections with only a new ROTATION_TTL keeps every role's snapshot and version."""
+        import app as app_module
+        cache, creds_file = agent_cache
+        rendered = self.SECTIONED.replace('LDAP_PASSWORD=pass-a\n', 'LDAP_PASSWORD=pass-a\nROTATION_TTL=120\n')
+        creds_file.write_text(rendered)
+        cache._read_credentials()
+        snapshot_a = cache.get_role_snapshot('ldap', 'role-a')
+        generation = app_module.snapshot_updates.generation
+
+        creds_file.write_text(rendered.replace('ROTATION_TTL=120', 'ROTATION_TTL=90'))
+        assert cache._read_credentials() is False
+        assert cache.get_role_snapshot('ldap', 'role-a') is snapshot_a
+        assert cache.get_snapshot() is snapshot_a
+        assert app_module.snapshot_updates.generation == generation
+
+    def test_unchanged_file_is_not_a_change(self, agent_cache):
+        """Re-reading an identical file (even reformatted) reports no change."""
+        cache, creds_file = agent_cache
+        creds_file.write_text(self.SECTIONED.replace('\n\n', '\n# comment\n'))
+        assert cache._read_credentials() is False
+
+    def test_role_endpoints_serve_agent_sections(self, client, agent_cache, monkeypatch):
+        """Per-role and bulk endpoints serve sections of the agent file when no Vault poller is set."""
+        import app as app_module
+        cache, _ = agent_cache
+        monkeypatch.setattr(app_module, 'file_cred_cache', cache)
+        response = client.get('/api/credentials/ldap/role-b')
+        assert response.status_code == 200
+        assert response.get_json()['username'] == 'svc-b'
+        assert client.get('/api/credentials/ldap/unknown').status_code == 404
+        body = client.get('/api/credentials?roles=*').get_json()
+        assert set(body['roles']) == {'ldap/role-a', 'ldap/role-b'}
+        assert body['missing'] == []
+
+
 class TestFileCredentialCacheCSIMode:
     """Tests for FileCredentialCache with vault-csi-driver delivery."""
 
@@ -211,6 +494,200 @@ class TestFileCredentialCacheCSIMode:
             app_module.VAULT_CSI_SECRETS_DIR = original
 
 
+class TestFileCredentialCacheCSIChangeDetection:
+    """Tests for stat-based incremental reloads of CSI files."""
+
+    def test_only_changed_files_are_reread(self, tmp_path, monkeypatch):
+        """Files with an unchanged fingerprint are not opened again."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        (tmp_path / "username").write_text("user")
+        (tmp_path / "password").write_text("pass-1")
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+
+        cache._read_credentials()
+        assert cache.tick_stats() == {'read': 2, 'skipped': 0}
+
+        cache._read_credentials()
+        assert cache.tick_stats() == {'read': 0, 'skipped': 2}
+
+        (tmp_path / "password").write_text("pass-22")
+        skipped = app_module.FILE_SKIPS._collect().get((), 0)
+        cache._read_credentials()
+        assert cache.tick_stats() == {'read': 1, 'skipped': 1}
+        assert cache.get_credentials() == {'username': 'user', 'password': 'pass-22'}
+        assert app_module.FILE_SKIPS._collect()[()] == skipped + 1
+        assert 'file_cache_files_skipped_total ' in app_module.metrics.render()
+
+    def test_removed_files_are_dropped(self, tmp_path, monkeypatch):
+        """A file deleted from the directory disappears from the credentials."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        (tmp_path / "username").write_text("user")
+        (tmp_path / "standby_username").write_text("standby")
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+        cache._read_credentials()
+
+        (tmp_path / "standby_username").unlink()
+        cache._read_credentials()
+        assert cache.get_credentials() == {'username': 'user'}
+
+    def test_unmoved_data_link_skips_the_tick(self, tmp_path, monkeypatch):
+        """With an unchanged ..data target the directory is not even listed."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        write_csi_tree(tmp_path, {'username': 'a', 'password': 'p'}, 1)
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+        cache._read_credentials()
+
+        scandir = MagicMock(side_effect=AssertionError("directory listed"))
+        monkeypatch.setattr(app_module.os, 'scandir', scandir)
+        cache._read_credentials()
+        assert cache.tick_stats() == {'read': 0, 'skipped': 2}
+        assert cache.get_credentials() == {'username': 'a', 'password': 'p'}
+
+        monkeypatch.undo()
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        write_csi_tree(tmp_path, {'username': 'b', 'password': 'p'}, 2)
+        cache._read_credentials()
+        assert cache.get_credentials()['username'] == 'b'
+
+
+def _wait_for(predicate, timeout=3.0):
+    """Poll predicate until it is true or timeout expires."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.01)
+    return predicate()
+
+
+def _batching_vault():
+    """MagicMock Vault client whose read_static_creds_batch runs read_static_creds for each key in parallel."""
+    vault = MagicMock()
+
+    def batch(keys, on_result=None):
+        threads = [threading.Thread(target=lambda key=key: results.__setitem__(key, vault.read_static_creds(*key)))
+                   for key in keys]
+        results = {}
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        for key, data in results.items():
+            on_result(key, data, None if data else 'no data')
+        return {key: (data, None if data else 'no data') for key, data in results.items()}
+
+    vault.read_static_creds_batch.side_effect = batch
+    return vault
+
+
+class TestFileCredentialCacheWatching:
+    """Tests for inotify-based change detection in FileCredentialCache."""
+
+    def test_inotify_reports_data_symlink_swap(self, tmp_path):
+        """InotifyWatcher sees the ..data rename of an atomic CSI update."""
+        from app import InotifyWatcher
+        write_csi_tree(tmp_path, {'username': 'a'}, 1)
+        watcher = InotifyWatcher(str(tmp_path))
+        try:
+            write_csi_tree(tmp_path, {'username': 'b'}, 2)
+            names = set()
+            for _ in range(5):
+                names |= watcher.wait(0.2)
+            assert '..data' in names
+        finally:
+            watcher.close()
+
+    def test_csi_update_is_picked_up_without_polling(self, tmp_path, monkeypatch):
+        """A ..data swap reloads credentials well before the poll interval."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        write_csi_tree(tmp_path, {'username': 'before'}, 1)
+        cache = app_module.FileCredentialCache('vault-csi-driver', refresh_interval=60,
+                                               watch_mode='inotify')
+        cache.start()
+        try:
+            assert _wait_for(lambda: cache.get_credentials().get('username') == 'before')
+            write_csi_tree(tmp_path, {'username': 'after'}, 2)
+            assert _wait_for(lambda: cache.get_credentials().get('username') == 'after')
+        finally:
+            cache.stop()
+
+    def test_agent_file_rename_is_picked_up(self, tmp_path, monkeypatch):
+        """Atomically replacing the agent file triggers a reload."""
+        import app as app_module
+        creds_file = tmp_path / "ldap-creds"
+        creds_file.write_text("LDAP_USERNAME=before\n")
+        monkeypatch.setattr(app_module, 'VAULT_AGENT_CREDS_FILE', str(creds_file))
+        cache = app_module.FileCredentialCache('vault-agent-sidecar', refresh_interval=60,
+                                               watch_mode='inotify')
+        cache.start()
+        try:
+            assert _wait_for(lambda: cache.get_credentials().get('LDAP_USERNAME') == 'before')
+            (tmp_path / "ldap-creds.tmp").write_text("LDAP_USERNAME=after\n")
+            os.replace(tmp_path / "ldap-creds.tmp", creds_file)
+            assert _wait_for(lambda: cache.get_credentials().get('LDAP_USERNAME') == 'after')
+        finally:
+            cache.stop()
+
+    def test_start_reads_the_file_once(self, tmp_path, monkeypatch):
+        """start() reads synchronously and the refresh thread does not read again."""
+        import app as app_module
+        creds_file = tmp_path / "ldap-creds"
+        creds_file.write_text("LDAP_USERNAME=before\n")
+        monkeypatch.setattr(app_module, 'VAULT_AGENT_CREDS_FILE', str(creds_file))
+        cache = app_module.FileCredentialCache('vault-agent-sidecar', refresh_interval=60,
+                                               watch_mode='inotify')
+        reads = []
+        original = cache._read_credentials
+        monkeypatch.setattr(cache, '_read_credentials', lambda: reads.append(1) or original())
+        cache.start()
+        try:
+            assert cache.get_credentials()['LDAP_USERNAME'] == 'before'
+            time.sleep(0.2)
+            assert len(reads) == 1
+        finally:
+            cache.stop()
+
+    def test_poll_mode_does_not_create_watcher(self, tmp_path, monkeypatch):
+        """FILE_WATCH_MODE=poll keeps the timer-based refresh."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        cache = app_module.FileCredentialCache('vault-csi-driver', watch_mode='poll')
+        assert cache._create_watcher() is None
+
+    def test_unchanged_content_is_not_republished(self, tmp_path, monkeypatch):
+        """Re-reading identical files reports no change."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        (tmp_path / "username").write_text("same")
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+        assert cache._read_credentials() is True
+        assert cache._read_credentials() is False
+
+    def test_ttl_only_rerender_keeps_the_snapshot_version(self, tmp_path, monkeypatch):
+        """A re-render that only moves ROTATION_TTL neither re-versions nor wakes waiters."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        (tmp_path / "username").write_text("svc")
+        (tmp_path / "ROTATION_TTL").write_text("120")
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+        cache._read_credentials()
+        snapshot = cache.get_snapshot()
+        generation = app_module.snapshot_updates.generation
+
+        (tmp_path / "ROTATION_TTL").write_text("90")
+        assert cache._read_credentials() is False
+        assert cache.get_snapshot() is snapshot
+        assert app_module.snapshot_updates.generation == generation
+
+        (tmp_path / "username").write_text("svc-2")
+        assert cache._read_credentials() is True
+        assert cache.get_snapshot().version > snapshot.version
+
+
 class TestVaultClient:
     """Tests for VaultClient class (mocked - no actual Vault connectivity)."""
 
@@ -260,6 +737,348 @@ class TestVaultClient:
         result = client._read_sa_token()
         assert result == "my-jwt-token-here"
 
+    def test_build_vault_session_pool_and_retries(self):
+        """The Vault session mounts a sized, retrying keep-alive adapter."""
+        from app import build_vault_session
+        session = build_vault_session(pool_size=25, retries=4)
+        adapter = session.get_adapter('https://vault:8200')
+
+        assert adapter._pool_maxsize == 25
+        assert adapter.max_retries.total == 4
+        assert session.headers['Connection'] == 'keep-alive'
+        socket_options = adapter.poolmanager.connection_pool_kw['socket_options']
+        assert (socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1) in socket_options
+
+    def test_relogin_reuses_pooled_session(self, vault_hvac):
+        """Every login builds its hvac client on the same session and timeouts."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test", timeout=(1, 2))
+        client._login()
+        client._login()
+
+        sessions = {id(c.kwargs['session']) for c in vault_hvac.Client.call_args_list}
+        assert sessions == {id(client._session)}
+        assert all(c.kwargs['timeout'] == (1, 2) for c in vault_hvac.Client.call_args_list)
+
+    def test_ensure_authenticated_skips_token_lookup(self, vault_hvac):
+        """A locally unexpired token is trusted without a lookup-self call."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        assert client._login()
+        hvac_client = vault_hvac.Client.return_value
+
+        assert client._ensure_authenticated()
+        assert client._ensure_authenticated()
+        hvac_client.is_authenticated.assert_not_called()
+        assert hvac_client.auth.kubernetes.login.call_count == 1
+
+    def test_login_schedules_renewal_at_80_percent(self, vault_hvac):
+        """Login records expiry and renews at 80% of the lease."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        client._login()
+        lease = client._token_expires_at - client._token_renew_at
+        assert lease == pytest.approx(600 * 0.2, abs=1)
+
+    def test_token_expires_in(self, vault_hvac):
+        """token_expires_in() is None before the first login, then the seconds left on the lease."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        assert client.token_expires_in() is None
+        client._login()
+        assert client.token_expires_in() == pytest.approx(600, abs=1)
+        assert client.token_expires_in(now=client._token_expires_at + 5) == pytest.approx(-5)
+
+    def test_renew_token_uses_renew_self(self, vault_hvac):
+        """Renewal extends the lease with renew-self instead of logging in."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        client._login()
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.auth.token.renew_self.return_value = {
+            'auth': {'lease_duration': 1200, 'renewable': True}}
+
+        assert client._renew_token()
+        hvac_client.auth.token.renew_self.assert_called_once()
+        assert hvac_client.auth.kubernetes.login.call_count == 1
+        assert client._token_expires_at > client._token_renew_at + 200
+
+    def test_failed_renewal_logs_in_again(self, vault_hvac):
+        """A failed renew-self falls back to a fresh Kubernetes login."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        client._login()
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.auth.token.renew_self.side_effect = RuntimeError("boom")
+
+        assert client._renew_token()
+        assert hvac_client.auth.kubernetes.login.call_count == 2
+
+    def test_forbidden_read_logs_in_and_retries(self, vault_hvac):
+        """A 403 on read re-authenticates once and retries the read."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = [
+            vault_hvac.exceptions.Forbidden("permission denied"),
+            {'data': {'username': 'svc-a'}},
+        ]
+
+        assert client.read_static_creds('ldap', 'demo') == {'username': 'svc-a'}
+        assert hvac_client.auth.kubernetes.login.call_count == 2
+
+    def test_batch_reads_run_concurrently(self, vault_hvac):
+        """A batch of N reads takes about one round trip, not N."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test", batch_max_in_flight=8)
+        hvac_client = vault_hvac.Client.return_value
+
+        def read(path):
+            time.sleep(0.2)
+            return {'data': {'username': path.rsplit('/', 1)[1]}}
+
+        hvac_client.read.side_effect = read
+        keys = [('ldap', f'role-{i}') for i in range(8)]
+        started = time.perf_counter()
+        results = client.read_static_creds_batch(keys)
+        elapsed = time.perf_counter() - started
+        client.stop()
+
+        assert results == {key: ({'username': key[1]}, None) for key in keys}
+        assert elapsed < 0.2 * 4
+        assert hvac_client.auth.kubernetes.login.call_count == 1
+
+    def test_batch_returns_per_role_errors_with_results(self, vault_hvac):
+        """One bad role fails on its own; the rest of the batch still succeeds."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        hvac_client = vault_hvac.Client.return_value
+
+        def read(path):
+            if path.endswith('/missing'):
+                raise vault_hvac.exceptions.InvalidPath("no such role")
+            return {'data': {'username': 'svc'}} if path.endswith('/ok') else None
+
+        hvac_client.read.side_effect = read
+        landed = []
+        results = client.read_static_creds_batch(
+            [('ldap', 'ok'), ('ldap', 'missing'), ('ldap', 'empty'), ('ldap', 'ok')],
+            on_result=lambda key, data, error: landed.append(key))
+        client.stop()
+
+        assert results[('ldap', 'ok')] == ({'username': 'svc'}, None)
+        assert results[('ldap', 'missing')] == (None, 'no such role')
+        assert results[('ldap', 'empty')] == (None, 'no data')
+        assert sorted(landed) == sorted(results)
+        assert hvac_client.read.call_count == 3
+        assert client.breaker.state == 'closed'
+
+    def test_batch_forbidden_logs_in_once_and_retries_denied_roles(self, vault_hvac):
+        """403s in a batch trigger one re-login, then only the denied roles are read again."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        hvac_client = vault_hvac.Client.return_value
+        denied = {'ldap/static-cred/a', 'ldap/static-cred/b'}
+        lock = threading.Lock()
+
+        def read(path):
+            with lock:
+                if path in denied:
+                    denied.discard(path)
+                    raise vault_hvac.exceptions.Forbidden("permission denied")
+            return {'data': {'username': path}}
+
+        hvac_client.read.side_effect = read
+        results = client.read_static_creds_batch([('ldap', 'a'), ('ldap', 'b'), ('ldap', 'c')])
+        client.stop()
+
+        assert all(error is None for _, error in results.values())
+        assert hvac_client.read.call_count == 5
+        assert hvac_client.auth.kubernetes.login.call_count == 2
+
+    def test_batch_outage_counts_once_and_open_breaker_skips_vault(self, vault_hvac):
+        """A batch that only sees outages is one breaker failure; an open breaker fails every role at once."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = ConnectionError("vault sealed")
+        keys = [('ldap', 'a'), ('ldap', 'b'), ('ldap', 'c')]
+
+        client.read_static_creds_batch(keys)
+        assert client.breaker.state == 'closed'
+        client.read_static_creds_batch(keys)
+        assert client.breaker.state == 'open'
+        results = client.read_static_creds_batch(keys)
+        client.stop()
+
+        assert results == {key: (None, 'circuit breaker open') for key in keys}
+        assert hvac_client.read.call_count == 6
+
+    def test_half_open_batch_sends_a_single_probe_first(self, vault_hvac):
+        """While half-open only one read is in flight; the rest follow once it closes the breaker."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+        hvac_client = vault_hvac.Client.return_value
+        lock = threading.Lock()
+        in_flight = [0]
+        seen = []
+
+        def read(path):
+            with lock:
+                in_flight[0] += 1
+                seen.append((in_flight[0], client.breaker.state))
+            time.sleep(0.05)
+            with lock:
+                in_flight[0] -= 1
+            return {'data': {'username': path}}
+
+        hvac_client.read.side_effect = read
+        client.breaker.record_failure()
+        time.sleep(0.02)
+        keys = [('ldap', f'role-{i}') for i in range(10)]
+        results = client.read_static_creds_batch(keys)
+        client.stop()
+
+        assert seen[0] == (1, 'half_open')
+        assert all(state == 'closed' for _, state in seen[1:])
+        assert max(count for count, _ in seen[1:]) > 1
+        assert all(error is None for _, error in results.values())
+
+    def test_failed_half_open_probe_fails_the_rest_of_the_batch(self, vault_hvac):
+        """If the probe fails, the breaker re-opens and no other role is read."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = ConnectionError("vault sealed")
+        client.breaker.record_failure()
+        time.sleep(0.02)
+        keys = [('ldap', f'role-{i}') for i in range(10)]
+        results = client.read_static_creds_batch(keys)
+        client.stop()
+
+        assert hvac_client.read.call_count == 1
+        assert client.breaker.state == 'open'
+        assert [error for _, error in results.values()].count('circuit breaker open') == 9
+
+    def test_probe_without_an_sa_token_settles_the_breaker(self, vault_hvac, tmp_path):
+        """A half-open probe whose login cannot read the SA token re-opens the breaker instead of sticking."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.01))
+        token = tmp_path / "token"
+        token.unlink()
+        reads = (lambda: client.read_static_creds('ldap', 'demo'),
+                 lambda: client.read_static_creds_batch([('ldap', 'demo')])[('ldap', 'demo')][0])
+        # The projected token volume is gone: first missing, then a directory in its place
+        for token_is_dir in (False, True):
+            if token_is_dir:
+                token.mkdir()
+            for read in reads:
+                client.breaker.record_failure()
+                time.sleep(0.02)
+                assert read() is None
+                assert client.breaker.state == 'open'
+                assert client.breaker._probe_in_flight is False
+        client.stop()
+        vault_hvac.Client.return_value.read.assert_not_called()
+
+
+class TestCircuitBreaker:
+    """Tests for the Vault circuit breaker and stale-while-revalidate serving."""
+
+    def test_opens_after_threshold_and_fails_fast(self):
+        """Consecutive failures open the breaker; calls are then rejected."""
+        from app import CircuitBreaker
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == 'closed'
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        assert not breaker.allow()
+
+    def test_half_open_admits_a_single_probe(self):
+        """After the reset timeout exactly one probe is allowed at a time."""
+        from app import CircuitBreaker
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+        breaker.record_failure()
+        time.sleep(0.02)
+        assert breaker.state == 'half_open'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(breaker.allow())) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert results.count(True) == 1
+
+        breaker.record_failure()
+        assert breaker.state == 'open'
+        time.sleep(0.02)
+        assert breaker.allow()
+        breaker.record_success()
+        assert breaker.state == 'closed'
+        assert breaker.allow() and breaker.allow()
+
+    def test_vault_outage_stops_reads(self, vault_hvac):
+        """Once open, reads return immediately without calling Vault."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = ConnectionError("vault sealed")
+
+        assert client.read_static_creds('ldap', 'demo') is None
+        assert client.read_static_creds('ldap', 'demo') is None
+        assert client.read_static_creds('ldap', 'demo') is None
+        assert hvac_client.read.call_count == 2
+        assert client.breaker.state == 'open'
+
+    def test_unknown_role_does_not_trip_breaker(self, vault_hvac):
+        """A 404 for one role is not treated as a Vault outage."""
+        from app import CircuitBreaker, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test",
+                             breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = vault_hvac.exceptions.InvalidPath("no such role")
+
+        assert client.read_static_creds('ldap', 'missing') is None
+        assert client.breaker.state == 'closed'
+
+    def test_api_serves_stale_snapshot_while_vault_fails(self, client):
+        """Failed refreshes keep serving the last good snapshot, flagged stale."""
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        app_module.credential_poller = poller
+        fresh = client.get('/api/credentials')
+        assert 'stale' not in fresh.get_json()
+
+        generation = app_module.snapshot_updates.generation
+        vault.read_static_creds.return_value = None
+        poller.refresh('ldap', 'dual-rotation-demo')
+        assert app_module.snapshot_updates.generation == generation + 1
+
+        stale = client.get('/api/credentials', headers={'If-None-Match': fresh.headers['ETag']})
+        assert stale.status_code == 200
+        data = stale.get_json()
+        assert data['username'] == 'svc-a'
+        assert data['stale'] is True
+        assert data['stale_age'] >= 0
+        assert 'ETag' not in stale.headers
+
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller.refresh('ldap', 'dual-rotation-demo')
+        assert 'stale' not in client.get('/api/credentials').get_json()
+        assert app_module.snapshot_updates.generation == generation + 2
+
 
 class TestMainPage:
     """Tests for the main page (/) endpoint."""
@@ -293,6 +1112,51 @@ class TestMainPage:
         assert b'Vault CSI Driver' in response.data
 
 
+class TestStaticPageShell:
+    """Tests for precompiled page templates and content-hashed static assets."""
+
+    def test_single_account_page_links_hashed_assets(self, client):
+        """The page links its stylesheet and logo instead of inlining them."""
+        import app as app_module
+        response = client.get('/')
+        assert app_module.SINGLE_ACCOUNT_CSS_URL.encode() in response.data
+        assert app_module.VAULT_LOGO_URL.encode() in response.data
+        assert b'<style>' not in response.data
+        assert b'<path' not in response.data
+
+    def test_assets_are_immutable_and_content_addressed(self, client):
+        """Assets are served with a long-lived cache header under a hashed name."""
+        import app as app_module
+        response = client.get(app_module.DUAL_ACCOUNT_CSS_URL)
+        assert response.status_code == 200
+        assert response.mimetype == 'text/css'
+        assert 'immutable' in response.headers['Cache-Control']
+        assert response.data.decode() == app_module.DUAL_ACCOUNT_CSS
+        assert client.get(app_module.VAULT_LOGO_URL).mimetype == 'image/svg+xml'
+
+        revalidated = client.get(app_module.DUAL_ACCOUNT_CSS_URL,
+                                 headers={'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
+
+    def test_unknown_asset_returns_404(self, client):
+        """An unknown or stale asset name returns 404."""
+        assert client.get('/static/dual-account.0000.css').status_code == 404
+
+    def test_dual_account_page_is_prerendered(self, client, monkeypatch):
+        """The dual-account page is the same pre-rendered bytes on every hit, with an ETag."""
+        import app as app_module
+        monkeypatch.setenv('DUAL_ACCOUNT_MODE', 'true')
+        first = client.get('/')
+        assert first.data == app_module._dual_account_page()[0]
+        assert app_module.DUAL_ACCOUNT_JS_URL.encode() in first.data
+        assert b'Vault Secrets Operator' in first.data
+        assert client.get('/').data == first.data
+
+        revalidated = client.get('/', headers={'If-None-Match': first.headers['ETag']})
+        assert revalidated.status_code == 304
+        assert revalidated.data == b''
+
+
 class TestApiCredentialsEndpoint:
     """Tests for the /api/credentials endpoint."""
 
@@ -302,6 +1166,16 @@ class TestApiCredentialsEndpoint:
         assert response.status_code == 200
         assert response.content_type == 'application/json'
 
+    def test_unread_file_source_keeps_one_version(self, client, monkeypatch):
+        """Before a file-based method's first read, every page render gets the same empty snapshot."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SECRET_DELIVERY_METHOD', 'vault-agent-sidecar')
+        monkeypatch.setattr(app_module, 'file_cred_cache', app_module.FileCredentialCache('vault-agent-sidecar'))
+        first = app_module._get_credentials_from_source()
+        assert first.username is None
+        assert client.get('/').status_code == 200
+        assert app_module._get_credentials_from_source() is first
+
     def test_api_credentials_has_expected_structure(self, client):
         """API credentials endpoint returns expected JSON structure."""
         response = client.get('/api/credentials')
@@ -323,8 +1197,1448 @@ class TestApiCredentialsEndpoint:
         assert isinstance(data['rotation_period'], int)
 
 
+class TestCredentialSnapshot:
+    """Tests for normalized, versioned CredentialSnapshot objects."""
+
+    def test_aliases_and_integers_are_normalized(self):
+        """Agent-style upper-case keys and CSI-style lower-case keys map to the same fields."""
+        from app import CredentialSnapshot
+        agent = CredentialSnapshot.from_mapping(
+            {'LDAP_USERNAME': 'svc', 'LDAP_PASSWORD': 'pw', 'ROTATION_PERIOD': '300',
+             'ROTATION_TTL': '120', 'ACTIVE_ACCOUNT': 'b'}, 'file')
+        csi = CredentialSnapshot.from_mapping(
+            {'username': 'svc', 'password': 'pw', 'rotation_period': '300',
+             'ttl': '120', 'active_account': 'b'}, 'file')
+
+        assert agent == csi
+        assert agent.rotation_period == 300
+        assert agent.ttl == 120
+        assert agent.active_account == 'b'
+
+    def test_csi_json_blob_is_parsed_once(self):
+        """The CSI ldap-creds.json blob is merged into the snapshot fields."""
+        from app import CredentialSnapshot
+        snapshot = CredentialSnapshot.from_mapping(
+            {'ldap-creds.json': '{"username": "svc-json", "rotation_state": "grace_period"}'}, 'file')
+        assert snapshot.username == 'svc-json'
+        assert snapshot.rotation_state == 'grace_period'
+
+    def test_file_ttl_derived_from_last_rotation(self):
+        """File snapshots compute ttl from last_vault_rotation and rotation_period."""
+        from app import CredentialSnapshot
+        now = 1_700_000_000
+        rotated = datetime.fromtimestamp(now - 100, timezone.utc).isoformat()
+        snapshot = CredentialSnapshot.from_mapping(
+            {'last_vault_rotation': rotated, 'rotation_period': '300', 'ttl': '999'}, 'file', now=now)
+
+        assert snapshot.ttl_remaining(now) == 200
+        assert snapshot.ttl_remaining(now + 50) == 150
+
+    def test_versions_increase_and_snapshots_are_frozen(self):
+        """Each snapshot gets a larger version and cannot be mutated."""
+        from app import CredentialSnapshot
+        first = CredentialSnapshot.from_mapping({'username': 'a'}, 'vault')
+        second = CredentialSnapshot.from_mapping({'username': 'a'}, 'vault')
+        assert second.version > first.version
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            first.username = 'b'
+
+    def test_file_cache_rebuilds_snapshot_only_on_change(self, tmp_path, monkeypatch):
+        """FileCredentialCache keeps the same snapshot while files are unchanged."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', str(tmp_path))
+        (tmp_path / "username").write_text("svc")
+        cache = app_module.FileCredentialCache('vault-csi-driver')
+        cache._read_credentials()
+        first = cache.get_snapshot()
+
+        cache._read_credentials()
+        assert cache.get_snapshot() is first
+
+        (tmp_path / "username").write_text("svc-2")
+        cache._read_credentials()
+        assert cache.get_snapshot().username == 'svc-2'
+        assert cache.get_snapshot().version > first.version
+
+
+class TestApiCredentialsCaching:
+    """Tests for pre-serialized /api/credentials responses with ETag/304."""
+
+    def _install_poller(self, app_module, data):
+        vault = MagicMock()
+        vault.read_static_creds.return_value = data
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        app_module.credential_poller = poller
+        return vault
+
+    def test_response_has_strong_etag_and_age(self, client):
+        """Responses carry a strong ETag, Age and no-cache revalidation."""
+        response = client.get('/api/credentials')
+        assert response.headers['ETag'].startswith('"')
+        assert int(response.headers['Age']) >= 0
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+    def test_matching_if_none_match_returns_304(self, client):
+        """Sending back the ETag yields an empty 304."""
+        etag = client.get('/api/credentials').headers['ETag']
+        response = client.get('/api/credentials', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers['ETag'] == etag
+
+    def test_body_is_serialized_once_per_version(self, client):
+        """Repeated requests reuse the same cached bytes."""
+        import app as app_module
+        self._install_poller(app_module, {'username': 'svc-a', 'ttl': 60})
+        client.get('/api/credentials')
+        snapshot = app_module.credential_poller.get_snapshot('ldap', 'dual-rotation-demo')
+        cached_body, _ = app_module.response_cache.get(snapshot)
+
+        response = client.get('/api/credentials')
+        assert response.data == cached_body
+        assert response.get_json()['version'] == snapshot.version
+
+    def test_new_version_changes_etag(self, client):
+        """A credential rotation invalidates the previous ETag."""
+        import app as app_module
+        vault = self._install_poller(app_module, {'username': 'svc-a', 'ttl': 60})
+        etag = client.get('/api/credentials').headers['ETag']
+
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+        app_module.credential_poller.refresh('ldap', 'dual-rotation-demo')
+        response = client.get('/api/credentials', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.get_json()['username'] == 'svc-b'
+        assert response.headers['ETag'] != etag
+
+
+class TestCredentialStream:
+    """Tests for the /api/credentials/stream Server-Sent Events endpoint."""
+
+    def _open_stream(self, client, **kwargs):
+        response = client.get('/api/credentials/stream', buffered=False, **kwargs)
+        return response, iter(response.response)
+
+    def test_stream_sends_current_snapshot_first(self, client):
+        """The stream starts with a retry hint and the current credentials."""
+        response, chunks = self._open_stream(client)
+        try:
+            assert response.mimetype == 'text/event-stream'
+            assert next(chunks) == b'retry: 3000\n\n'
+            event = next(chunks).decode()
+            assert event.startswith('id: ')
+            assert 'event: credentials' in event
+            data = json.loads(event.split('data: ', 1)[1])
+            assert data['snapshot']['username'] == 'test-user'
+            assert data['age'] >= 0
+        finally:
+            response.close()
+
+    def test_stream_pushes_new_version_and_heartbeats(self, client, monkeypatch):
+        """A new snapshot is pushed to subscribers; idle periods send heartbeats."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        app_module.credential_poller = poller
+
+        response, chunks = self._open_stream(client)
+        try:
+            next(chunks)
+            assert b'svc-a' in next(chunks)
+            assert next(chunks) == b': heartbeat\n\n'
+            assert app_module.snapshot_updates.subscribers == 1
+
+            vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+            poller.refresh('ldap', 'dual-rotation-demo')
+            chunk = next(chunks)
+            while chunk == b': heartbeat\n\n':
+                chunk = next(chunks)
+            assert b'svc-b' in chunk
+        finally:
+            response.close()
+        assert app_module.snapshot_updates.subscribers == 0
+
+    def test_reconnect_with_current_last_event_id_skips_resend(self, client, monkeypatch):
+        """A client reconnecting with the current event ID only gets heartbeats."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+        revision = app_module._current_snapshot().revision
+        response, chunks = self._open_stream(client, headers={'Last-Event-ID': revision})
+        try:
+            next(chunks)
+            assert next(chunks) == b': heartbeat\n\n'
+        finally:
+            response.close()
+
+    def test_event_id_from_another_process_is_resent(self, client, monkeypatch):
+        """The same version number under another process's epoch does not count as seen."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+        snapshot = app_module._current_snapshot()
+        for last_event_id in (f'0000beef-{snapshot.version}', str(snapshot.version)):
+            response, chunks = self._open_stream(client, headers={'Last-Event-ID': last_event_id})
+            try:
+                next(chunks)
+                assert next(chunks).startswith(b'id: %s\n' % snapshot.revision.encode())
+            finally:
+                response.close()
+
+
+class TestLongPoll:
+    """Tests for /api/credentials?wait_version= long-polling."""
+
+    @pytest.fixture
+    def poller(self, client, monkeypatch):
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        monkeypatch.setattr(app_module, 'credential_poller', poller)
+        return poller, vault
+
+    def test_returns_immediately_for_another_revision(self, client):
+        """A wait_version other than the current revision is answered without waiting."""
+        body = client.get('/api/credentials').get_json()
+        version, revision = body['version'], body['revision']
+        # An older version here, the same version from another process, or a bare version number
+        for other in (f'{revision.split("-")[0]}-{version - 1}', f'0000beef-{version}', str(version)):
+            started = time.monotonic()
+            response = client.get(f'/api/credentials?wait_version={other}&timeout=5')
+            assert response.status_code == 200
+            assert response.get_json()['revision'] == revision
+            assert time.monotonic() - started < 1
+
+    def test_times_out_with_304(self, client):
+        """With no new version before the timeout the response is a 304 carrying the current ETag."""
+        first = client.get('/api/credentials')
+        version = first.get_json()['revision']
+        started = time.monotonic()
+        response = client.get(f'/api/credentials?wait_version={version}&timeout=0.2')
+        assert response.status_code == 304
+        assert time.monotonic() - started >= 0.2
+        assert response.headers['ETag'] == first.headers['ETag']
+
+    def test_timeout_is_capped(self, client, monkeypatch):
+        """Requested timeouts are capped at LONG_POLL_MAX_TIMEOUT."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'LONG_POLL_MAX_TIMEOUT', 0.05)
+        version = client.get('/api/credentials').get_json()['revision']
+        started = time.monotonic()
+        assert client.get(f'/api/credentials?wait_version={version}&timeout=600').status_code == 304
+        assert time.monotonic() - started < 2
+
+    @pytest.mark.parametrize('query', ['wait_version=', 'wait_version=1&timeout=-1', 'wait_version=1&timeout=nan'])
+    def test_rejects_malformed_arguments(self, client, query):
+        """An empty wait_version or a negative/NaN timeout is a 400."""
+        assert client.get(f'/api/credentials?{query}').status_code == 400
+
+    def test_wakes_when_a_new_version_is_published(self, client, poller):
+        """A parked request returns the new snapshot as soon as the poller publishes it."""
+        import app as app_module
+        credential_poller, vault = poller
+        version = client.get('/api/credentials').get_json()['revision']
+        result = {}
+
+        def long_poll():
+            started = time.monotonic()
+            # Test clients keep request context per thread, so use a fresh one here
+            with app_module.app.test_client() as thread_client:
+                result['response'] = thread_client.get(f'/api/credentials?wait_version={version}&timeout=5')
+            result['elapsed'] = time.monotonic() - started
+
+        thread = threading.Thread(target=long_poll)
+        thread.start()
+        time.sleep(0.1)
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+        credential_poller.refresh('ldap', 'dual-rotation-demo')
+        thread.join(5)
+        assert result['response'].status_code == 200
+        assert result['response'].get_json()['username'] == 'svc-b'
+        assert result['elapsed'] < 2
+
+    def test_parked_long_polls_are_counted(self, client, poller):
+        """Waiting long-polls show up in credential_long_poll_connections until they return."""
+        import app as app_module
+        credential_poller, vault = poller
+        version = client.get('/api/credentials').get_json()['revision']
+        result = {}
+
+        def long_poll():
+            with app_module.app.test_client() as thread_client:
+                result['response'] = thread_client.get(f'/api/credentials?wait_version={version}&timeout=5')
+
+        thread = threading.Thread(target=long_poll)
+        thread.start()
+        assert _wait_for(lambda: app_module.snapshot_updates.long_polls == 1)
+        assert 'credential_long_poll_connections 1' in client.get('/metrics').data.decode()
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+        credential_poller.refresh('ldap', 'dual-rotation-demo')
+        thread.join(5)
+        assert result['response'].status_code == 200
+        assert app_module.snapshot_updates.long_polls == 0
+        assert app_module.snapshot_updates.subscribers == 0
+
+    def test_role_endpoint_long_polls(self, client, poller):
+        """Per-role endpoints accept the same wait_version/timeout arguments."""
+        version = client.get('/api/credentials/ldap/dual-rotation-demo').get_json()['revision']
+        response = client.get(f'/api/credentials/ldap/dual-rotation-demo?wait_version={version}&timeout=0.05')
+        assert response.status_code == 304
+
+    def test_asgi_long_poll_wakes_on_publish(self, client, poller):
+        """In ASGI mode the long-poll parks on the event loop and wakes on publish."""
+        import app as app_module
+        credential_poller, vault = poller
+        version = credential_poller.get_snapshot('ldap', 'dual-rotation-demo').revision
+
+        async def scenario():
+            request = asyncio.ensure_future(_asgi_request(
+                app_module.asgi_app, f'/api/credentials?wait_version={version}&timeout=5'))
+            await asyncio.sleep(0.1)
+            vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+            await asyncio.to_thread(credential_poller.refresh, 'ldap', 'dual-rotation-demo')
+            return await asyncio.wait_for(request, 2)
+
+        status, _, body = asyncio.run(scenario())
+        assert status == 200
+        assert json.loads(body)['username'] == 'svc-b'
+
+        revision = credential_poller.get_snapshot('ldap', 'dual-rotation-demo').revision
+        status, _, body = asyncio.run(_asgi_request(
+            app_module.asgi_app, f'/api/credentials?wait_version={revision}&timeout=0.05'))
+        assert status == 304
+        assert body == b''
+
+    def test_asgi_role_long_poll_is_served_natively(self, client, poller, monkeypatch):
+        """Per-role long-polls park on the event loop too, never on a WSGI bridge thread."""
+        import app as app_module
+        credential_poller, vault = poller
+        path = '/api/credentials/ldap/dual-rotation-demo'
+        version = credential_poller.get_snapshot('ldap', 'dual-rotation-demo').revision
+
+        async def no_fallback(scope, receive, send):
+            raise AssertionError(f"{scope['path']} went through the WSGI bridge")
+
+        monkeypatch.setattr(app_module, '_asgi_wsgi_fallback', no_fallback)
+
+        async def scenario():
+            request = asyncio.ensure_future(_asgi_request(
+                app_module.asgi_app, f'{path}?wait_version={version}&timeout=5'))
+            await asyncio.sleep(0.1)
+            parked = app_module.snapshot_updates.long_polls
+            vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+            await asyncio.to_thread(credential_poller.refresh, 'ldap', 'dual-rotation-demo')
+            return parked, await asyncio.wait_for(request, 2)
+
+        parked, (status, _, body) = asyncio.run(scenario())
+        assert parked == 1
+        assert status == 200
+        assert json.loads(body)['username'] == 'svc-b'
+        assert app_module.snapshot_updates.long_polls == 0
+
+        status, headers, body = asyncio.run(_asgi_request(app_module.asgi_app, path))
+        assert status == 200
+        assert headers['etag'] == client.get(path).headers['ETag']
+        status, _, _ = asyncio.run(_asgi_request(app_module.asgi_app, '/api/credentials/ldap/other'))
+        assert status == 404
+
+
+class TestSharedSnapshots:
+    """Tests for publishing snapshots from a leader to follower workers through the shared segment."""
+
+    @pytest.fixture
+    def leader(self, client, tmp_path):
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.register('ldap', 'other')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'other')
+        path = str(tmp_path / 'snapshots')
+
+        def collect():
+            # Publish what the leader's module-level poller would, without making it this worker's source
+            real, app_module.credential_poller = app_module.credential_poller, poller
+            try:
+                return app_module._shared_payload()
+            finally:
+                app_module.credential_poller = real
+
+        publisher = app_module.SnapshotPublisher(app_module.SnapshotSegment(path, size=65536, create=True), collect)
+        publisher.publish()
+        return publisher, poller, vault, path
+
+    def test_segment_round_trip(self, tmp_path):
+        """A payload published by the writer is read back whole through a separate mapping."""
+        import app as app_module
+        path = str(tmp_path / 'segment')
+        writer = app_module.SnapshotSegment(path, size=4096, create=True)
+        reader = app_module.SnapshotSegment(path)
+        assert reader.read() == (0, b'')
+        sequence = writer.publish(b'{"a":1}')
+        assert sequence == 2
+        assert reader.read() == (2, b'{"a":1}')
+        writer.publish(b'{}')
+        assert reader.read() == (4, b'{}')
+
+    def test_reader_waits_out_a_write_in_progress(self, tmp_path):
+        """While the sequence is odd a reader retries instead of returning a torn payload."""
+        import app as app_module
+        path = str(tmp_path / 'segment')
+        writer = app_module.SnapshotSegment(path, size=4096, create=True)
+        writer.publish(b'first')
+        app_module.SnapshotSegment._SEQUENCE.pack_into(writer._mm, 8, 3)
+        reader = app_module.SnapshotSegment(path)
+        with pytest.raises(TimeoutError):
+            reader.read(attempts=5)
+        app_module.SnapshotSegment._SEQUENCE.pack_into(writer._mm, 8, 4)
+        assert reader.read() == (4, b'first')
+
+    def test_reader_rejects_a_payload_that_fails_its_checksum(self, tmp_path):
+        """An even sequence over payload bytes that do not match the checksum is treated as torn."""
+        import app as app_module
+        path = str(tmp_path / 'segment')
+        writer = app_module.SnapshotSegment(path, size=4096, create=True)
+        writer.publish(b'{"a":1}')
+        header = app_module.SnapshotSegment._HEADER.size
+        writer._mm[header:header + 1] = b'['
+        reader = app_module.SnapshotSegment(path)
+        with pytest.raises(TimeoutError):
+            reader.read(attempts=5)
+        writer._mm[header:header + 1] = b'{'
+        assert reader.read() == (2, b'{"a":1}')
+
+    def test_restarted_leader_discards_a_torn_write(self, tmp_path):
+        """A leader reopening a segment left mid-write clears the payload and keeps counting."""
+        import app as app_module
+        path = str(tmp_path / 'segment')
+        writer = app_module.SnapshotSegment(path, size=4096, create=True)
+        writer.publish(b'first')
+        app_module.SnapshotSegment._SEQUENCE.pack_into(writer._mm, 8, 3)
+        restarted = app_module.SnapshotSegment(path, size=4096, create=True)
+        assert restarted.read() == (4, b'')
+        assert restarted.publish(b'second') == 6
+
+    def test_rejects_oversized_payload_and_foreign_files(self, tmp_path):
+        """A payload larger than the segment and a file without the magic are errors."""
+        import app as app_module
+        path = str(tmp_path / 'segment')
+        writer = app_module.SnapshotSegment(path, size=64, create=True)
+        with pytest.raises(ValueError):
+            writer.publish(b'x' * 64)
+        assert writer.sequence == 0
+        foreign = tmp_path / 'foreign'
+        foreign.write_bytes(b'\0' * 64)
+        with pytest.raises(ValueError):
+            app_module.SnapshotSegment(str(foreign))
+
+    def test_follower_keeps_the_leaders_versions(self, leader):
+        """Followers serve the leader's snapshots with the same versions, decoded once per publish."""
+        import app as app_module
+        publisher, poller, vault, path = leader
+        follower = app_module.SharedSnapshots(path)
+        default = follower.get()
+        assert default == poller.get_snapshot('ldap', 'dual-rotation-demo')
+        assert default.revision == poller.get_snapshot('ldap', 'dual-rotation-demo').revision
+        assert sorted(follower.roles()) == [('ldap', 'dual-rotation-demo'), ('ldap', 'other')]
+        assert follower.get_role('ldap', 'other').username == 'svc-a'
+        assert follower.get_role('ldap', 'missing') is None
+
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 60}
+        poller.refresh('ldap', 'other')
+        publisher.publish()
+        assert follower.get_role('ldap', 'other').username == 'svc-b'
+        # Unchanged snapshots keep their identity across publishes
+        assert follower.get() is default
+
+    def test_follower_keeps_serving_through_a_stuck_write(self, leader):
+        """If the segment stays mid-write, the follower serves its last good decode instead of failing."""
+        import app as app_module
+        publisher, poller, vault, path = leader
+        follower = app_module.SharedSnapshots(path)
+        default = follower.get()
+        segment = publisher._segment
+        app_module.SnapshotSegment._SEQUENCE.pack_into(segment._mm, 8, segment.sequence + 1)
+        assert follower.get() is default
+        assert follower.get_role('ldap', 'other').username == 'svc-a'
+
+    def test_follower_reports_leader_staleness(self, leader):
+        """A role whose Vault reads fail on the leader is stale on the follower too."""
+        import app as app_module
+        publisher, poller, vault, path = leader
+        follower = app_module.SharedSnapshots(path)
+        assert follower.stale_age('ldap', 'other') is None
+        vault.read_static_creds.return_value = None
+        poller.refresh('ldap', 'other')
+        publisher.publish()
+        assert follower.stale_age('ldap', 'other') == 0
+        assert follower.stale_age('ldap', 'dual-rotation-demo') is None
+
+    def test_follower_before_the_leader_starts(self, tmp_path):
+        """Until the segment exists a follower has nothing to serve rather than failing."""
+        import app as app_module
+        follower = app_module.SharedSnapshots(str(tmp_path / 'missing'))
+        assert follower.get() is None
+        assert follower.roles() == []
+
+    def test_routes_serve_the_shared_snapshots(self, client, leader, monkeypatch):
+        """On a follower, /api/credentials and the role endpoints answer from the leader's publish."""
+        import app as app_module
+        publisher, poller, vault, path = leader
+        monkeypatch.setattr(app_module, 'shared_snapshots', app_module.SharedSnapshots(path))
+        response = client.get('/api/credentials')
+        assert response.get_json()['username'] == 'svc-a'
+        assert response.get_json()['version'] == poller.get_snapshot('ldap', 'dual-rotation-demo').version
+        assert client.get('/api/credentials/ldap/other').get_json()['username'] == 'svc-a'
+        assert client.get('/api/credentials/ldap/missing').status_code == 404
+        assert set(client.get('/api/credentials?roles=*').get_json()['roles']) == {
+            'ldap/dual-rotation-demo', 'ldap/other'}
+
+    def test_watcher_wakes_streams_on_publish(self, client, leader):
+        """The follower's watcher notifies snapshot_updates when the leader publishes."""
+        import app as app_module
+        publisher, poller, vault, path = leader
+        follower = app_module.SharedSnapshots(path, poll_interval=0.01)
+        follower.start()
+        try:
+            assert _wait_for(lambda: follower._state[0] is not None)
+            generation = app_module.snapshot_updates.generation
+            vault.read_static_creds.return_value = {'username': 'svc-c', 'ttl': 60}
+            poller.refresh('ldap', 'other')
+            publisher.publish()
+            assert app_module.snapshot_updates.wait(generation, 2) != generation
+        finally:
+            follower.stop()
+
+    def test_follower_mode_starts_no_refreshers(self, monkeypatch, tmp_path):
+        """SNAPSHOT_SHARING=follower skips the file watcher and Vault client."""
+        import importlib
+        import app as app_module
+        monkeypatch.setenv('SECRET_DELIVERY_METHOD', 'vault-agent-sidecar')
+        monkeypatch.setenv('VAULT_AGENT_CREDS_FILE', str(tmp_path / 'ldap-creds'))
+        monkeypatch.setenv('SNAPSHOT_SHARING', 'follower')
+        monkeypatch.setenv('SHARED_SNAPSHOT_PATH', str(tmp_path / 'snapshots'))
+        importlib.reload(app_module)
+        try:
+            assert app_module.file_cred_cache is None
+            assert app_module.vault_client is None
+            assert app_module.shared_snapshots is not None
+        finally:
+            app_module.shared_snapshots.stop()
+            monkeypatch.undo()
+            importlib.reload(app_module)
+
+
+def _asgi_scope(path, headers=()):
+    """Build a minimal ASGI HTTP scope for a GET request."""
+    path, _, query = path.partition('?')
+    return {'type': 'http', 'method': 'GET', 'path': path, 'raw_path': path.encode(),
+            'query_string': query.encode(), 'root_path': '', 'scheme': 'http', 'http_version': '1.1',
+            'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+
+
+async def _asgi_request(asgi_app, path, headers=()):
+    """Run one non-streaming request through an ASGI app; return (status, headers, body)."""
+    messages = []
+    requests = [{'type': 'http.request', 'body': b'', 'more_body': False}]
+
+    async def receive():
+        if requests:
+            return requests.pop()
+        # Like a connected client: nothing more until it disconnects
+        await asyncio.Future()
+
+    async def send(message):
+        messages.append(message)
+
+    await asgi_app(_asgi_scope(path, headers), receive, send)
+    start = messages[0]
+    body = b''.join(m.get('body', b'') for m in messages[1:])
+    return start['status'], {k.decode(): v.decode() for k, v in start['headers']}, body
+
+
+class TestAsgiServerMode:
+    """Tests for the asyncio (ASGI) serving mode."""
+
+    def test_api_credentials_matches_flask_view(self, client):
+        """The async /api/credentials serves the same bytes and ETag as the Flask view."""
+        import asyncio
+        import app as app_module
+        flask_response = client.get('/api/credentials')
+        status, headers, body = asyncio.run(_asgi_request(app_module.asgi_app, '/api/credentials'))
+        assert status == 200
+        assert body == flask_response.data
+        assert headers['etag'] == flask_response.headers['ETag']
+        assert 'age' in headers
+
+        status, _, body = asyncio.run(_asgi_request(
+            app_module.asgi_app, '/api/credentials', [('If-None-Match', headers['etag'])]))
+        assert status == 304
+        assert body == b''
+
+    def test_health_is_served_natively(self, client):
+        """The async /health returns the healthy status."""
+        import asyncio
+        import app as app_module
+        status, _, body = asyncio.run(_asgi_request(app_module.asgi_app, '/health'))
+        assert status == 200
+        assert json.loads(body)['status'] == 'healthy'
+
+    def test_other_routes_fall_back_to_flask(self, client):
+        """Routes without a native handler are served by the Flask app."""
+        import asyncio
+        import app as app_module
+        status, headers, body = asyncio.run(_asgi_request(app_module.asgi_app, '/'))
+        assert status == 200
+        assert headers['content-type'].startswith('text/html')
+        assert b'test-user' in body
+
+    def test_fallback_serves_repeated_requests_on_keep_alive(self, client):
+        """Under uvicorn, one keep-alive connection can make any number of Flask-served requests."""
+        import uvicorn
+        import app as app_module
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app_module.asgi_app, host='127.0.0.1', port=port,
+                                               lifespan='off', log_level='error'))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        try:
+            assert _wait_for(lambda: server.started, timeout=5)
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=5)
+            statuses = []
+            for _ in range(3):
+                conn.request('GET', '/')
+                response = conn.getresponse()
+                response.read()
+                statuses.append(response.status)
+            conn.close()
+        finally:
+            server.should_exit = True
+            thread.join(5)
+        assert statuses == [200, 200, 200]
+
+    def test_fallback_serves_concurrent_requests(self, client):
+        """Concurrent fallback requests are each served by their own Flask call."""
+        import app as app_module
+
+        async def scenario():
+            return await asyncio.gather(*(
+                _asgi_request(app_module.asgi_app, path) for path in ('/', '/missing?probe=1', '/')))
+
+        (first, _, first_body), (missing, _, _), (second, _, _) = asyncio.run(scenario())
+        assert (first, missing, second) == (200, 404, 200)
+        assert b'test-user' in first_body
+
+    def test_wait_async_wakes_on_notify_from_thread(self):
+        """A coroutine waiter is woken by notify() from a worker thread."""
+        import asyncio
+        import app as app_module
+        broadcaster = app_module.SnapshotBroadcaster()
+
+        async def scenario():
+            threading.Timer(0.05, broadcaster.notify).start()
+            return await broadcaster.wait_async(0, timeout=5)
+
+        started = time.monotonic()
+        assert asyncio.run(scenario()) == 1
+        assert time.monotonic() - started < 2
+
+    def test_stream_pushes_versions_and_cleans_up_on_disconnect(self, client, monkeypatch):
+        """The async stream pushes new versions and unsubscribes when the client leaves."""
+        import asyncio
+        import app as app_module
+        monkeypatch.setattr(app_module, 'SSE_HEARTBEAT_INTERVAL', 0.05)
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        app_module.credential_poller = poller
+
+        async def scenario():
+            sent = asyncio.Queue()
+            disconnect = asyncio.Event()
+
+            async def receive():
+                await disconnect.wait()
+                return {'type': 'http.disconnect'}
+
+            task = asyncio.ensure_future(app_module.asgi_app(
+                _asgi_scope('/api/credentials/stream'), receive, sent.put))
+            start = await sent.get()
+            bodies = [(await sent.get())['body'], (await sent.get())['body']]
+            subscribers = app_module.snapshot_updates.subscribers
+
+            vault.read_static_creds.return_value = {'username': 'svc-b', 'ttl': 300}
+            await asyncio.to_thread(poller.refresh, 'ldap', 'dual-rotation-demo')
+            body = (await asyncio.wait_for(sent.get(), 2))['body']
+            while body == b': heartbeat\n\n':
+                body = (await asyncio.wait_for(sent.get(), 2))['body']
+            bodies.append(body)
+
+            disconnect.set()
+            await asyncio.wait_for(task, 2)
+            return start, bodies, subscribers
+
+        start, bodies, subscribers = asyncio.run(scenario())
+        assert start['status'] == 200
+        assert (b'content-type', b'text/event-stream') in start['headers']
+        assert bodies[0] == b'retry: 3000\n\n'
+        assert b'svc-a' in bodies[1]
+        assert b'svc-b' in bodies[2]
+        assert subscribers == 1
+        assert app_module.snapshot_updates.subscribers == 0
+
+
+class TestResponseCompression:
+    """Tests for gzip/Brotli content negotiation and the compressed-body cache."""
+
+    def test_static_asset_compressed_once(self, client, monkeypatch):
+        """Static assets are compressed on first request with static settings, then served from the pinned cache."""
+        import brotli
+        import app as app_module
+        app_module.start_background_workers()
+        calls = []
+        real_compress = app_module.compress_body
+
+        def compress(body, encoding, static=False):
+            calls.append(static)
+            return real_compress(body, encoding, static)
+
+        monkeypatch.setattr(app_module, 'compress_body', compress)
+        response = client.get(app_module.DUAL_ACCOUNT_CSS_URL, headers={'Accept-Encoding': 'gzip, br'})
+        assert client.get(app_module.DUAL_ACCOUNT_CSS_URL, headers={'Accept-Encoding': 'gzip, br'}).data == response.data
+        assert calls == [True]
+        assert response.headers['Content-Encoding'] == 'br'
+        assert 'Accept-Encoding' in response.headers['Vary']
+        assert brotli.decompress(response.data).decode() == app_module.DUAL_ACCOUNT_CSS
+        assert response.headers['ETag'].startswith('W/')
+
+        revalidated = client.get(app_module.DUAL_ACCOUNT_CSS_URL, headers={
+            'Accept-Encoding': 'gzip, br', 'If-None-Match': response.headers['ETag']})
+        assert revalidated.status_code == 304
+
+    def test_gzip_when_brotli_not_accepted(self, client):
+        """Clients that only accept gzip get gzip."""
+        import gzip
+        import app as app_module
+        response = client.get(app_module.DUAL_ACCOUNT_JS_URL, headers={'Accept-Encoding': 'gzip'})
+        assert response.headers['Content-Encoding'] == 'gzip'
+        assert gzip.decompress(response.data).decode() == app_module.DUAL_ACCOUNT_JS
+
+    def test_identity_without_accept_encoding(self, client):
+        """Without Accept-Encoding the body is sent as-is."""
+        response = client.get('/')
+        assert 'Content-Encoding' not in response.headers
+        assert b'<!DOCTYPE html>' in response.data
+
+    def test_small_json_is_not_compressed(self, client):
+        """Bodies below COMPRESSION_MIN_SIZE skip compression."""
+        response = client.get('/api/credentials', headers={'Accept-Encoding': 'gzip'})
+        assert len(response.data) < 512
+        assert 'Content-Encoding' not in response.headers
+
+    def test_dynamic_json_compressed_once_per_version(self, client, monkeypatch):
+        """Cached /api/credentials bodies are compressed on the first hit only."""
+        import gzip
+        import app as app_module
+        monkeypatch.setattr(app_module, 'COMPRESSION_MIN_SIZE', 0)
+        app_module.start_background_workers()
+        calls = []
+        real_compress = app_module.compress_body
+
+        def counting_compress(body, encoding, static=False):
+            calls.append(encoding)
+            return real_compress(body, encoding, static)
+
+        monkeypatch.setattr(app_module, 'compress_body', counting_compress)
+        first = client.get('/api/credentials', headers={'Accept-Encoding': 'gzip'})
+        second = client.get('/api/credentials', headers={'Accept-Encoding': 'gzip'})
+        assert first.headers['Content-Encoding'] == 'gzip'
+        assert json.loads(gzip.decompress(second.data))['username'] == 'test-user'
+        assert calls == ['gzip']
+
+    def test_asgi_api_credentials_negotiates_encoding(self, client, monkeypatch):
+        """The async /api/credentials handler uses the same negotiation and cache."""
+        import asyncio
+        import brotli
+        import app as app_module
+        monkeypatch.setattr(app_module, 'COMPRESSION_MIN_SIZE', 0)
+        status, headers, body = asyncio.run(_asgi_request(
+            app_module.asgi_app, '/api/credentials', [('Accept-Encoding', 'br;q=0.5, gzip;q=0.1')]))
+        assert status == 200
+        assert headers['content-encoding'] == 'br'
+        assert json.loads(brotli.decompress(body))['username'] == 'test-user'
+
+    def test_304_carries_the_etag_of_the_compressed_200(self, client, monkeypatch):
+        """A revalidation answers with the same weak/strong validator the 200 for that encoding had."""
+        import asyncio
+        import app as app_module
+        monkeypatch.setattr(app_module, 'COMPRESSION_MIN_SIZE', 0)
+        for url in ('/api/credentials', app_module.DUAL_ACCOUNT_CSS_URL):
+            for accept in ('gzip', 'identity'):
+                sent = client.get(url, headers={'Accept-Encoding': accept})
+                revalidated = client.get(url, headers={'Accept-Encoding': accept,
+                                                       'If-None-Match': sent.headers['ETag']})
+                assert revalidated.status_code == 304
+                assert revalidated.headers['ETag'] == sent.headers['ETag']
+                assert sent.headers['ETag'].startswith('W/') == (accept == 'gzip')
+
+        _, sent, _ = asyncio.run(_asgi_request(app_module.asgi_app, '/api/credentials', [('Accept-Encoding', 'gzip')]))
+        status, revalidated, _ = asyncio.run(_asgi_request(app_module.asgi_app, '/api/credentials', [
+            ('Accept-Encoding', 'gzip'), ('If-None-Match', sent['etag'])]))
+        assert status == 304
+        assert revalidated['etag'] == sent['etag']
+        assert sent['etag'].startswith('W/')
+
+
+class TestRoleRegistry:
+    """Tests for the multi-role credential registry and its endpoints."""
+
+    def _registry(self, *roles):
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.side_effect = lambda mount, role: {
+            'username': f'{mount}-{role}-user', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        for mount, role in roles:
+            poller.register(mount, role)
+            poller.refresh(mount, role)
+        app_module.credential_poller = poller
+        return poller
+
+    def test_parse_role_key(self):
+        """'mount/role' splits on the last slash so nested mounts work."""
+        from app import parse_role_key
+        assert parse_role_key('ldap/demo') == ('ldap', 'demo')
+        assert parse_role_key('team-a/ldap/demo') == ('team-a/ldap', 'demo')
+        with pytest.raises(ValueError):
+            parse_role_key('demo')
+
+    def test_load_role_registry_from_env_and_file(self, monkeypatch, tmp_path):
+        """Roles come from VAULT_ROLES and VAULT_ROLES_FILE, plus the dashboard role."""
+        from app import load_role_registry
+        roles_file = tmp_path / "roles.json"
+        roles_file.write_text(json.dumps(['ldap/b', {'mount': 'ad', 'role': 'c'}]))
+        monkeypatch.setenv('LDAP_MOUNT_PATH', 'ldap')
+        monkeypatch.setenv('LDAP_STATIC_ROLE_NAME', 'demo')
+        monkeypatch.setenv('VAULT_ROLES', 'ldap/a, ldap/b')
+        monkeypatch.setenv('VAULT_ROLES_FILE', str(roles_file))
+        assert load_role_registry() == [('ldap', 'demo'), ('ldap', 'a'), ('ldap', 'b'), ('ad', 'c')]
+
+    def test_due_roles_refresh_concurrently(self):
+        """Roles that fall due together are read in parallel by the worker pool."""
+        from app import CredentialPoller
+        barrier = threading.Barrier(3, timeout=5)
+        vault = _batching_vault()
+
+        def read(mount, role):
+            # Only returns if all three reads are in flight at once
+            barrier.wait()
+            return {'username': role, 'ttl': 600}
+
+        vault.read_static_creds.side_effect = read
+        poller = CredentialPoller(vault, workers=3)
+        for role in ('a', 'b', 'c'):
+            poller.register('ldap', role)
+        poller.start()
+        try:
+            for role in ('a', 'b', 'c'):
+                assert poller.wait_for_snapshot('ldap', role, timeout=5).username == role
+        finally:
+            poller.stop()
+
+    def test_due_roles_share_one_vault_batch(self, vault_hvac):
+        """The loop reads due roles with one batch; a failing role is flagged stale without holding up the rest."""
+        from app import CredentialPoller, VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        hvac_client = vault_hvac.Client.return_value
+
+        def read(path):
+            if path.endswith('/broken'):
+                raise vault_hvac.exceptions.InvalidPath("no such role")
+            return {'data': {'username': path.rsplit('/', 1)[1], 'ttl': 600}}
+
+        hvac_client.read.side_effect = read
+        poller = CredentialPoller(client, retry_interval=60)
+        for role in ('a', 'b', 'broken'):
+            poller.register('ldap', role)
+        poller.start()
+        try:
+            for role in ('a', 'b'):
+                assert poller.wait_for_snapshot('ldap', role, timeout=5).username == role
+            assert _wait_for(lambda: ('ldap', 'broken') in poller._failing)
+            assert poller.get_snapshot('ldap', 'broken') is None
+        finally:
+            poller.stop()
+            client.stop()
+        assert hvac_client.auth.kubernetes.login.call_count == 1
+
+    def test_role_endpoint_serves_registry_snapshot(self, client):
+        """/api/credentials/<mount>/<role> serves that role, with an ETag."""
+        self._registry(('ldap', 'a'), ('team/ldap', 'b'))
+        response = client.get('/api/credentials/team/ldap/b')
+        assert response.status_code == 200
+        assert response.get_json()['username'] == 'team/ldap-b-user'
+        assert response.headers['ETag']
+        assert client.get('/api/credentials/ldap/a').get_json()['username'] == 'ldap-a-user'
+
+    def test_role_endpoint_unknown_role(self, client):
+        """Roles outside the registry return 404."""
+        self._registry(('ldap', 'a'))
+        assert client.get('/api/credentials/ldap/other').status_code == 404
+
+    def test_role_endpoint_without_vault(self, client):
+        """Without a Vault client the registry endpoints return 503."""
+        assert client.get('/api/credentials/ldap/a').status_code == 503
+        assert client.get('/api/credentials?roles=ldap/a').status_code == 503
+
+    def test_bulk_endpoint(self, client):
+        """?roles= returns each requested role and lists the unknown ones."""
+        self._registry(('ldap', 'a'), ('ldap', 'b'))
+        data = client.get('/api/credentials?roles=ldap/a,ldap/b,ldap/zzz').get_json()
+        assert data['roles']['ldap/a']['snapshot']['username'] == 'ldap-a-user'
+        assert data['roles']['ldap/b']['age'] >= 0
+        assert data['missing'] == ['ldap/zzz']
+
+        everything = client.get('/api/credentials?roles=*').get_json()
+        assert sorted(everything['roles']) == ['ldap/a', 'ldap/b']
+        assert client.get('/api/credentials?roles=nomount').status_code == 400
+
+    def test_bulk_endpoint_shares_one_wait_across_cold_roles(self, client, monkeypatch):
+        """Roles not read yet share one VAULT_POLL_INITIAL_WAIT instead of waiting one each."""
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_POLL_INITIAL_WAIT', 0.2)
+        poller = app_module.CredentialPoller(MagicMock())
+        for name in 'abcde':
+            poller.register('ldap', name)
+        monkeypatch.setattr(app_module, 'credential_poller', poller)
+
+        started = time.monotonic()
+        data = client.get('/api/credentials?roles=*').get_json()
+        assert time.monotonic() - started < 0.5
+        assert data['missing'] == [f'ldap/{name}' for name in 'abcde']
+
+
+class TestMetrics:
+    """Tests for the /metrics endpoint and the sharded metric types."""
+
+    def test_metrics_endpoint_reports_route_latency(self, client):
+        """Requests are recorded in a per-route latency histogram."""
+        client.get('/api/credentials')
+        client.get('/api/credentials')
+        response = client.get('/metrics')
+        assert response.status_code == 200
+        assert response.mimetype == 'text/plain'
+        text = response.data.decode()
+        assert '# TYPE http_request_duration_seconds histogram' in text
+        assert 'http_request_duration_seconds_count{route="/api/credentials",method="GET"} 2' in text
+        assert 'http_request_duration_seconds_bucket{route="/api/credentials",method="GET",le="+Inf"} 2' in text
+
+    def test_histogram_merges_thread_shards(self):
+        """Observations from many threads add up across the striped shards."""
+        from app import Histogram
+        histogram = Histogram('test_seconds', 'Test.', ('op',), buckets=(0.1, 1))
+
+        def work():
+            for _ in range(100):
+                histogram.observe(0.05, ('read',))
+            histogram.observe(5, ('read',))
+
+        threads = [threading.Thread(target=work) for _ in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        samples = {(name, labels): value for name, labels, value in histogram.samples()}
+        assert samples[('test_seconds_bucket', (('op', 'read'), ('le', '0.1')))] == 1000
+        assert samples[('test_seconds_bucket', (('op', 'read'), ('le', '+Inf')))] == 1010
+        assert samples[('test_seconds_sum', (('op', 'read'),))] == pytest.approx(100)
+
+    def test_short_lived_threads_share_a_fixed_set_of_shards(self):
+        """Per-request threads write into the fixed striped shards; nothing is kept per thread."""
+        from app import Counter
+        counter = Counter('test_events', 'Test.')
+        for _ in range(20):
+            threads = [threading.Thread(target=counter.inc) for _ in range(100)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+
+        assert len(counter._stripes) == Counter.STRIPES
+        assert sum(len(values) for _, values in counter._stripes) <= Counter.STRIPES
+        assert counter._collect() == {(): 2000}
+
+    def test_vault_calls_are_timed_by_operation(self, vault_hvac):
+        """Vault login/read latency and read errors are recorded per operation."""
+        import app as app_module
+        client = app_module.VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        hvac_client = vault_hvac.Client.return_value
+        hvac_client.read.side_effect = [{'data': {'username': 'svc-a'}}, ConnectionError('down')]
+        client.read_static_creds('ldap', 'demo')
+        client.read_static_creds('ldap', 'demo')
+
+        text = app_module.metrics.render()
+        assert 'vault_request_duration_seconds_count{operation="login"} 1' in text
+        assert 'vault_request_duration_seconds_count{operation="read"} 2' in text
+        assert 'vault_request_errors_total{operation="read"} 1' in text
+
+    def test_singleflight_stats_are_exported_as_counters(self, vault_hvac, monkeypatch):
+        """Executed and coalesced Vault calls show up as counters on /metrics."""
+        import app as app_module
+        client = app_module.VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        vault_hvac.Client.return_value.read.return_value = {'data': {'username': 'svc-a'}}
+        client.read_static_creds('ldap', 'demo')
+        monkeypatch.setattr(app_module, 'vault_client', client)
+
+        text = app_module.metrics.render()
+        assert '# TYPE vault_singleflight_calls counter' in text
+        assert 'vault_singleflight_calls_total{operation="login",outcome="executed"} 1' in text
+        assert 'vault_singleflight_calls_total{operation="read",outcome="executed"} 1' in text
+        assert 'vault_singleflight_calls_total{operation="read",outcome="coalesced"} 0' in text
+
+    def test_snapshot_and_stream_gauges(self, client):
+        """Per-role snapshot version/age and the stream subscriber count are exported."""
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 60}
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'demo')
+        poller.refresh('ldap', 'demo')
+        app_module.credential_poller = poller
+        app_module.snapshot_updates.subscribe()
+        try:
+            text = client.get('/metrics').data.decode()
+        finally:
+            app_module.snapshot_updates.unsubscribe()
+
+        version = poller.get_snapshot('ldap', 'demo').version
+        assert f'credential_snapshot_version{{source="vault",role="ldap/demo"}} {version}' in text
+        assert 'credential_snapshot_age_seconds{source="vault",role="ldap/demo"}' in text
+        assert 'credential_snapshot_stale{role="ldap/demo"} 0' in text
+        assert 'credential_stream_connections 1' in text
+
+    def test_file_cache_refresh_metrics(self, client_agent):
+        """File cache reads record their duration and the number of files read."""
+        import app as app_module
+        before = app_module.FILE_READS._collect().get((), 0)
+        app_module.file_cred_cache._read_credentials()
+        assert app_module.FILE_READS._collect()[()] == before + 1
+        assert 'file_cache_refresh_duration_seconds_count' in app_module.metrics.render()
+
+
+class TestTracing:
+    """Tests for optional OpenTelemetry tracing."""
+
+    def test_disabled_tracing_is_a_no_op(self, client):
+        """With tracing off, traced() returns the function itself and no hooks or adapters are added."""
+        import app as app_module
+        from requests.adapters import HTTPAdapter
+
+        def fn():
+            return 1
+
+        assert app_module.tracer is None
+        assert app_module.traced('x')(fn) is fn
+        assert app_module.span('x') is app_module._NO_SPAN
+        assert type(app_module.build_vault_session().get_adapter('http://vault')) is HTTPAdapter
+        assert client.get('/debug/traces').status_code == 404
+
+    def test_otlp_without_exporter_package_disables_tracing(self, client, monkeypatch):
+        """OTEL_TRACES_EXPORTER=otlp without the OTLP exporter installed logs and runs untraced."""
+        pytest.importorskip('opentelemetry.sdk')
+        import app as app_module
+        monkeypatch.setitem(sys.modules, 'opentelemetry.exporter.otlp.proto.http.trace_exporter', None)
+        assert app_module._init_tracer('otlp') == (None, None)
+
+    def test_request_spans_recorded_in_ring_buffer(self, client_traced):
+        """A request produces a server span with the serialization span beneath it."""
+        response = client_traced.get('/api/credentials', headers={
+            'traceparent': '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01'})
+        assert response.status_code == 200
+
+        spans = client_traced.get('/debug/traces').get_json()['spans']
+        by_name = {s['name']: s for s in spans}
+        server = by_name['GET /api/credentials']
+        assert server['trace_id'] == '0af7651916cd43dd8448eb211c80319c'
+        assert server['parent_id'] == 'b7ad6b7169203331'
+        assert by_name['snapshot.serialize']['parent_id'] == server['span_id']
+
+    def test_vault_stages_are_nested_spans(self, client_traced, vault_hvac):
+        """A first read shows ensure_authenticated, login and the SA token read under it."""
+        import app as app_module
+        vault = app_module.VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        vault_hvac.Client.return_value.read.return_value = {'data': {'username': 'svc-a'}}
+        vault.read_static_creds('ldap', 'demo')
+
+        spans = {s['name']: s for s in app_module.trace_ring.spans()}
+        read = spans['vault.read_static_creds']
+        ensure = spans['vault.ensure_authenticated']
+        assert ensure['parent_id'] == read['span_id']
+        assert spans['vault.login']['parent_id'] == ensure['span_id']
+        assert spans['vault.read_sa_token']['parent_id'] == spans['vault.login']['span_id']
+
+    def test_outbound_vault_requests_carry_traceparent(self, client_traced, monkeypatch):
+        """The Vault session adapter injects W3C traceparent and records a client span."""
+        import requests
+        import app as app_module
+        from requests.adapters import HTTPAdapter
+        sent = {}
+
+        def fake_send(adapter, request, **kwargs):
+            sent.update(request.headers)
+            response = requests.Response()
+            response.status_code = 200
+            return response
+
+        monkeypatch.setattr(HTTPAdapter, 'send', fake_send)
+        session = app_module.build_vault_session()
+        with app_module.span('outer'):
+            session.get('http://vault:8200/v1/sys/health')
+
+        spans = {s['name']: s for s in app_module.trace_ring.spans()}
+        http_span = spans['vault.http GET']
+        assert http_span['attributes']['http.response.status_code'] == 200
+        assert sent['traceparent'].split('-')[1] == http_span['trace_id']
+        assert sent['traceparent'].split('-')[2] == http_span['span_id']
+
+
+class TestBenchmarkHarness:
+    """Tests for the fake Vault, load-test and microbenchmark helpers under benchmarks/."""
+
+    @pytest.fixture
+    def fake_vault(self):
+        from benchmarks.fake_vault import FakeVault
+        vault = FakeVault(rotation_period=60, seed=1).start()
+        yield vault
+        vault.stop()
+
+    def _call(self, vault, method, path, body=None):
+        host, port = vault._server.server_address[:2]
+        conn = http.client.HTTPConnection(host, port, timeout=5)
+        conn.request(method, path, body=json.dumps(body) if body else None)
+        response = conn.getresponse()
+        payload = json.loads(response.read())
+        conn.close()
+        return response.status, payload
+
+    def test_fake_vault_login_and_static_cred_read(self, fake_vault):
+        """Fake Vault answers Kubernetes login and static-cred reads in Vault's response shape."""
+        status, payload = self._call(fake_vault, 'POST', '/v1/auth/kubernetes/login', {'role': 'r', 'jwt': 't'})
+        assert status == 200
+        assert payload['auth']['client_token']
+        status, payload = self._call(fake_vault, 'GET', '/v1/ldap/static-cred/dual-rotation-demo')
+        assert status == 200
+        assert payload['data']['username'] == 'svc-dual-rotation-demo'
+        assert 0 < payload['data']['ttl'] <= 60
+        assert fake_vault.counts == {'login': 1, 'read': 1, 'renew': 0, 'errors': 0}
+
+    def test_fake_vault_injects_errors(self, fake_vault):
+        """A read error rate of 1 turns every static-cred read into a 503."""
+        from benchmarks.fake_vault import FaultConfig
+        fake_vault.faults['read'] = FaultConfig(error_rate=1.0)
+        status, _ = self._call(fake_vault, 'GET', '/v1/ldap/static-cred/demo')
+        assert status == 503
+        assert fake_vault.counts['errors'] == 1
+
+    @pytest.mark.parametrize('method', ['vault-agent-sidecar', 'vault-csi-driver'])
+    def test_fixtures_are_readable_by_file_cache(self, monkeypatch, tmp_path, method):
+        """Agent and CSI fixtures parse into the sample credentials through FileCredentialCache."""
+        from benchmarks.fixtures import SAMPLE_CREDENTIALS, write_agent_file, write_csi_tree
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_AGENT_CREDS_FILE', write_agent_file(str(tmp_path / 'ldap-creds')))
+        csi_dir = tmp_path / 'csi'
+        csi_dir.mkdir()
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', write_csi_tree(str(csi_dir), generation=1))
+        cache = app_module.FileCredentialCache(method)
+        cache._read_credentials()
+        assert cache.get_credentials() == SAMPLE_CREDENTIALS
+
+    def test_file_cache_readers_make_expected_syscalls(self, monkeypatch, tmp_path):
+        """Agent parses open one file; CSI ticks open only new files and skip unchanged ..data."""
+        from benchmarks.file_cache_bench import build_cases, count_syscalls
+        import app as app_module
+        monkeypatch.setattr(app_module, 'VAULT_AGENT_CREDS_FILE', app_module.VAULT_AGENT_CREDS_FILE)
+        monkeypatch.setattr(app_module, 'VAULT_CSI_SECRETS_DIR', app_module.VAULT_CSI_SECRETS_DIR)
+        counts = {(name, size): count_syscalls(fn)[:2]
+                  for name, size, fn in build_cases(app_module, str(tmp_path), (1000,), (50,), (20,))}
+        assert counts == {
+            ('agent', 1000): (1, 0),
+            ('agent_sections', 20): (1, 0),
+            ('csi_cold', 50): (50, 1),
+            ('csi_warm', 50): (0, 0),
+            ('csi_stat_only', 50): (0, 1),
+        }
+
+    def test_find_regressions_flags_slower_cases_and_extra_syscalls(self):
+        """The regression guard flags time beyond tolerance and any syscall increase."""
+        from benchmarks.file_cache_bench import find_regressions
+
+        def report(median, opens):
+            return {'results': [{'case': 'agent', 'size': 10, 'time_us': {'median': median},
+                                 'alloc_bytes': {'peak': 1000},
+                                 'syscalls': {'opens': opens, 'dir_scans': 0, 'reads': None}}]}
+
+        assert find_regressions(report(100, 1), report(120, 1)) == []
+        assert len(find_regressions(report(100, 1), report(130, 1))) == 1
+        assert find_regressions(report(100, 1), report(100, 2)) == ['agent/10: opens 1 -> 2']
+
+    def test_summarize_reports_nearest_rank_percentiles(self):
+        """Latency summary uses nearest-rank percentiles in milliseconds."""
+        from benchmarks.loadtest import summarize
+        summary = summarize([i / 1000 for i in range(1, 101)], errors=2, elapsed=2.0)
+        assert summary['requests'] == 100
+        assert summary['errors'] == 2
+        assert summary['rps'] == 50.0
+        assert summary['latency_ms']['p50'] == 50.0
+        assert summary['latency_ms']['p99'] == 99.0
+        assert summary['latency_ms']['max'] == 100.0
+
+    def test_startup_bench_measures_time_to_first_200(self):
+        """One cold start of app.py reports time-to-first-200 and the app's own startup phases."""
+        from benchmarks.startup_bench import find_regressions, measure_startup
+        result = measure_startup('vso', 'werkzeug', runs=1, vault_url=None)
+        assert result['time_to_first_200_ms']['median'] > 0
+        assert set(result['phases_ms']) == {'import', 'caches', 'workers'}
+        assert result['phases_ms']['import']['median'] < result['time_to_first_200_ms']['median']
+        slower = {**result, 'time_to_first_200_ms': {'median': result['time_to_first_200_ms']['median'] * 2}}
+        assert find_regressions({'results': [result]}, {'results': [result]}) == []
+        assert len(find_regressions({'results': [result]}, {'results': [slower]})) == 1
+
+
+class TestSingleFlight:
+    """Tests for single-flight coalescing of Vault logins and reads."""
+
+    def test_concurrent_calls_share_one_execution(self):
+        """Callers arriving while a call is in flight wait and share its result."""
+        from app import SingleFlight
+        flight = SingleFlight()
+        release = threading.Event()
+        calls = []
+
+        def slow():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+                   for _ in range(5)]
+        for t in threads:
+            t.start()
+        while flight.stats()['coalesced'] < 4:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert calls == [1]
+        assert results == ['result'] * 5
+        assert flight.stats() == {'executed': 1, 'coalesced': 4}
+
+    def test_errors_propagate_to_waiters_and_key_is_released(self):
+        """The leader's exception is re-raised and later calls run again."""
+        from app import SingleFlight
+        flight = SingleFlight()
+
+        def failing():
+            raise RuntimeError('boom')
+
+        with pytest.raises(RuntimeError):
+            flight.do('k', failing)
+        assert flight.do('k', lambda: 42) == 42
+        assert flight.stats()['executed'] == 2
+
+    def test_concurrent_cold_start_logs_in_once(self, vault_hvac):
+        """Many threads needing a token trigger a single Kubernetes login."""
+        from app import VaultClient
+        client = VaultClient(vault_addr="http://vault:8200", auth_role="test")
+        login = vault_hvac.Client.return_value.auth.kubernetes.login
+        release = threading.Event()
+        original = login.return_value
+        login.side_effect = lambda **kwargs: release.wait(5) and original
+
+        threads = [threading.Thread(target=client._ensure_authenticated) for _ in range(8)]
+        for t in threads:
+            t.start()
+        while client.coalescing_stats()['login']['coalesced'] < 7:
+            time.sleep(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        assert login.call_count == 1
+        assert client.coalescing_stats()['login'] == {'executed': 1, 'coalesced': 7}
+
+
+class TestCredentialPoller:
+    """Tests for the background CredentialPoller."""
+
+    def test_refresh_publishes_immutable_snapshot(self):
+        """refresh() stores a read-only snapshot of the Vault response."""
+        from app import CredentialPoller
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 40}
+        poller = CredentialPoller(vault)
+        poller.register('ldap', 'demo')
+
+        poller.refresh('ldap', 'demo')
+        snapshot = poller.get_snapshot('ldap', 'demo')
+
+        assert snapshot.username == 'svc-a'
+        with pytest.raises(dataclasses.FrozenInstanceError):
+            snapshot.username = 'changed'
+
+    def test_failed_refresh_keeps_last_snapshot(self):
+        """A failed Vault read keeps serving the previous snapshot."""
+        from app import CredentialPoller
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'ttl': 40}
+        poller = CredentialPoller(vault, retry_interval=5)
+        poller.refresh('ldap', 'demo')
+
+        vault.read_static_creds.return_value = None
+        assert poller.refresh('ldap', 'demo') == 5
+        assert poller.get_snapshot('ldap', 'demo').username == 'svc-a'
+
+    def test_next_interval_wakes_just_before_boundary(self):
+        """Refresh is scheduled boundary_lead seconds before the nearest rotation boundary."""
+        from app import CredentialPoller, CredentialSnapshot
+        poller = CredentialPoller(MagicMock(), min_interval=1, max_interval=300, boundary_lead=1)
+        now = 1_700_000_000
+
+        def interval(data):
+            snapshot = CredentialSnapshot.from_mapping(data, 'vault', now=now)
+            return poller._next_interval(('ldap', 'demo'), snapshot, True, now)
+
+        assert interval({'ttl': 10}) == 9
+        assert interval({'ttl': 120}) == 119
+        assert interval({'ttl': 3600}) == 300
+        assert interval({}) == 300
+        grace_end = datetime.fromtimestamp(now + 4, timezone.utc).isoformat()
+        assert interval({'ttl': 20, 'grace_period_end': grace_end}) == 3
+
+    def test_polls_tightly_across_boundary_then_backs_off(self):
+        """At the boundary the poller polls quickly, doubling until the new version appears."""
+        from app import CredentialPoller
+        vault = MagicMock()
+        poller = CredentialPoller(vault, boundary_lead=1, boundary_poll_interval=0.5, max_interval=300)
+
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'password': 'p1', 'ttl': 1}
+        assert poller.refresh('ldap', 'demo') == 0.5
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'password': 'p1', 'ttl': 0}
+        assert poller.refresh('ldap', 'demo') == 1
+        assert poller.refresh('ldap', 'demo') == 2
+
+        # Vault rotated: back to sleeping until just before the next boundary
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'password': 'p2', 'ttl': 300}
+        assert 298 <= poller.refresh('ldap', 'demo') <= 299
+
+    def test_refresh_schedule_pops_in_due_order(self):
+        """RefreshSchedule returns due keys earliest first and ignores superseded entries."""
+        from app import RefreshSchedule
+        schedule = RefreshSchedule()
+        schedule.set('a', 30)
+        schedule.set('b', 10)
+        schedule.set('c', 20)
+        schedule.set('a', 5)
+        schedule.add('b', 0)
+
+        assert schedule.next_due(default=99) == 5
+        assert schedule.pop_due(now=20) == ['a', 'b', 'c']
+        assert schedule.pop_due(now=100) == []
+        assert schedule.next_due(default=99) == 99
+        assert 'a' in schedule and len(schedule) == 3
+
+    def test_loop_refreshes_each_role_by_its_own_schedule(self):
+        """A role near its boundary is re-read while a far-off role is left alone."""
+        from app import CredentialPoller
+        vault = _batching_vault()
+        vault.read_static_creds.side_effect = lambda mount, role: {
+            'username': role, 'ttl': 0 if role == 'soon' else 3600}
+        poller = CredentialPoller(vault, boundary_poll_interval=0.05)
+        poller.register('ldap', 'soon')
+        poller.register('ldap', 'later')
+        poller.start()
+        try:
+            assert _wait_for(lambda: vault.read_static_creds.call_count >= 4, timeout=5)
+        finally:
+            poller.stop()
+        reads = [c.args[1] for c in vault.read_static_creds.call_args_list]
+        assert reads.count('later') == 1
+        assert reads.count('soon') >= 3
+
+    def test_unchanged_vault_data_keeps_version(self):
+        """Polling identical credentials does not publish a new version."""
+        from app import CredentialPoller
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'password': 'p1', 'ttl': 40}
+        poller = CredentialPoller(vault)
+        poller.refresh('ldap', 'demo')
+        first = poller.get_snapshot('ldap', 'demo')
+
+        vault.read_static_creds.return_value = {'username': 'svc-a', 'password': 'p1', 'ttl': 35}
+        poller.refresh('ldap', 'demo')
+        assert poller.get_snapshot('ldap', 'demo') is first
+
+        vault.read_static_creds.return_value = {'username': 'svc-b', 'password': 'p2', 'ttl': 300}
+        poller.refresh('ldap', 'demo')
+        assert poller.get_snapshot('ldap', 'demo').version > first.version
+
+    def test_api_serves_snapshot_without_vault_io(self, client):
+        """/api/credentials reads the poller snapshot instead of calling Vault."""
+        import app as app_module
+        vault = MagicMock()
+        vault.read_static_creds.return_value = {
+            'username': 'svc-a', 'password': 'pw', 'ttl': 60, 'active_account': 'b',
+        }
+        poller = app_module.CredentialPoller(vault)
+        poller.register('ldap', 'dual-rotation-demo')
+        poller.refresh('ldap', 'dual-rotation-demo')
+        app_module.credential_poller = poller
+
+        for _ in range(3):
+            data = client.get('/api/credentials').get_json()
+            assert data['username'] == 'svc-a'
+            assert data['active_account'] == 'b'
+            assert 0 < data['ttl'] <= 60
+        assert vault.read_static_creds.call_count == 1
+
+
 # ─── Fixtures ───────────────────────────────────────────────────────────────
 
+@pytest.fixture
+def vault_hvac(monkeypatch, tmp_path):
+    """Replace hvac with a mock whose logins succeed and whose Forbidden is a real exception."""
+    token_file = tmp_path / "token"
+    token_file.write_text("jwt")
+    monkeypatch.setenv('VAULT_SA_TOKEN_PATH', str(token_file))
+
+    fake_hvac = MagicMock()
+    fake_hvac.exceptions.Forbidden = type('Forbidden', (Exception,), {})
+    fake_hvac.exceptions.InvalidPath = type('InvalidPath', (Exception,), {})
+    fake_hvac.Client.return_value.auth.kubernetes.login.return_value = {
+        'auth': {'lease_duration': 600, 'renewable': True}}
+
+    import app as app_module
+    monkeypatch.setattr(app_module, 'hvac', fake_hvac)
+    return fake_hvac
+
+
 @pytest.fixture
 def client(monkeypatch, tmp_path):
     """Create Flask test client with default (VSO) delivery method."""
@@ -345,6 +2659,27 @@ def client(monkeypatch, tmp_path):
         yield test_client
 
 
+@pytest.fixture
+def client_traced(monkeypatch):
+    """Create Flask test client with tracing exported to the in-memory ring buffer."""
+    pytest.importorskip('opentelemetry.sdk')
+    monkeypatch.setenv('SECRET_DELIVERY_METHOD', 'vault-secrets-operator')
+    monkeypatch.setenv('LDAP_USERNAME', 'test-user')
+    monkeypatch.setenv('OTEL_TRACES_EXPORTER', 'memory')
+
+    import importlib
+    import app as app_module
+    importlib.reload(app_module)
+
+    app_module.app.config['TESTING'] = True
+    with app_module.app.test_client() as test_client:
+        yield test_client
+
+    # Later tests import app directly; give them the untraced module back
+    monkeypatch.delenv('OTEL_TRACES_EXPORTER')
+    importlib.reload(app_module)
+
+
 @pytest.fixture
 def client_vso(monkeypatch, tmp_path):
     """Create Flask test client configured for vault-secrets-operator mode."""